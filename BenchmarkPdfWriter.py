@@ -0,0 +1,372 @@
+# Import libraries
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+import numpy as np
+import pandas as pd
+from PdfWriter import FillablePdfWriter
+from PdfTemplate import ByteStampedPdfTemplate, write_filled_pdf
+
+# resource is only available on Unix, the peak RSS of the benchmark process is reported as None on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The workbook sizes benchmarked by default
+BENCHMARK_ROWS = (10, 100, 1000, 10000, 100000)
+# The rows filled and written by default, every EFS pdf is ~180 KB so 100k rows would take ~18 GB of disk, the fill and
+# write stages are scaled to every row
+DEFAULT_MAX_FILL_ROWS = 1000
+# The modules imported lazily by PDFWriterGUI, importing any of them before the window is shown slows the start up
+LAZY_GUI_MODULES = ('pandas', 'numpy', 'openpyxl', 'fillpdf', 'pdfrw', 'fitz', 'PDFWriter', 'PdfWriter')
+
+
+def create_synthetic_efs_data_df(number_of_rows: int, seed: int = 0):
+    """
+    A function that creates a dataframe with the same columns and dtypes as pd.read_excel of an EFS data excel file
+    :param number_of_rows: The number of trades to create
+    :param seed: The seed of the random number generator, the same seed always creates the same trades
+    :return: A dataframe of synthetic EFS data before preprocessing
+    """
+    rng = np.random.default_rng(seed)
+    start_date = pd.Timestamp('2021-01-01') + pd.to_timedelta(rng.integers(0, 730, number_of_rows), unit='D')
+    rounded_strike = np.round(rng.uniform(100, 250, number_of_rows), 1)
+    total_quantity = rng.integers(1, 500, number_of_rows)
+
+    return pd.DataFrame({'Start Date': start_date,
+                         'Shipment': start_date + pd.to_timedelta(rng.integers(30, 365, number_of_rows), unit='D'),
+                         'Rounded strike': rounded_strike,
+                         'Expiry Date': start_date + pd.to_timedelta(rng.integers(180, 540, number_of_rows), unit='D'),
+                         'Total Quantity (lots)': total_quantity,
+                         'Notional': np.round(rounded_strike * total_quantity * 5 * 10).astype(np.int64),
+                         'Transaction Type': rng.choice(['Short', 'Long'], number_of_rows)})
+
+
+def legacy_preprocess_efs_data_df(efs_data_df: pd.DataFrame):
+    """
+    The row-wise preprocessing used before FillablePdfWriter.preprocess_efs_data_df was vectorized, kept as the
+    baseline of benchmark_preprocessing
+    :param efs_data_df: The dataframe of EFS data as read from EFS data excel file
+    :return: A dataframe of EFS data after preprocessing
+    """
+    efs_data_df['Start Date'] = efs_data_df['Start Date'].apply(lambda x: x.strftime('%d/%m/%Y'))
+    efs_data_df['Expiry Date'] = efs_data_df['Expiry Date'].apply(lambda x: x.strftime('%d/%m/%Y'))
+    efs_data_df['Shipment Month'] = efs_data_df['Shipment'].apply(lambda x: x.strftime('%b').upper())
+    efs_data_df['Shipment Year'] = efs_data_df['Shipment'].apply(lambda x: x.strftime('%y'))
+    if 'Notional' not in efs_data_df.columns:
+        efs_data_df['Notional'] = efs_data_df['Rounded strike'] * efs_data_df['Total Quantity (lots)'] * 5 * 10
+    efs_data_df['Notional'] = efs_data_df['Notional'].apply(lambda x: "{:,.0f}".format(x))
+    if 'Commodity Code' not in efs_data_df.columns:
+        commodity_codes_mapper = {'JAN': 'F', 'FEB': 'G', 'MAR': 'H', 'APR': 'J', 'MAY': 'K', 'JUN': 'M',
+                                  'JUL': 'N', 'AUG': 'Q', 'SEP': 'U', 'OCT': 'V', 'NOV': 'X', 'DEC': 'Z'}
+        efs_data_df['Shipment Month Letter'] = efs_data_df['Shipment Month'].map(commodity_codes_mapper)
+        efs_data_df['Commodity Code'] = 'OR' + efs_data_df['Shipment Month Letter'] + efs_data_df['Shipment Year']
+    if 'Transaction Type' in efs_data_df.columns:
+        efs_data_df['Buyer/Seller'] = efs_data_df['Transaction Type'].map({'Short': 'Seller', 'Long': 'Buyer'})
+        efs_data_df['Seller'] = efs_data_df['Buyer/Seller'].map({'Seller': 'On', 'Buyer': 'Off'})
+        efs_data_df['Buyer'] = efs_data_df['Buyer/Seller'].map({'Seller': 'Off', 'Buyer': 'On'})
+    mapper = {'Start Date': 'undefined_12',
+              'Expiry Date': 'undefined_13',
+              'Rounded strike': 'undefined_4',
+              'Total Quantity (lots)': 'undefined_3',
+              'Shipment Month': 'undefined_2',
+              'Notional': 'undefined_16',
+              'Commodity Code': 'Commodity Code  Contract Month'}
+    efs_data_df = efs_data_df.rename(mapper=mapper, axis='columns')
+    efs_data_df['undefined_14'] = efs_data_df['undefined_4']
+
+    return efs_data_df
+
+
+def benchmark_preprocessing(number_of_rows: int = 100000):
+    """
+    A function that times the row-wise and the vectorized preprocessing on the same synthetic EFS data and checks
+    that both create exactly the same values
+    :param number_of_rows: The number of trades to benchmark
+    :return: A dictionary of the timings in seconds and the speed up of the vectorized preprocessing
+    """
+    efs_data_df = create_synthetic_efs_data_df(number_of_rows)
+
+    start_time = time.perf_counter()
+    legacy_df = legacy_preprocess_efs_data_df(efs_data_df.copy())
+    legacy_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    vectorized_df = FillablePdfWriter().preprocess_efs_data_df(efs_data_df.copy())
+    vectorized_seconds = time.perf_counter() - start_time
+
+    # The vectorized preprocessing must fill exactly the same strings in the pdf
+    pd.testing.assert_frame_equal(legacy_df.astype(str), vectorized_df.astype(str))
+
+    return {'rows': number_of_rows,
+            'legacy_seconds': round(legacy_seconds, 4),
+            'vectorized_seconds': round(vectorized_seconds, 4),
+            'speed_up': round(legacy_seconds / vectorized_seconds, 1)}
+
+
+def create_synthetic_efs_excel(output_path: str, number_of_rows: int, seed: int = 0):
+    """
+    A function that writes a synthetic EFS data excel file, with the columns expected by
+    create_df_from_import_efs_excel
+    :param output_path: The directory where the excel file is created, e.g. a temporary directory
+    :param number_of_rows: The number of trades to create
+    :param seed: The seed of the random number generator, the same seed always creates the same trades
+    :return: The excel file name (end with .xlsx)
+    """
+    efs_data_df = create_synthetic_efs_data_df(number_of_rows, seed)
+    efs_data_excel_file = f'synthetic_efs_data_{number_of_rows}.xlsx'
+
+    # openpyxl write-only mode streams the rows to the file, much faster than pd.DataFrame.to_excel for large sheets
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(list(efs_data_df.columns))
+    for row in efs_data_df.itertuples(index=False, name=None):
+        worksheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+    workbook.save(os.path.join(output_path, efs_data_excel_file))
+
+    return efs_data_excel_file
+
+
+def get_peak_rss_mb():
+    """
+    :return: The peak resident set size of this process in MB since it started, or None if it cannot be read on this
+    platform
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def start_stage(trace_memory: bool):
+    """
+    A function that starts the tracemalloc peak of the next stage again
+    :param trace_memory: True if the python memory allocations are traced
+    :return: The start time of the stage
+    """
+    if trace_memory:
+        tracemalloc.reset_peak()
+
+    return time.perf_counter()
+
+
+def create_stage_report(seconds: float, rows: int, trace_memory: bool = False):
+    """
+    :param seconds: The time spent in the stage
+    :param rows: The number of rows processed by the stage
+    :param trace_memory: True if the python memory allocations are traced, the peak since start_stage is added
+    :return: A dictionary of the stage timing, throughput and python memory peak (None if not traced)
+    """
+    return {'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+            'memory_peak_mb': round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1) if trace_memory else None}
+
+
+def benchmark_pdf_writer(number_of_rows: int, efs_template_pdf: str = 'Trade EFS Template.pdf',
+                         max_fill_rows: int = DEFAULT_MAX_FILL_ROWS, chunk_size: int = 1000,
+                         trace_memory: bool = False):
+    """
+    A function that times each stage of FillablePdfWriter on a synthetic EFS data excel file in a temporary directory
+    :param number_of_rows: The number of trades in the synthetic excel file
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :param max_fill_rows: Only fill and write the first max_fill_rows rows (default DEFAULT_MAX_FILL_ROWS, None for
+    every row), every EFS pdf is ~180 KB so 100k rows take ~18 GB of disk
+    :param chunk_size: The number of excel rows read and preprocessed at a time (default 1000)
+    :param trace_memory: Trace the python memory allocations with tracemalloc and add the peak of each stage to its
+    report (default False, tracing slows every stage down)
+    :return: A dictionary of the number of rows, the peak RSS of the process and the seconds, rows/sec and python
+    memory peak of each stage
+    """
+    pdf_writer = FillablePdfWriter()
+    stages = {}
+    temp_path = tempfile.mkdtemp(prefix='efs_benchmark_')
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        efs_data_excel_file = create_synthetic_efs_excel(temp_path, number_of_rows)
+
+        # Stage 1 - read the excel file in chunks, as run_fillable_pdf_writer does
+        start_time = start_stage(trace_memory)
+        efs_data_dfs = list(pdf_writer.read_efs_excel_in_chunks(temp_path, efs_data_excel_file, chunk_size))
+        stages['read_excel'] = create_stage_report(time.perf_counter() - start_time, number_of_rows, trace_memory)
+
+        # Stage 2 - preprocess every chunk
+        start_time = start_stage(trace_memory)
+        efs_data_dfs = [pdf_writer.preprocess_efs_data_df(efs_data_df) for efs_data_df in efs_data_dfs]
+        stages['preprocess'] = create_stage_report(time.perf_counter() - start_time, number_of_rows, trace_memory)
+
+        # Stage 3 - build the final value dictionaries (row dictionaries merged with the default fields)
+        start_time = start_stage(trace_memory)
+        efs_data_dicts = [efs_data_dict for efs_data_df in efs_data_dfs
+                          for efs_data_dict in pdf_writer.iterate_efs_data_dicts_from_df(efs_data_df)]
+        final_value_dicts = list(pdf_writer.iterate_final_value_dicts(pdf_writer.create_default_dict(),
+                                                                      enumerate(efs_data_dicts, start=1)))
+        stages['build_dicts'] = create_stage_report(time.perf_counter() - start_time, number_of_rows, trace_memory)
+        del efs_data_dfs, efs_data_dicts
+
+        # Stage 4 and 5 - fill each pdf in memory (as fill_pdfs does) and write it to the output file, timed apart
+        fill_rows = number_of_rows if max_fill_rows is None else min(number_of_rows, max_fill_rows)
+        fill_seconds = 0.0
+        write_seconds = 0.0
+        bytes_written = 0
+        start_time = start_stage(trace_memory)
+        compiled_template = ByteStampedPdfTemplate(efs_template_pdf)
+        fill_seconds += time.perf_counter() - start_time
+        for row_number, final_value_dict in final_value_dicts[:fill_rows]:
+            start_time = time.perf_counter()
+            buffer = io.BytesIO()
+            write_filled_pdf(compiled_template, buffer, final_value_dict)
+            pdf_bytes = buffer.getvalue()
+            middle_time = time.perf_counter()
+            with open(os.path.join(temp_path, f'benchmark_{row_number}.pdf'), 'wb') as file:
+                file.write(pdf_bytes)
+            write_seconds += time.perf_counter() - middle_time
+            fill_seconds += middle_time - start_time
+            bytes_written += len(pdf_bytes)
+        # The fill and write stages share one memory peak
+        stages['fill_pdfs'] = create_stage_report(fill_seconds, fill_rows, trace_memory)
+        stages['write_output'] = create_stage_report(write_seconds, fill_rows, trace_memory)
+        stages['write_output']['bytes'] = bytes_written
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+    # Rows/sec of a whole run, the fill and write stages are scaled to every row if only part of them were filled
+    total_seconds = sum(stages[stage]['seconds'] for stage in ('read_excel', 'preprocess', 'build_dicts'))
+    if fill_rows:
+        total_seconds += (fill_seconds + write_seconds) * number_of_rows / fill_rows
+
+    return {'rows': number_of_rows,
+            'fill_rows': fill_rows,
+            'total_seconds': round(total_seconds, 4),
+            'rows_per_second': round(number_of_rows / total_seconds, 1) if total_seconds > 0 else None,
+            'peak_rss_mb': get_peak_rss_mb(),
+            'stages': stages}
+
+
+def run_benchmark_suite(rows=BENCHMARK_ROWS, efs_template_pdf: str = 'Trade EFS Template.pdf',
+                        max_fill_rows: int = DEFAULT_MAX_FILL_ROWS, trace_memory: bool = False):
+    """
+    A function that benchmarks FillablePdfWriter on synthetic excel files of each number of rows, each in a new
+    process so that the peak RSS of each excel file does not include the excel files benchmarked before
+    :param rows: The numbers of rows of the synthetic excel files
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :param max_fill_rows: Only fill and write the first max_fill_rows rows of each excel file (default
+    DEFAULT_MAX_FILL_ROWS, None for every row)
+    :param trace_memory: Add the tracemalloc peak of each stage (default False)
+    :return: A json serializable dictionary of the environment and the result of each excel file
+    """
+    results = []
+    for number_of_rows in rows:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(benchmark_pdf_writer, number_of_rows, efs_template_pdf, max_fill_rows,
+                                           trace_memory=trace_memory).result())
+
+    return {'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'results': results}
+
+
+def measure_import_time(module_name: str = 'PDFWriterGUI'):
+    """
+    A function that imports a module in a new python process with -X importtime, e.g. to check the start up of the GUI
+    :param module_name: The module to import (default 'PDFWriterGUI')
+    :return: A json serializable dictionary of the cumulative seconds of the import, the seconds of the 10 slowest
+    modules imported and the LAZY_GUI_MODULES imported
+    """
+    completed_process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+                                       check=True)
+
+    # Each line is 'import time: <self us> | <cumulative us> | <module>', the module is indented by its import depth
+    cumulative_seconds = {}
+    for line in completed_process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, imported_module = line[len('import time:'):].split('|')
+        cumulative_seconds[imported_module.strip()] = int(cumulative_us) / 1000000
+
+    top_level_modules = {imported_module.split('.')[0] for imported_module in cumulative_seconds}
+    slowest_modules = sorted(cumulative_seconds.items(), key=lambda item: item[1], reverse=True)[:10]
+
+    return {'module': module_name,
+            'seconds': round(cumulative_seconds.get(module_name, 0.0), 4),
+            'slowest_modules': [(imported_module, round(seconds, 4)) for imported_module, seconds in slowest_modules],
+            'lazy_modules_imported': [lazy_module for lazy_module in LAZY_GUI_MODULES
+                                      if lazy_module in top_level_modules]}
+
+
+def compare_benchmark_results(baseline: dict, current: dict):
+    """
+    A function that compares two results of run_benchmark_suite
+    :param baseline: The result of a previous run, e.g. loaded from its json file
+    :param current: The result of this run
+    :return: A list of (rows, stage, baseline seconds, current seconds, current / baseline) for the number of rows
+    in both results, a ratio above 1 is a slow down
+    """
+    baseline_results = {result['rows']: result for result in baseline['results']}
+    comparison = []
+    for result in current['results']:
+        baseline_result = baseline_results.get(result['rows'])
+        if baseline_result is None:
+            continue
+        for stage, stage_report in result['stages'].items():
+            baseline_seconds = baseline_result['stages'].get(stage, {}).get('seconds')
+            if not baseline_seconds:
+                continue
+            comparison.append((result['rows'], stage, baseline_seconds, stage_report['seconds'],
+                               round(stage_report['seconds'] / baseline_seconds, 2)))
+
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark FillablePdfWriter on synthetic EFS data excel files')
+    parser.add_argument('rows', nargs='*', type=int, default=list(BENCHMARK_ROWS),
+                        help='numbers of rows of the synthetic excel files')
+    parser.add_argument('--template', default='Trade EFS Template.pdf', help='the EFS template pdf file')
+    parser.add_argument('--max-fill-rows', type=int, default=DEFAULT_MAX_FILL_ROWS,
+                        help=f'only fill and write the first rows of each excel file, the fill and write stages are '
+                             f'scaled to every row (default {DEFAULT_MAX_FILL_ROWS}, 0 for every row)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='add the python memory peak of each stage, measured with tracemalloc')
+    parser.add_argument('--output', help='write the json result to this file')
+    parser.add_argument('--compare', help='a json result of a previous run to compare with')
+    parser.add_argument('--preprocessing', action='store_true',
+                        help='only compare the row-wise and the vectorized preprocessing')
+    parser.add_argument('--startup', action='store_true',
+                        help='only measure the import time of PDFWriterGUI with python -X importtime')
+    args = parser.parse_args()
+
+    if args.startup:
+        print(json.dumps(measure_import_time('PDFWriterGUI'), indent=2))
+        sys.exit()
+    if args.preprocessing:
+        print(json.dumps([benchmark_preprocessing(number_of_rows) for number_of_rows in args.rows], indent=2))
+        sys.exit()
+
+    benchmark_result = run_benchmark_suite(args.rows, args.template, args.max_fill_rows or None, args.trace_memory)
+    print(json.dumps(benchmark_result, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(benchmark_result, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as baseline_file:
+            for rows, stage, baseline_seconds, current_seconds, ratio in compare_benchmark_results(
+                    json.load(baseline_file), benchmark_result):
+                print(f'{rows:>7} rows  {stage:<12} {baseline_seconds:>9.4f}s -> {current_seconds:>9.4f}s  x{ratio}')
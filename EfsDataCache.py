@@ -0,0 +1,336 @@
+# Import libraries
+import os
+import glob
+import json
+import stat
+import time
+import hashlib
+import pandas as pd
+from PdfManifest import hash_file
+from RunReport import RunReport
+
+# The cached dataframes are only stored as parquet, which needs pyarrow, without it nothing is cached. They are never
+# pickled since loading a pickle file runs any code put in it
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# The default directory of the cached dataframes in the cache directory of the user, they can be deleted at any time
+if os.name == 'nt':
+    DEFAULT_CACHE_DIR = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'efs_pdf_writer_cache')
+else:
+    DEFAULT_CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'efs_pdf_writer')
+# Increase when the cached dataframes change (e.g. preprocess_efs_data_df), the older cache entries are then ignored
+CACHE_VERSION = 2
+# The cache entries not used for this long are deleted, then the least recently used ones until the cache fits
+MAX_CACHE_AGE_SECONDS = 30 * 24 * 60 * 60
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class EfsDataCache:
+    """
+    This class is used to store the dataframes read from an EFS data file on disk, keyed by the file path, modification
+    time and content hash, so that the next run or preview of the same file does not parse the excel file again
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES,
+                 max_age_seconds: float = MAX_CACHE_AGE_SECONDS):
+        """
+        :param cache_dir: The directory of the cached dataframes (default DEFAULT_CACHE_DIR in the user cache directory)
+        :param max_bytes: The size of the cache above which the least recently used entries are deleted
+        :param max_age_seconds: The time after which a cache entry not used is deleted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    def is_usable(self):
+        """
+        A function that creates the cache directory only readable by the current user if it does not exist, and checks
+        that no other user can change the cache entries
+        :return: True if the EFS data can be cached in the cache directory, False if pyarrow is not installed, the
+        cache directory cannot be created, is a symbolic link, is owned by another user or can be written by other users
+        """
+        if pyarrow is None:
+            return False
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            cache_dir_stat = os.lstat(self.cache_dir)
+        except OSError:
+            return False
+
+        if not stat.S_ISDIR(cache_dir_stat.st_mode):
+            return False
+        # The owner and permissions are not checked on Windows, where the cache directory is in the user profile
+        if hasattr(os, 'getuid'):
+            return cache_dir_stat.st_uid == os.getuid() and not cache_dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        return True
+
+    def get_metadata_file(self, efs_data_file: str):
+        """
+        :param efs_data_file: The full file name of EFS data
+        :return: The metadata file of the cache entry of the EFS data file, named after the hash of its path
+        """
+        path_hash = hashlib.sha256(os.path.abspath(efs_data_file).encode('utf-8')).hexdigest()[:32]
+
+        return os.path.join(self.cache_dir, f'{path_hash}.json')
+
+    def load_metadata(self, efs_data_file: str):
+        """
+        A function that loads the metadata of the cache entry if it is still valid for the EFS data file: same
+        modification time and size, or same content hash if only the modification time changed (e.g. the file was
+        copied or saved again without changes)
+        :param efs_data_file: The full file name of EFS data
+        :return: The metadata dictionary, or None if there is no valid cache entry
+        """
+        metadata_file = self.get_metadata_file(efs_data_file)
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as file:
+                metadata = json.load(file)
+            source_stat = os.stat(efs_data_file)
+        except (OSError, ValueError):
+            return None
+
+        if metadata.get('version') != CACHE_VERSION or metadata.get('path') != os.path.abspath(efs_data_file) or \
+                metadata.get('size') != source_stat.st_size:
+            return None
+        if metadata.get('mtime_ns') != source_stat.st_mtime_ns:
+            if metadata.get('hash') != hash_file(efs_data_file):
+                return None
+            # Same content, the modification time is updated so the file is not hashed again next time
+            metadata['mtime_ns'] = source_stat.st_mtime_ns
+            self.save_metadata(efs_data_file, metadata)
+
+        return metadata
+
+    def save_metadata(self, efs_data_file: str, metadata: dict):
+        """
+        :param efs_data_file: The full file name of EFS data
+        :param metadata: The metadata dictionary of the cache entry
+        """
+        metadata_file = self.get_metadata_file(efs_data_file)
+        # Write to a temporary file first so that a half written metadata file is never read
+        with open(f'{metadata_file}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
+        os.replace(f'{metadata_file}.tmp', metadata_file)
+
+    def load(self, efs_data_file: str, frame_name: str):
+        """
+        A function that loads a cached dataframe of the EFS data file
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :return: The dataframe, or None if it is not cached, the EFS data file changed or the cache is not usable
+        """
+        frame_file = self.get_cached_frame_file(efs_data_file, frame_name)
+        if frame_file is None:
+            return None
+        try:
+            efs_data_df = pd.read_parquet(frame_file)
+            # The modification time of the metadata file is the last time the cache entry was used
+            os.utime(self.get_metadata_file(efs_data_file))
+        except (OSError, ValueError):
+            return None
+
+        return efs_data_df
+
+    def load_in_chunks(self, efs_data_file: str, frame_name: str, chunk_size: int = 1000):
+        """
+        A function that reads a cached dataframe of the EFS data file chunk by chunk, so that the memory used does not
+        grow with the number of rows
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :param chunk_size: The number of rows in each dataframe (default 1000)
+        :return: A generator of dataframes, or None if it is not cached, the EFS data file changed or the cache is not
+        usable
+        """
+        frame_file = self.get_cached_frame_file(efs_data_file, frame_name)
+        if frame_file is None:
+            return None
+        try:
+            parquet_file = pyarrow.parquet.ParquetFile(frame_file)
+            # The modification time of the metadata file is the last time the cache entry was used
+            os.utime(self.get_metadata_file(efs_data_file))
+        except (OSError, ValueError):
+            return None
+
+        return (pyarrow.Table.from_batches([record_batch]).to_pandas()
+                for record_batch in parquet_file.iter_batches(batch_size=chunk_size))
+
+    def get_cached_frame_file(self, efs_data_file: str, frame_name: str):
+        """
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :return: The parquet file of the cached dataframe, or None if it is not cached, the EFS data file changed or the
+        cache is not usable
+        """
+        if not self.is_usable():
+            return None
+        metadata = self.load_metadata(efs_data_file)
+        if metadata is None or frame_name not in metadata['frames']:
+            return None
+
+        frame_file = os.path.join(self.cache_dir, metadata['frames'][frame_name])
+        if not frame_file.endswith('.parquet'):
+            return None
+
+        return frame_file
+
+    def save(self, efs_data_file: str, frame_name: str, efs_data_df: pd.DataFrame, source_mtime_ns: int):
+        """
+        A function that stores a dataframe read from the EFS data file as parquet, if the cache is usable and the
+        dataframe is read back unchanged (e.g. no column mixing numbers and text), then deletes the cache entries too
+        old or above the size of the cache
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :param efs_data_df: The dataframe to store
+        :param source_mtime_ns: The modification time of the EFS data file when it was read, nothing is stored if
+        the file changed since
+        """
+        if os.stat(efs_data_file).st_mtime_ns != source_mtime_ns or not self.is_usable():
+            return
+
+        frame_file = self.get_frame_file(efs_data_file, frame_name)
+        try:
+            efs_data_df.to_parquet(frame_file)
+            if not pd.read_parquet(frame_file).equals(efs_data_df):
+                os.remove(frame_file)
+                return
+        except (ValueError, TypeError, NotImplementedError):
+            return
+
+        self.add_frame(efs_data_file, frame_name, frame_file, source_mtime_ns)
+
+    def get_frame_file(self, efs_data_file: str, frame_name: str):
+        """
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :return: The parquet file of the dataframe, named after the metadata file of the cache entry
+        """
+        return f'{os.path.splitext(self.get_metadata_file(efs_data_file))[0]}_{frame_name}.parquet'
+
+    def add_frame(self, efs_data_file: str, frame_name: str, frame_file: str, source_mtime_ns: int):
+        """
+        A function that adds a parquet file already written to the cache entry of the EFS data file, then deletes the
+        cache entries too old or above the size of the cache
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :param frame_file: The parquet file of the dataframe
+        :param source_mtime_ns: The modification time of the EFS data file when it was read, the parquet file is
+        removed if the file changed since
+        """
+        source_stat = os.stat(efs_data_file)
+        if source_stat.st_mtime_ns != source_mtime_ns:
+            os.remove(frame_file)
+            return
+
+        # Keep the other dataframes of the same file content
+        metadata = self.load_metadata(efs_data_file)
+        if metadata is None:
+            metadata = {'version': CACHE_VERSION,
+                        'path': os.path.abspath(efs_data_file),
+                        'mtime_ns': source_stat.st_mtime_ns,
+                        'size': source_stat.st_size,
+                        'hash': hash_file(efs_data_file),
+                        'frames': {}}
+
+        metadata['frames'][frame_name] = os.path.basename(frame_file)
+        self.save_metadata(efs_data_file, metadata)
+        self.evict()
+
+    def evict(self):
+        """
+        A function that deletes the cache entries not used for max_age_seconds, then the least recently used ones until
+        the cache is not bigger than max_bytes
+        """
+        cache_entries = []
+        for metadata_file in glob.glob(os.path.join(glob.escape(self.cache_dir), '*.json')):
+            entry_files = [metadata_file] + glob.glob(f'{glob.escape(os.path.splitext(metadata_file)[0])}_*')
+            try:
+                last_used = os.stat(metadata_file).st_mtime
+                entry_size = sum(os.stat(entry_file).st_size for entry_file in entry_files)
+            except OSError:
+                continue
+            cache_entries.append((last_used, entry_size, entry_files))
+
+        # Keep the most recently used entries that fit in the cache
+        cache_size = 0
+        now = time.time()
+        for last_used, entry_size, entry_files in sorted(cache_entries, key=lambda entry: entry[0], reverse=True):
+            cache_size += entry_size
+            if cache_size <= self.max_bytes and now - last_used <= self.max_age_seconds:
+                continue
+            for entry_file in entry_files:
+                try:
+                    os.remove(entry_file)
+                except OSError:
+                    pass
+
+    def cache_dfs(self, efs_data_file: str, frame_name: str, efs_data_dfs, run_report=None):
+        """
+        A function that passes the dataframes read from the EFS data file on and appends each of them to a parquet
+        file before it is passed on (preprocess_efs_data_df changes the dataframes it preprocesses), so that the memory
+        used does not grow with the number of rows, the parquet file is only added to the cache once every dataframe is
+        written, nothing is stored if the caller stops early (e.g. the run is cancelled) or a dataframe is not read back
+        unchanged (e.g. a column mixing numbers and text)
+        :param efs_data_file: The full file name of EFS data
+        :param frame_name: The name of the dataframe, e.g. 'raw' (as read) or 'preprocessed'
+        :param efs_data_dfs: An iterable of dataframes of the EFS data file
+        :param run_report: A RunReport that records the time spent storing the dataframes as 'write_cache'
+        :return: A generator of the same dataframes
+        """
+        if not self.is_usable():
+            yield from efs_data_dfs
+            return
+        if run_report is None:
+            run_report = RunReport()
+        source_mtime_ns = os.stat(efs_data_file).st_mtime_ns
+        frame_file = self.get_frame_file(efs_data_file, frame_name)
+
+        # Write to a temporary file first so that a half written parquet file is never read
+        parquet_writer = None
+        can_store = True
+        is_complete = False
+        try:
+            for efs_data_df in efs_data_dfs:
+                if can_store:
+                    with run_report.stage('write_cache'):
+                        try:
+                            parquet_writer = self.write_parquet_chunk(parquet_writer, f'{frame_file}.tmp',
+                                                                      efs_data_df)
+                        except (ValueError, TypeError, NotImplementedError):
+                            can_store = False
+                yield efs_data_df
+            is_complete = True
+        finally:
+            if parquet_writer is not None:
+                parquet_writer.close()
+                if can_store and is_complete:
+                    with run_report.stage('write_cache'):
+                        os.replace(f'{frame_file}.tmp', frame_file)
+                        self.add_frame(efs_data_file, frame_name, frame_file, source_mtime_ns)
+                else:
+                    os.remove(f'{frame_file}.tmp')
+
+    def write_parquet_chunk(self, parquet_writer, parquet_file: str, efs_data_df: pd.DataFrame):
+        """
+        A function that appends a dataframe to a parquet file as one row group
+        :param parquet_writer: The pyarrow.parquet.ParquetWriter of the previous dataframes, or None for the first one
+        :param parquet_file: The parquet file created for the first dataframe
+        :param efs_data_df: The dataframe to append, raises ValueError or TypeError if it would not be read back
+        unchanged or its columns cannot have the types of the previous dataframes
+        :return: The ParquetWriter, to close once every dataframe is appended
+        """
+        table = pyarrow.Table.from_pandas(efs_data_df, preserve_index=False)
+        if parquet_writer is not None and not table.schema.equals(parquet_writer.schema):
+            # e.g. a column without any value in this dataframe
+            table = table.cast(parquet_writer.schema)
+        if not table.to_pandas().equals(efs_data_df.reset_index(drop=True)):
+            raise ValueError('The dataframe is not read back unchanged from parquet')
+        if parquet_writer is None:
+            parquet_writer = pyarrow.parquet.ParquetWriter(parquet_file, table.schema)
+        parquet_writer.write_table(table)
+
+        return parquet_writer
@@ -0,0 +1,132 @@
+# Import libraries
+import os
+import openpyxl
+import pandas as pd
+
+# The extensions of the excel files, read with openpyxl
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+# The EFS data columns parsed as dates, the csv files store them as text (e.g. '2021-02-01' as saved by pandas)
+DATE_COLUMNS = ('Start Date', 'Expiry Date', 'Shipment')
+
+
+def iterate_chunks_of_df(efs_data_df: pd.DataFrame, chunk_size: int = 1000, first_chunk_size: int = None):
+    """
+    A function that splits a dataframe already read into chunks of rows
+    :param efs_data_df: The dataframe of EFS data
+    :param chunk_size: The number of rows in each dataframe (default 1000)
+    :param first_chunk_size: The number of rows in the first dataframe (default chunk_size)
+    :return: A generator of dataframes
+    """
+    start = 0
+    current_chunk_size = first_chunk_size or chunk_size
+    while start < len(efs_data_df):
+        yield efs_data_df.iloc[start:start + current_chunk_size].reset_index(drop=True)
+        start += current_chunk_size
+        current_chunk_size = chunk_size
+
+
+def read_excel_in_chunks(efs_data_file: str, chunk_size: int = 1000, first_chunk_size: int = None):
+    """
+    A function that reads EFS data excel file in openpyxl read-only mode and yields the rows chunk by chunk
+    :param efs_data_file: The full file name of EFS data excel file (end with .xlsx)
+    :param chunk_size: The number of rows in each dataframe (default 1000)
+    :param first_chunk_size: The number of rows in the first dataframe (default chunk_size), e.g. a small first
+    chunk to show the first rows of a large excel file as soon as they are read
+    :return: A generator of dataframes of EFS data before preprocessing, with the same columns as pd.read_excel
+    """
+    workbook = openpyxl.load_workbook(efs_data_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+
+        # The first row is the header, empty header cells are named the same way as pd.read_excel
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f'Unnamed: {index}' if column is None else column for index, column in enumerate(header)]
+
+        chunk = []
+        current_chunk_size = first_chunk_size or chunk_size
+        for row in rows:
+            # skip empty rows (e.g. formatted but empty rows at the end of the sheet)
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) == current_chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+                current_chunk_size = chunk_size
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def read_csv_in_chunks(efs_data_file: str, chunk_size: int = 1000, first_chunk_size: int = None):
+    """
+    A function that reads EFS data csv file chunk by chunk, much faster than an excel file of the same rows
+    :param efs_data_file: The full file name of EFS data csv file (end with .csv), the dates (DATE_COLUMNS) are
+    written in ISO format, e.g. '2021-02-01'
+    :param chunk_size: The number of rows in each dataframe (default 1000)
+    :param first_chunk_size: The number of rows in the first dataframe (default chunk_size)
+    :return: A generator of dataframes of EFS data before preprocessing
+    """
+    with pd.read_csv(efs_data_file, iterator=True) as reader:
+        current_chunk_size = first_chunk_size or chunk_size
+        while True:
+            try:
+                efs_data_df = reader.get_chunk(current_chunk_size)
+            except StopIteration:
+                return
+            # The dates are text in a csv file, they are parsed as the excel dates so that preprocessing is the same
+            for column in DATE_COLUMNS:
+                if column in efs_data_df.columns:
+                    try:
+                        efs_data_df[column] = pd.to_datetime(efs_data_df[column], format='ISO8601')
+                    except ValueError:
+                        # Kept as text, the wrong dates are reported row by row by validate_efs_data_df
+                        pass
+            yield efs_data_df
+            current_chunk_size = chunk_size
+
+
+def read_parquet_in_chunks(efs_data_file: str, chunk_size: int = 1000, first_chunk_size: int = None):
+    """
+    A function that reads EFS data parquet file (needs pyarrow or fastparquet) and yields the rows chunk by chunk
+    :param efs_data_file: The full file name of EFS data parquet file (end with .parquet)
+    :param chunk_size: The number of rows in each dataframe (default 1000)
+    :param first_chunk_size: The number of rows in the first dataframe (default chunk_size)
+    :return: A generator of dataframes of EFS data before preprocessing
+    """
+    # A parquet file is columnar and compressed, it is read at once and split into chunks
+    yield from iterate_chunks_of_df(pd.read_parquet(efs_data_file), chunk_size, first_chunk_size)
+
+
+# The EFS data readers by file extension, e.g. EFS_DATA_READERS['.tsv'] = read_tsv_in_chunks to read another format,
+# every reader takes (full file name, chunk size, first chunk size) and yields dataframes of EFS data
+EFS_DATA_READERS = {'.xlsx': read_excel_in_chunks,
+                    '.xlsm': read_excel_in_chunks,
+                    '.csv': read_csv_in_chunks,
+                    '.parquet': read_parquet_in_chunks}
+
+
+def get_efs_data_reader(efs_data_file: str):
+    """
+    :param efs_data_file: The file name of EFS data, e.g. 'EFS data.xlsx'
+    :return: The reader of EFS_DATA_READERS selected by the file extension
+    """
+    extension = os.path.splitext(efs_data_file)[1].lower()
+    if extension not in EFS_DATA_READERS:
+        raise ValueError(f'EFS data file should end with one of {tuple(EFS_DATA_READERS)}, not {efs_data_file!r}')
+
+    return EFS_DATA_READERS[extension]
+
+
+def read_efs_data_in_chunks(efs_data_file: str, chunk_size: int = 1000, first_chunk_size: int = None):
+    """
+    A function that reads EFS data file with the reader of its extension and yields the rows chunk by chunk
+    :param efs_data_file: The full file name of EFS data (.xlsx, .xlsm, .csv or .parquet)
+    :param chunk_size: The number of rows in each dataframe (default 1000)
+    :param first_chunk_size: The number of rows in the first dataframe (default chunk_size)
+    :return: A generator of dataframes of EFS data before preprocessing
+    """
+    return get_efs_data_reader(efs_data_file)(efs_data_file, chunk_size, first_chunk_size)
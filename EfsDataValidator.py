@@ -0,0 +1,201 @@
+# Import libraries
+import pandas as pd
+from EfsDataReader import DATE_COLUMNS
+
+# The validation modes of a run: 'strict' refuses EFS data with any error before the first pdf is written, 'skip'
+# creates the PDF files of the valid rows only and 'off' reads, preprocesses and fills the rows without checking them
+# first, the first two read EFS data file twice: once to check every row, once to fill the valid rows
+VALIDATION_MODES = ('strict', 'skip', 'off')
+# The EFS data columns always used by preprocess_efs_data_df
+REQUIRED_COLUMNS = ('Start Date', 'Expiry Date', 'Shipment')
+# The columns used to compute the notional if EFS data has no 'Notional' column
+NOTIONAL_COLUMNS = ('Rounded strike', 'Total Quantity (lots)')
+# The EFS data columns that must hold numbers
+NUMERIC_COLUMNS = ('Rounded strike', 'Total Quantity (lots)', 'Notional')
+# The transaction types that tick the seller or the buyer checkbox
+TRANSACTION_TYPES = ('Short', 'Long')
+# The columns created by preprocess_efs_data_df, before they are renamed by the mapper of the template config
+PREPROCESSED_COLUMNS = ('Shipment Month', 'Shipment Year', 'Notional', 'Shipment Month Letter', 'Commodity Code',
+                        'Buyer/Seller', 'Seller', 'Buyer')
+# The columns of the error report
+VALIDATION_REPORT_COLUMNS = ['Row', 'Column', 'Value', 'Error']
+
+
+class EfsDataValidationError(ValueError):
+    """
+    This class is raised when EFS data cannot be filled, it keeps the ValidationReport of every error
+    """
+
+    def __init__(self, validation_report):
+        """
+        :param validation_report: The ValidationReport of the errors
+        """
+        ValueError.__init__(self, validation_report.format_summary())
+        self.validation_report = validation_report
+
+
+class ValidationReport:
+    """
+    This class is used to record the errors found by validate_efs_data_df, each error is one row and column of EFS data
+    (the errors of the whole file, e.g. a missing column, have no row number)
+    """
+
+    def __init__(self, error_df: pd.DataFrame = None):
+        """
+        :param error_df: A dataframe of errors created by to_df, e.g. read back from the EFS data cache (default None)
+        """
+        # List of dataframes of errors with the columns VALIDATION_REPORT_COLUMNS, concatenated by to_df
+        self.error_dfs = [] if error_df is None or error_df.empty else [error_df]
+
+    def add_rows(self, row_numbers, column: str, values, error: str):
+        """
+        A function that records the same error for several rows at once
+        :param row_numbers: The row numbers of EFS data file (the first data row is 1)
+        :param column: The column name
+        :param values: The wrong values, one per row
+        :param error: The error message, e.g. 'is not a date'
+        """
+        if len(row_numbers):
+            self.error_dfs.append(pd.DataFrame({'Row': list(row_numbers), 'Column': column,
+                                                'Value': [str(value) for value in values], 'Error': error}))
+
+    def add_file_error(self, column: str, error: str):
+        """
+        A function that records an error of the whole EFS data file, no row can be filled until it is fixed
+        :param column: The column or field name
+        :param error: The error message, e.g. 'column is missing'
+        """
+        self.error_dfs.append(pd.DataFrame({'Row': [None], 'Column': [column], 'Value': [''], 'Error': [error]}))
+
+    def to_df(self):
+        """
+        :return: A dataframe of every error sorted by row number, the errors of the whole file first
+        """
+        if not self.error_dfs:
+            return pd.DataFrame(columns=VALIDATION_REPORT_COLUMNS)
+        error_df = pd.concat(self.error_dfs, ignore_index=True)
+        error_df['Row'] = error_df['Row'].astype('Int64')
+
+        return error_df.sort_values('Row', na_position='first', kind='stable').reset_index(drop=True)
+
+    def has_errors(self):
+        """
+        :return: True if any error was found
+        """
+        return bool(self.error_dfs)
+
+    def has_file_errors(self):
+        """
+        :return: True if an error of the whole file was found, e.g. a missing column
+        """
+        return any(error_df['Row'].isna().any() for error_df in self.error_dfs)
+
+    def get_bad_row_numbers(self):
+        """
+        :return: A sorted list of the row numbers with at least one error
+        """
+        if not self.error_dfs:
+            return []
+
+        return sorted(set(self.to_df()['Row'].dropna().astype(int)))
+
+    def write_csv(self, report_file: str):
+        """
+        :param report_file: The csv file name of the error report
+        """
+        self.to_df().to_csv(report_file, index=False)
+
+    def format_summary(self, max_errors: int = 20):
+        """
+        :param max_errors: The number of errors listed (default 20)
+        :return: A text summary of the errors
+        """
+        error_df = self.to_df()
+        lines = [f'{len(error_df)} EFS data error(s) in {len(self.get_bad_row_numbers())} row(s):']
+        for row_number, column, value, error in error_df.head(max_errors).itertuples(index=False, name=None):
+            location = 'file' if pd.isna(row_number) else f'row {row_number}'
+            lines.append(f'{location}, {column!r}: {f"{value!r} " if value else ""}{error}')
+        if len(error_df) > max_errors:
+            lines.append(f'... {len(error_df) - max_errors} more error(s)')
+
+        return '\n'.join(lines)
+
+
+def validate_efs_data_df(efs_data_df: pd.DataFrame, template_config, template_fields=None,
+                         validation_report: ValidationReport = None):
+    """
+    A function that checks every row of EFS data at once with vectorized pandas operations before any pdf is written,
+    the dates and numbers are converted in place so that preprocess_efs_data_df does not parse them again
+    :param efs_data_df: The dataframe of EFS data before preprocessing, its index is the row number - 1
+    :param template_config: The TemplateConfig of the EFS template
+    :param template_fields: The field names of the EFS template (default None, the fields are not checked)
+    :param validation_report: The ValidationReport the errors are added to (default None, a new one)
+    :return: The dataframe with the dates and numbers converted and the ValidationReport
+    """
+    if validation_report is None:
+        validation_report = ValidationReport()
+    row_numbers = efs_data_df.index + 1
+
+    # Schema, the columns used by the preprocessing and the columns copied into several fields by the mapper
+    required_columns = list(REQUIRED_COLUMNS)
+    if 'Notional' not in efs_data_df.columns:
+        required_columns.extend(NOTIONAL_COLUMNS)
+    required_columns.extend(column for column, field_names in template_config.mapper.items()
+                            if not isinstance(field_names, str) and len(field_names) > 1)
+    for column in dict.fromkeys(required_columns):
+        if column not in efs_data_df.columns:
+            validation_report.add_file_error(column, 'column is missing')
+
+    # Missing values, the dates, the notional (or the columns it is computed from) and the transaction type are needed
+    # by every row, blank cells would be filled as 'nan' or leave the checkboxes empty
+    notional_columns = ['Notional'] if 'Notional' in efs_data_df.columns else list(NOTIONAL_COLUMNS)
+    value_columns = [*REQUIRED_COLUMNS, *DATE_COLUMNS, *notional_columns, 'Transaction Type']
+    for column in dict.fromkeys(value_columns):
+        if column not in efs_data_df.columns:
+            continue
+        missing_values = efs_data_df[column].isna().to_numpy()
+        validation_report.add_rows(row_numbers[missing_values], column, [''] * int(missing_values.sum()),
+                                   'value is missing')
+
+    # Dates, the excel cells are already dates, the text cells must be ISO dates (e.g. '2021-02-01')
+    for column in DATE_COLUMNS:
+        if column not in efs_data_df.columns or pd.api.types.is_datetime64_any_dtype(efs_data_df[column]):
+            continue
+        dates = pd.to_datetime(efs_data_df[column], errors='coerce', format='ISO8601')
+        wrong_values = (dates.isna() & efs_data_df[column].notna()).to_numpy()
+        validation_report.add_rows(row_numbers[wrong_values], column, efs_data_df.loc[wrong_values, column],
+                                   'is not a date')
+        efs_data_df[column] = dates
+
+    # Numbers
+    for column in NUMERIC_COLUMNS:
+        if column not in efs_data_df.columns or pd.api.types.is_numeric_dtype(efs_data_df[column]):
+            continue
+        numbers = pd.to_numeric(efs_data_df[column], errors='coerce')
+        wrong_values = (numbers.isna() & efs_data_df[column].notna()).to_numpy()
+        validation_report.add_rows(row_numbers[wrong_values], column, efs_data_df.loc[wrong_values, column],
+                                   'is not a number')
+        efs_data_df[column] = numbers
+
+    # Transaction types that would leave the seller and buyer checkboxes empty
+    if 'Transaction Type' in efs_data_df.columns:
+        wrong_values = (efs_data_df['Transaction Type'].notna() &
+                        ~efs_data_df['Transaction Type'].isin(TRANSACTION_TYPES)).to_numpy()
+        validation_report.add_rows(row_numbers[wrong_values], 'Transaction Type',
+                                   efs_data_df.loc[wrong_values, 'Transaction Type'],
+                                   f'is not a transaction type {TRANSACTION_TYPES}')
+
+    # Field names, checked once for the columns instead of once per row
+    mapped_columns = [template_config.rename_mapper.get(column, column)
+                      for column in [*efs_data_df.columns, *PREPROCESSED_COLUMNS]]
+    mapped_columns.extend(field_name for _, field_name in template_config.copied_fields)
+    default_fields = [*template_config.current_date_fields, *template_config.default_fields]
+    for field_name in sorted(set(mapped_columns) & set(default_fields)):
+        validation_report.add_file_error(field_name, 'is both an EFS data column and a default field')
+    if template_fields is not None:
+        mapped_fields = [*template_config.rename_mapper.values(),
+                         *(field_name for _, field_name in template_config.copied_fields), *default_fields]
+        for field_name in sorted(set(mapped_fields) - set(template_fields)):
+            validation_report.add_file_error(field_name, 'is not a field of the EFS template')
+
+    return efs_data_df, validation_report
@@ -0,0 +1,120 @@
+# Import libraries
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from BenchmarkPdfWriter import create_synthetic_efs_data_df
+
+
+def create_synthetic_efs_trades(number_of_trades: int, seed: int = 0):
+    """
+    A function that creates synthetic trades in the json format accepted by PdfFillService
+    :param number_of_trades: The number of trades to create
+    :param seed: The seed of the random number generator
+    :return: A list of EFS trade dictionaries, the dates in ISO format
+    """
+    efs_data_df = create_synthetic_efs_data_df(number_of_trades, seed)
+
+    return json.loads(efs_data_df.to_json(orient='records', date_format='iso'))
+
+
+async def send_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                       body: bytes = b''):
+    """
+    A function that sends one HTTP/1.1 request on an open connection and reads the response
+    :param reader: The stream of the response bytes
+    :param writer: The stream of the request bytes
+    :param method: The HTTP method, e.g. 'POST'
+    :param path: The request path, e.g. '/fill'
+    :param body: The request body
+    :return: The status code, the headers (lower case names) and the response body
+    """
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        header_line = (await reader.readline()).decode('latin-1').strip()
+        if not header_line:
+            break
+        name, _, value = header_line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    return status, headers, await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+async def run_client(host: str, port: int, request_bodies: list, latencies: list, statuses: list):
+    """
+    A function that sends requests one after another on one keep-alive connection
+    :param host: The address of the service
+    :param port: The port of the service
+    :param request_bodies: The json bodies to send, shared by all the clients
+    :param latencies: The list the seconds of each request are appended to
+    :param statuses: The list the status code of each request is appended to
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while request_bodies:
+            body = request_bodies.pop()
+            start_time = time.perf_counter()
+            status, _, _ = await send_request(reader, writer, 'POST', '/fill', body)
+            latencies.append(time.perf_counter() - start_time)
+            statuses.append(status)
+    finally:
+        writer.close()
+
+
+async def load_test(host: str = '127.0.0.1', port: int = 8765, requests: int = 200, concurrency: int = 8,
+                    batch_size: int = 1):
+    """
+    A function that sends requests to PdfFillService from several clients at the same time
+    :param host: The address of the service
+    :param port: The port of the service
+    :param requests: The number of requests to send (default 200)
+    :param concurrency: The number of clients sending requests at the same time (default 8)
+    :param batch_size: The number of trades of each request, 1 sends one trade and gets a pdf back, more sends a list
+    and gets a zip back (default 1)
+    :return: A json serializable dictionary of the latency percentiles, the throughput and the status codes
+    """
+    efs_trades = create_synthetic_efs_trades(requests * batch_size)
+    request_bodies = [json.dumps(efs_trades[index] if batch_size == 1 else
+                                 efs_trades[index:index + batch_size]).encode('utf-8')
+                      for index in range(0, len(efs_trades), batch_size)]
+
+    latencies = []
+    statuses = []
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, request_bodies, latencies, statuses) for _ in range(concurrency)))
+    total_seconds = time.perf_counter() - start_time
+
+    latencies_ms = np.asarray(latencies) * 1000
+    trades_done = statuses.count(200) * batch_size
+
+    return {'requests': len(statuses),
+            'concurrency': concurrency,
+            'batch_size': batch_size,
+            'seconds': round(total_seconds, 3),
+            'requests_per_second': round(len(statuses) / total_seconds, 1),
+            'trades_per_second': round(trades_done / total_seconds, 1),
+            'latency_ms': {'p50': round(float(np.percentile(latencies_ms, 50)), 2),
+                           'p99': round(float(np.percentile(latencies_ms, 99)), 2),
+                           'max': round(float(latencies_ms.max()), 2)},
+            'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a running PdfFillService')
+    parser.add_argument('--host', default='127.0.0.1', help='the address of the service (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='the port of the service (default 8765)')
+    parser.add_argument('--requests', type=int, default=200, help='number of requests to send (default 200)')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of clients at the same time (default 8)')
+    parser.add_argument('--batch-size', type=int, default=1, help='trades per request (default 1)')
+    args = parser.parse_args()
+
+    load_test_result = asyncio.run(load_test(args.host, args.port, args.requests, args.concurrency, args.batch_size))
+    print(json.dumps(load_test_result, indent=2))
+    sys.exit(0 if list(load_test_result['statuses']) == ['200'] else 1)
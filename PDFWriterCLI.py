@@ -0,0 +1,267 @@
+# Import modules
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+from PdfWriter import FillablePdfWriter
+from PdfTemplate import load_compiled_template
+from TemplateConfig import is_template_routing_file
+from ParallelPdfWriter import PdfWriterPool
+from PdfOutputWriter import OUTPUT_MODES
+from EfsDataReader import EFS_DATA_READERS
+from EfsDataValidator import VALIDATION_MODES
+from RunReport import RunReport
+
+logger = logging.getLogger('PDFWriterCLI')
+
+
+class WatchFolder:
+    """
+    This class is used to find the EFS data files that are new or modified in a folder, a file is only ready once its
+    modification time and size have not changed for debounce_seconds so that files still being copied or saved are
+    not read half written
+    """
+
+    def __init__(self, input_path: str, debounce_seconds: float = 2.0, include_existing: bool = False):
+        """
+        :param input_path: The folder to watch
+        :param debounce_seconds: The seconds a file must stay unchanged before it is ready (default 2.0)
+        :param include_existing: Also process the files already in the folder when the watch starts (default False)
+        """
+        self.input_path = input_path
+        self.debounce_seconds = debounce_seconds
+        # File name -> (modification time, size) of the last version processed
+        self.processed_files = {}
+        # File name -> ((modification time, size), time it was first seen with this modification time and size)
+        self.changing_files = {}
+        if not include_existing:
+            self.processed_files = self.scan()
+
+    def scan(self):
+        """
+        :return: A dictionary of the EFS data file name (with a reader in EFS_DATA_READERS) -> (modification time,
+        size) in the folder, the temporary files of Excel ('~$xxxxx.xlsx') and hidden files are ignored
+        """
+        files = {}
+        with os.scandir(self.input_path) as entries:
+            for entry in entries:
+                if entry.name.startswith(('~$', '.')) or not entry.is_file() or \
+                        os.path.splitext(entry.name)[1].lower() not in EFS_DATA_READERS:
+                    continue
+                file_stat = entry.stat()
+                files[entry.name] = (file_stat.st_mtime_ns, file_stat.st_size)
+
+        return files
+
+    def find_ready_files(self, now: float = None):
+        """
+        A function that scans the folder and returns the files that are new or modified and did not change for
+        debounce_seconds, they are then counted as processed
+        :param now: The current time.monotonic() (default None, the current time)
+        :return: A list of file names sorted by name
+        """
+        now = time.monotonic() if now is None else now
+        ready_files = []
+        for file_name, file_signature in self.scan().items():
+            if self.processed_files.get(file_name) == file_signature:
+                self.changing_files.pop(file_name, None)
+                continue
+            changing_file = self.changing_files.get(file_name)
+            if changing_file is None or changing_file[0] != file_signature:
+                # New or still changing, wait until it stays the same for debounce_seconds
+                self.changing_files[file_name] = (file_signature, now)
+                if self.debounce_seconds > 0:
+                    continue
+            elif now - changing_file[1] < self.debounce_seconds:
+                continue
+            self.changing_files.pop(file_name, None)
+            self.processed_files[file_name] = file_signature
+            ready_files.append(file_name)
+
+        return sorted(ready_files)
+
+
+def log_run_report(efs_data_file: str, run_report: RunReport):
+    """
+    A function that logs the status, throughput and stage timings of the run of one EFS data file
+    :param efs_data_file: The EFS data file name
+    :param run_report: The RunReport of the run
+    """
+    logger.info('%s:\n%s', efs_data_file, run_report.format_summary())
+
+
+def run_efs_data_file(pdf_writer: FillablePdfWriter, efs_data_file: str, efs_template_pdf, output_path: str,
+                      run_options: dict, output_file_name: str = None):
+    """
+    A function that creates the PDF files of one EFS data file and logs the result, errors are logged but not raised
+    so that the watch mode carries on with the next file
+    :param pdf_writer: The FillablePdfWriter
+    :param efs_data_file: The full file name of EFS data, the PDF files are named after it, e.g. 'trades_1.pdf'
+    :param efs_template_pdf: The pdf file name of EFS template or a ByteStampedPdfTemplate already loaded
+    :param output_path: The directory where the PDF files are created
+    :param run_options: The other keyword arguments of run_fillable_pdf_writer, e.g. workers or incremental
+    :param output_file_name: The pdf file name without '.pdf' (default None, the EFS data file name)
+    :return: The RunReport of the run
+    """
+    path, efs_data_excel_file = os.path.split(os.path.abspath(efs_data_file))
+    output_file_name = output_file_name or os.path.splitext(efs_data_excel_file)[0]
+    run_report = RunReport()
+    logger.info('%s: creating PDF files in %s', efs_data_excel_file, output_path)
+    try:
+        pdf_writer.run_fillable_pdf_writer(path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name,
+                                           run_report=run_report, **run_options)
+    except Exception as error:
+        logger.error('%s: %s: %s', efs_data_excel_file, type(error).__name__, error)
+    log_run_report(efs_data_excel_file, run_report)
+
+    return run_report
+
+
+def watch_folder(input_path: str, efs_template_pdf: str, output_path: str, run_options: dict,
+                 debounce_seconds: float = 2.0, poll_seconds: float = 1.0, include_existing: bool = False,
+                 stop_event: threading.Event = None):
+    """
+    A function that creates the PDF files of every EFS data file that is added to or modified in a folder until
+    stop_event is set, the EFS template and the worker processes are loaded once and kept for every file
+    :param input_path: The folder to watch
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf), it is loaded again if it changes, or
+    a template routing file (end with .json) whose templates are loaded by every run
+    :param output_path: The directory where the PDF files are created
+    :param run_options: The other keyword arguments of run_fillable_pdf_writer, e.g. workers or incremental
+    :param debounce_seconds: The seconds a file must stay unchanged before it is read (default 2.0)
+    :param poll_seconds: The seconds between two scans of the folder (default 1.0)
+    :param include_existing: Also process the files already in the folder when the watch starts (default False)
+    :param stop_event: A threading.Event, once set the watch stops after the current file (default None, forever)
+    """
+    stop_event = threading.Event() if stop_event is None else stop_event
+    run_options = dict(run_options)
+    # The workers of a routed run are started for each template by every run
+    workers = 1 if is_template_routing_file(efs_template_pdf) else run_options.pop('workers', 1)
+    flatten = run_options.get('flatten', False)
+    use_compiled_template = run_options.get('use_compiled_template', True)
+    pdf_writer = FillablePdfWriter()
+    watch = WatchFolder(input_path, debounce_seconds, include_existing)
+
+    template = None
+    template_mtime = None
+    pool = None
+    try:
+        logger.info('Watching %s for EFS data files (%s)', input_path, ', '.join(EFS_DATA_READERS))
+        while not stop_event.is_set():
+            for efs_data_file in watch.find_ready_files():
+                if stop_event.is_set():
+                    break
+
+                # Load the EFS template (and start the workers) once, or again if the template file changed
+                if template_mtime != os.path.getmtime(efs_template_pdf):
+                    template_mtime = os.path.getmtime(efs_template_pdf)
+                    logger.info('Loading EFS template %s', efs_template_pdf)
+                    template = load_compiled_template(efs_template_pdf, flatten) \
+                        if use_compiled_template and not is_template_routing_file(efs_template_pdf) \
+                        else efs_template_pdf
+                    if pool is not None:
+                        pool.close()
+                        pool = None
+                    if workers > 1:
+                        pool = PdfWriterPool(efs_template_pdf, workers, use_compiled_template, flatten)
+
+                run_efs_data_file(pdf_writer, os.path.join(input_path, efs_data_file), template, output_path,
+                                  dict(run_options, pool=pool, cancel_event=stop_event))
+            stop_event.wait(poll_seconds)
+    finally:
+        if pool is not None:
+            pool.close()
+        logger.info('Stopped watching %s', input_path)
+
+
+def create_argument_parser():
+    """
+    :return: The argparse.ArgumentParser of the 'run' and 'watch' commands
+    """
+    parser = argparse.ArgumentParser(description='Create EFS PDF files from EFS data files without the GUI')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='create the PDF files of one EFS data file')
+    run_parser.add_argument('efs_data_file', help='the EFS data file (.xlsx, .xlsm, .csv or .parquet)')
+    run_parser.add_argument('--output-name', help="the PDF file name without '.pdf' (default the EFS data file name)")
+    run_parser.add_argument('--report', help='write the json run report to this file')
+    watch_parser = subparsers.add_parser('watch', help='create the PDF files of every new or modified EFS data file '
+                                                       'in a folder until stopped')
+    watch_parser.add_argument('input_path', help='the folder to watch')
+    watch_parser.add_argument('--debounce', type=float, default=2.0,
+                              help='seconds a file must stay unchanged before it is read (default 2)')
+    watch_parser.add_argument('--poll', type=float, default=1.0, help='seconds between two scans (default 1)')
+    watch_parser.add_argument('--existing', action='store_true',
+                              help='also process the files already in the folder')
+
+    for command_parser in (run_parser, watch_parser):
+        command_parser.add_argument('--template', required=True,
+                                    help='the EFS template pdf file, or a template routing json file')
+        command_parser.add_argument('--output-path', required=True, help='the directory of the PDF files')
+        command_parser.add_argument('--workers', type=int, default=1, help='number of worker processes (default 1)')
+        command_parser.add_argument('--incremental', action='store_true',
+                                    help='only create the PDF files of new or changed rows again')
+        command_parser.add_argument('--output-mode', choices=OUTPUT_MODES, default='files',
+                                    help='one PDF file per row, a merged PDF file or a zip archive (default files)')
+        command_parser.add_argument('--flatten', action='store_true', help='create uneditable PDF files')
+        command_parser.add_argument('--validation', choices=VALIDATION_MODES, default='strict',
+                                    help='check every row first and create no PDF file if one is wrong (strict), only '
+                                         'create the PDF files of the valid rows (skip) or do not check (default '
+                                         'strict)')
+        command_parser.add_argument('--verify', action='store_true',
+                                    help='read back every PDF file and compare its fields with its row')
+        command_parser.add_argument('--cache-dir', help='cache the EFS data read in this directory (needs pyarrow)')
+        command_parser.add_argument('--log-file', help='also write the log to this file')
+
+    return parser
+
+
+def main(argv=None):
+    """
+    The entry point of the command line, e.g.
+    python PDFWriterCLI.py run trades.xlsx --template 'Trade EFS Template.pdf' --output-path out
+    python PDFWriterCLI.py watch incoming --template 'Trade EFS Template.pdf' --output-path out --incremental
+    :param argv: The command line arguments (default None, sys.argv)
+    :return: The exit code, 0 if every PDF file was created
+    """
+    args = create_argument_parser().parse_args(argv)
+
+    log_handlers = [logging.StreamHandler()]
+    if args.log_file:
+        log_handlers.append(logging.FileHandler(args.log_file, encoding='utf-8'))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s', handlers=log_handlers)
+
+    os.makedirs(args.output_path, exist_ok=True)
+    run_options = {'workers': args.workers,
+                   'incremental': args.incremental,
+                   'output_mode': args.output_mode,
+                   'flatten': args.flatten,
+                   'validation': args.validation,
+                   'verify': args.verify,
+                   'cache_dir': args.cache_dir}
+
+    if args.command == 'run':
+        run_report = run_efs_data_file(FillablePdfWriter(), args.efs_data_file, args.template, args.output_path,
+                                       run_options, args.output_name)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as report_file:
+                json.dump(run_report.to_dict(), report_file, indent=2)
+
+        return 0 if run_report.status == 'done' and not run_report.rows_failed and not run_report.rows_invalid and \
+            not run_report.rows_mismatched else 1
+
+    # Stop the watch cleanly after the current file on Ctrl+C or SIGTERM (e.g. systemctl stop)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signal_number, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: stop_event.set())
+    watch_folder(args.input_path, args.template, args.output_path, run_options, args.debounce, args.poll,
+                 args.existing, stop_event)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,108 @@
 # Import modules
 from tkinter import *
 from tkinter import ttk, filedialog
-import pandas as pd
 import os
-from PDFWriter import FillablePdfWriter
+import time
+import queue
+import threading
 import subprocess
+# pandas, fillpdf and the modules of FillablePdfWriter take seconds to import, they are imported inside the functions
+# that use them and warmed up on a background thread once the window is shown (see warm_up_imports), so that the
+# window shows straight away
+
+# The number of rows inserted in the Treeview at a time, the next rows are only inserted when the user scrolls down
+PREVIEW_PAGE_ROWS = 50
+
+
+class PdfWriterRun:
+    """
+    This class is used to create the EFS PDF files on a background thread, the thread never touches the Tk widgets and
+    only reports to a queue read by the main thread, so that the run can be followed and cancelled without a window
+    """
+
+    def __init__(self, path: str, efs_data_excel_file: str, efs_template_pdf: str, output_path: str,
+                 output_file_name: str, run_options: dict, progress_queue: queue.Queue = None):
+        """
+        :param path: The directory of EFS data excel file
+        :param efs_data_excel_file: The EFS data excel file name
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param output_path: The directory where you want to create the new PDF files
+        :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf')
+        :param run_options: The keyword arguments passed on to run_fillable_pdf_writer, e.g. {'workers': 2}
+        :param progress_queue: The queue the ('total' | 'progress' | 'done' | 'cancelled' | 'error', value) messages are
+        put in (default None, a new queue)
+        """
+        self.run_arguments = (path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name)
+        self.run_options = run_options
+        self.progress_queue = queue.Queue() if progress_queue is None else progress_queue
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """
+        A function that starts the run on the background thread
+        """
+        self.thread.start()
+
+    def is_alive(self):
+        """
+        :return: True while the background thread is running
+        """
+        return self.thread.is_alive()
+
+    def cancel(self):
+        """
+        A function that stops the run cleanly after the current PDF file, the PDF files already created are kept
+        """
+        self.cancel_event.set()
+
+    def run(self):
+        """
+        This function runs on the background thread, it counts the rows first so that the progress can be shown as a
+        fraction, then creates the PDF files and puts the number of rows done in the queue after each one
+        """
+        path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name = self.run_arguments
+        try:
+            from PdfWriter import FillablePdfWriter
+
+            # Instantiate class FillablePdfWriter
+            pdf_writer = FillablePdfWriter()
+            if self.run_options.get('efs_data_dfs') is not None:
+                total_rows = sum(len(efs_data_df) for efs_data_df in self.run_options['efs_data_dfs'])
+            else:
+                total_rows = pdf_writer.count_efs_excel_rows(path, efs_data_excel_file)
+            self.progress_queue.put(('total', total_rows))
+            pdf_writer.run_fillable_pdf_writer(path, efs_data_excel_file, efs_template_pdf, output_path,
+                                               output_file_name, **self.run_options,
+                                               progress_callback=lambda rows_done: self.progress_queue.put(
+                                                   ('progress', rows_done)),
+                                               cancel_event=self.cancel_event)
+            self.progress_queue.put(('cancelled' if self.cancel_event.is_set() else 'done', None))
+        except Exception as error:
+            self.progress_queue.put(('error', str(error)))
+
+    def read_messages(self):
+        """
+        A function that reads every message put in the queue since it was last called, without waiting
+        :return: The total number of rows (None if not counted yet), the latest number of rows done (None if no row
+        was done since) and the ('done' | 'cancelled' | 'error', value) message once the run is finished, else None
+        """
+        total_rows = None
+        rows_done = None
+        finished = None
+        while True:
+            try:
+                message, value = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message == 'total':
+                total_rows = value
+            elif message == 'progress':
+                rows_done = value
+            else:
+                finished = (message, value)
+
+        return total_rows, rows_done, finished
 
 
 class PDFWriterApplication(Tk):
@@ -16,7 +114,7 @@ class PDFWriterApplication(Tk):
         Tk.__init__(self)
 
         # Configure root window
-        self.geometry('850x400')
+        self.geometry('850x500')
         self.title('PDF Writer Application')
         self.style = ttk.Style().theme_use('clam')
         self.text_font = 'Calibre 10 bold'
@@ -67,6 +165,9 @@ class PDFWriterApplication(Tk):
         # Create a Treeview widget to show the EFS data excel file content if user select the file with
         # open_excel_button
         self.tree = ttk.Treeview(self, height=4)
+        # Create a vertical Scrollbar for the Treeview, scrolling near the end of the Treeview inserts the next rows
+        self.tree_scrollbar = ttk.Scrollbar(self, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
 
         # Create open EFS template pds file button
         self.open_template_button = Button(text='Select template file', font=self.button_font, fg='white', bg='purple',
@@ -78,6 +179,110 @@ class PDFWriterApplication(Tk):
                                         command=lambda: self.fillable_pdf_writer())
         self.create_pdf_button.grid(row=11, column=2, pady=5, ipadx=5)
 
+        # Create number of worker processes label
+        self.workers_label = Label(self, text='Worker Processes:', font=self.text_font)
+        self.workers_label.grid(row=12, column=0, pady=5)
+        # Create number of worker processes Spinbox, 1 means the PDF files are created one after another
+        self.workers_box = Spinbox(self, from_=1, to=os.cpu_count() or 1, width=5)
+        self.workers_box.grid(row=12, column=1, sticky='w')
+
+        # Create incremental mode Checkbutton, if ticked only the PDF files of new or changed rows are created again
+        self.incremental_value = IntVar(value=0)
+        self.incremental_checkbutton = Checkbutton(self, text='Only update changed rows', font=self.text_font,
+                                                   variable=self.incremental_value)
+        self.incremental_checkbutton.grid(row=12, column=2, sticky='w')
+
+        # Create output mode label
+        self.output_mode_label = Label(self, text='Output Mode:', font=self.text_font)
+        self.output_mode_label.grid(row=13, column=0, pady=5)
+        # Create output mode Combobox, the displayed names map to the output_mode of run_fillable_pdf_writer
+        self.output_modes = {'One PDF file per row': 'files',
+                             'Single merged PDF file': 'merged',
+                             'Zip archive of PDF files': 'zip'}
+        self.output_mode_box = ttk.Combobox(self, values=list(self.output_modes.keys()), state='readonly', width=25)
+        self.output_mode_box.current(0)
+        self.output_mode_box.grid(row=13, column=1, sticky='w')
+
+        # Create cancel button, only enabled while the PDF files are being created
+        self.cancel_button = Button(text='Cancel', font=self.button_font, fg='white', bg='red', state=DISABLED,
+                                    command=lambda: self.cancel_pdf_writer())
+        self.cancel_button.grid(row=11, column=3, pady=5, ipadx=5)
+
+        # Create run report button, enabled once a run is finished to show where its time went
+        self.run_report_button = Button(text='Run report', font=self.button_font, fg='white', bg='gray',
+                                        state=DISABLED, command=lambda: self.show_run_report())
+        self.run_report_button.grid(row=11, column=4, pady=5, ipadx=5)
+
+        # Create profile Checkbutton, if ticked the run is profiled with cProfile and tracemalloc (slower)
+        self.profile_value = IntVar(value=0)
+        self.profile_checkbutton = Checkbutton(self, text='Profile run', font=self.text_font,
+                                               variable=self.profile_value)
+        self.profile_checkbutton.grid(row=12, column=3, sticky='w')
+
+        # Create flatten Checkbutton, if ticked the PDF files are created uneditable (no form fields)
+        self.flatten_value = IntVar(value=0)
+        self.flatten_checkbutton = Checkbutton(self, text='Flatten PDF (uneditable)', font=self.text_font,
+                                               variable=self.flatten_value)
+        self.flatten_checkbutton.grid(row=12, column=4, sticky='w')
+
+        # Create skip invalid rows Checkbutton, if ticked the rows with wrong data are left out instead of stopping the
+        # run, the errors are written to 'xxxxx_validation_errors.csv'
+        self.skip_invalid_rows_value = IntVar(value=0)
+        self.skip_invalid_rows_checkbutton = Checkbutton(self, text='Skip invalid rows', font=self.text_font,
+                                                         variable=self.skip_invalid_rows_value)
+        self.skip_invalid_rows_checkbutton.grid(row=13, column=4, sticky='w')
+
+        # Create verify Checkbutton, if ticked every PDF file is read back once created and the fields that do not hold
+        # the values of their row are written to 'xxxxx_verification_errors.csv'
+        self.verify_value = IntVar(value=0)
+        self.verify_checkbutton = Checkbutton(self, text='Verify PDF files', font=self.text_font,
+                                              variable=self.verify_value)
+        self.verify_checkbutton.grid(row=15, column=4, sticky='w')
+
+        # Create progress bar and progress label (rows done, rows/sec and ETA) of the current run
+        self.progress_bar = ttk.Progressbar(self, orient=HORIZONTAL, length=300, mode='determinate')
+        self.progress_bar.grid(row=14, column=0, columnspan=2, pady=5, padx=10, sticky='ew')
+        self.progress_label = Label(self, text='', font=self.text_font)
+        self.progress_label.grid(row=14, column=2, columnspan=3, sticky='w')
+
+        # Create preview label showing the number of rows loaded from the selected EFS data excel file
+        self.preview_label = Label(self, text='', font=self.text_font)
+        self.preview_label.grid(row=13, column=2, columnspan=2, sticky='w')
+
+        # The PdfWriterRun of the current run on a background thread, the Tk widgets are only updated from the main
+        # thread in poll_progress
+        self.pdf_writer_run = None
+        self.total_rows = None
+        self.start_time = None
+        self.run_report = None
+
+        # The background thread reading the selected EFS data excel file, the dataframes (before preprocessing) it has
+        # read so far and the position (dataframe index, row index) of the next row to insert in the Treeview
+        self.preview_thread = None
+        self.preview_queue = queue.Queue()
+        self.preview_stop_event = threading.Event()
+        self.preview_file = None
+        self.preview_mtime = None
+        self.preview_dfs = []
+        self.preview_loaded = False
+        self.preview_position = (0, 0)
+
+        # Import the modules used to read the excel file and create the PDF files while the user picks the files
+        self.warm_up_thread = threading.Thread(target=self.warm_up_imports, daemon=True)
+        self.after(100, self.warm_up_thread.start)
+
+    def warm_up_imports(self):
+        """
+        This function runs on the background thread started once the window is shown, it imports pandas, fillpdf and
+        the modules of FillablePdfWriter so that they are already loaded when the user opens a file or creates the PDF
+        files, the functions using them import them again (at no cost) in case the warm up is not finished
+        """
+        try:
+            import PdfWriter
+        except ImportError:
+            # The error is shown to the user when the file is opened or the PDF files are created
+            pass
+
     def open_excel_file(self):
         """
         This function is used in open_excel_button for user to select the EFS data excel file
@@ -86,37 +291,38 @@ class PDFWriterApplication(Tk):
         """
         # Get the EFS database excel file location
         input_excel_file = filedialog.askopenfilename(title='Select EFS Data Excel File',
-                                                      filetype=(('Excel files', '*.xlsx'), ('All files', '*.')))
+                                                      filetype=(('Excel files', '*.xlsx'), ('CSV files', '*.csv'),
+                                                                ('Parquet files', '*.parquet'), ('All files', '*.')))
 
-        # If selected excel file exists, create a raw string for the filename, else raise the errors
-        if input_excel_file:
-            try:
-                input_excel_file = r'{}'.format(input_excel_file)
-                df = pd.read_excel(input_excel_file)
-            except ValueError:
-                Label(text='File could not be opened')
-            except FileNotFoundError:
-                Label(text='File not found')
+        # Nothing to show if no file is selected
+        if not input_excel_file:
+            return
+        input_excel_file = r'{}'.format(input_excel_file)
 
-        # Clear all the previous data in tree
+        # Stop reading the previous excel file and clear all the previous data in tree
+        self.preview_stop_event.set()
         self.clear_treeview()
-
-        # Add new data in Treeview widget
-        self.tree['column'] = list(df.columns)
-        self.tree['show'] = 'headings'
-
-        # Set headings by iterating over the dataframe columns
-        for col in self.tree['column']:
-            self.tree.heading(col, text=col)
-
-        # Put data in rows
-        df_rows = df.to_numpy().tolist()
-        for index, row in enumerate(df_rows):
-            self.tree.insert('', 'end', values=row)
-            self.tree.column(index, stretch=NO, width=100)
-
-        # Set the grid of Treeview widget
+        self.tree['column'] = []
+
+        # Read the excel file on a background thread, the header and the first rows are shown as soon as they are
+        # read and the whole file is kept in memory to be reused by create_pdf_button
+        self.preview_queue = queue.Queue()
+        self.preview_stop_event = threading.Event()
+        self.preview_file = os.path.abspath(input_excel_file)
+        self.preview_mtime = os.path.getmtime(input_excel_file)
+        self.preview_dfs = []
+        self.preview_loaded = False
+        self.preview_position = (0, 0)
+        self.preview_label.config(text='Loading excel file...', fg='black')
+        self.preview_thread = threading.Thread(target=self.load_excel_preview_in_background,
+                                               args=(input_excel_file, self.preview_queue, self.preview_stop_event),
+                                               daemon=True)
+        self.preview_thread.start()
+        self.after(100, self.poll_preview, self.preview_queue)
+
+        # Set the grid of Treeview widget and its Scrollbar
         self.tree.grid(row=5, rowspan=5, columnspan=10, pady=5, padx=10, sticky='nsew')
+        self.tree_scrollbar.grid(row=5, rowspan=5, column=10, pady=5, sticky='ns')
 
         # Delete previous filename
         self.input_path_box.delete(0, END)
@@ -136,6 +342,133 @@ class PDFWriterApplication(Tk):
         """
         self.tree.delete(*self.tree.get_children())
 
+    def load_excel_preview_in_background(self, input_excel_file: str, preview_queue: queue.Queue,
+                                         stop_event: threading.Event):
+        """
+        This function runs on the background thread started by open_excel_file, it never touches the Tk widgets and
+        only puts ('rows' | 'done' | 'error', value) messages in preview_queue
+        :param input_excel_file: The full file name of the selected EFS data excel file
+        :param preview_queue: The queue read by poll_preview
+        :param stop_event: A threading.Event set when another excel file is selected
+        """
+        try:
+            from PdfWriter import FillablePdfWriter
+            from EfsDataCache import EfsDataCache, DEFAULT_CACHE_DIR
+            from EfsDataReader import iterate_chunks_of_df
+
+            path, efs_data_excel_file = os.path.split(input_excel_file)
+            # The excel file is only parsed if it is not in the EFS data cache yet (or changed since), the cache is
+            # stored once the whole file is read
+            efs_data_cache = EfsDataCache(DEFAULT_CACHE_DIR)
+            efs_data_df = efs_data_cache.load(input_excel_file, 'raw')
+            if efs_data_df is not None:
+                efs_data_dfs = iterate_chunks_of_df(efs_data_df, first_chunk_size=PREVIEW_PAGE_ROWS)
+            else:
+                # The first dataframe only has the rows of the first page so that they are shown straight away
+                efs_data_dfs = efs_data_cache.cache_dfs(
+                    input_excel_file, 'raw', FillablePdfWriter().read_efs_excel_in_chunks(
+                        path, efs_data_excel_file, first_chunk_size=PREVIEW_PAGE_ROWS))
+            for efs_data_df in efs_data_dfs:
+                if stop_event.is_set():
+                    return
+                preview_queue.put(('rows', efs_data_df))
+            preview_queue.put(('done', None))
+        except Exception as error:
+            preview_queue.put(('error', str(error)))
+
+    def poll_preview(self, preview_queue: queue.Queue):
+        """
+        This function is called every 100 ms with after() while the selected excel file is read to show its rows
+        :param preview_queue: The queue of the excel file being read, polling stops once another file is selected
+        """
+        if preview_queue is not self.preview_queue:
+            return
+
+        finished = None
+        while True:
+            try:
+                message, value = preview_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message == 'rows':
+                # Set the columns and headings of Treeview once, when the first dataframe is read
+                if not self.preview_dfs:
+                    self.show_preview_columns(list(value.columns))
+                self.preview_dfs.append(value)
+            else:
+                finished = (message, value)
+
+        # Fill the first page, or the next page if the user already scrolled to the end of the rows loaded so far
+        if not self.tree.get_children() or self.tree.yview()[1] >= 0.9:
+            self.insert_preview_page()
+
+        rows_read = sum(len(efs_data_df) for efs_data_df in self.preview_dfs)
+        if finished is None:
+            self.preview_label.config(text=f'Loading excel file... {rows_read} rows read')
+            self.after(100, self.poll_preview, preview_queue)
+        elif finished[0] == 'done':
+            self.preview_loaded = True
+            self.preview_label.config(text=f'{rows_read} rows loaded')
+        else:
+            self.preview_label.config(text=f'File could not be opened: {finished[1]}', fg='red')
+
+    def show_preview_columns(self, columns: list):
+        """
+        This function is used in poll_preview to set the columns and headings of Treeview
+        :param columns: The column names of EFS data excel file
+        """
+        self.tree['column'] = columns
+        self.tree['show'] = 'headings'
+
+        # Set headings and width by iterating over the dataframe columns
+        for col in self.tree['column']:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, stretch=NO, width=100)
+
+    def insert_preview_page(self):
+        """
+        This function inserts the next PREVIEW_PAGE_ROWS rows already read from the excel file in Treeview
+        """
+        rows_to_insert = PREVIEW_PAGE_ROWS
+        df_index, row_index = self.preview_position
+        while rows_to_insert and df_index < len(self.preview_dfs):
+            efs_data_df = self.preview_dfs[df_index]
+            # Put data in rows
+            df_rows = efs_data_df.iloc[row_index:row_index + rows_to_insert].to_numpy().tolist()
+            for row in df_rows:
+                self.tree.insert('', 'end', values=row)
+            rows_to_insert -= len(df_rows)
+            row_index += len(df_rows)
+            if row_index >= len(efs_data_df):
+                df_index, row_index = df_index + 1, 0
+        self.preview_position = (df_index, row_index)
+
+    def on_tree_scroll(self, first: str, last: str):
+        """
+        This function is the yscrollcommand of Treeview, it moves the Scrollbar and inserts the next rows once the user
+        scrolls near the end of the rows in Treeview
+        :param first: The top of the visible rows as a fraction of all the rows in Treeview
+        :param last: The bottom of the visible rows as a fraction of all the rows in Treeview
+        """
+        self.tree_scrollbar.set(first, last)
+        if self.tree.get_children() and float(last) >= 0.9:
+            self.insert_preview_page()
+
+    def get_preview_dfs(self, path: str, efs_data_excel_file: str):
+        """
+        This function is used in fillable_pdf_writer to reuse the excel file already read by open_excel_file
+        :param path: The path in input path Entry box
+        :param efs_data_excel_file: The filename in excel filename Entry box
+        :return: A list of dataframes of EFS data before preprocessing, or None if the excel file in the Entry boxes is
+        not the file fully read by open_excel_file or was changed since
+        """
+        input_excel_file = os.path.abspath(os.path.join(path, efs_data_excel_file))
+        if not self.preview_loaded or input_excel_file != self.preview_file or \
+                not os.path.exists(input_excel_file) or os.path.getmtime(input_excel_file) != self.preview_mtime:
+            return None
+
+        return list(self.preview_dfs)
+
     def open_template_file(self):
         """
         This function is used in open_template_button for user to select the EFS template pdf file, the selected
@@ -144,7 +477,9 @@ class PDFWriterApplication(Tk):
         """
         # Get the EFS template pdf file location
         input_template_file = filedialog.askopenfilename(title='Select EFS Data Excel File',
-                                                         filetype=(('PDF files', '*.pdf'), ('All files', '*.')))
+                                                         filetype=(('PDF files', '*.pdf'),
+                                                                   ('Template routing files', '*.json'),
+                                                                   ('All files', '*.')))
 
         # If selected pdf file exists, create a raw string for the filename, else raise the errors
         if input_template_file:
@@ -166,17 +501,133 @@ class PDFWriterApplication(Tk):
 
     def fillable_pdf_writer(self):
         """
+        This function is used in create_pdf_button to start creating the EFS PDF files on a background thread, so that
+        the window stays responsive and the run can be cancelled
         :return: create individual EFS PDF file based on the number of data rows in EFS data excel file
         """
-        # Instantiate class FillablePdfWriter
-        pdf_writer = FillablePdfWriter()
+        # Only one run at a time
+        if self.pdf_writer_run is not None and self.pdf_writer_run.is_alive():
+            return
+        from RunReport import RunReport
+        from EfsDataCache import DEFAULT_CACHE_DIR
 
         # Get all the values from 5 Entry boxes and pass into 5 variables
         path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name = self.get_value()
+        run_options = {'workers': self.get_workers(),
+                       'incremental': bool(self.incremental_value.get()),
+                       'output_mode': self.output_modes[self.output_mode_box.get()],
+                       'flatten': bool(self.flatten_value.get()),
+                       'validation': 'skip' if self.skip_invalid_rows_value.get() else 'strict',
+                       'verify': bool(self.verify_value.get()),
+                       'cache_dir': DEFAULT_CACHE_DIR,
+                       'efs_data_dfs': self.get_preview_dfs(path, efs_data_excel_file)}
+
+        # Record the stage and row timings of the run, shown by run_report_button once the run is finished
+        self.run_report = RunReport(profile=bool(self.profile_value.get()), trace_memory=bool(self.profile_value.get()))
+        run_options['run_report'] = self.run_report
+
+        # Reset the progress of the previous run
+        self.total_rows = None
+        self.start_time = time.perf_counter()
+        self.progress_bar.config(mode='indeterminate', value=0)
+        self.progress_bar.start()
+        self.progress_label.config(text='Reading excel file...', fg='black')
+        self.create_pdf_button.config(state=DISABLED)
+        self.cancel_button.config(state=NORMAL)
+        self.run_report_button.config(state=DISABLED)
+
+        # Create several EFS PDF files on a background thread
+        self.pdf_writer_run = PdfWriterRun(path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name,
+                                           run_options)
+        self.pdf_writer_run.start()
+        self.after(100, self.poll_progress)
+
+    def poll_progress(self):
+        """
+        This function is called every 100 ms with after() while a run is in progress to show its progress
+        """
+        # Read every message put in the queue since the last poll, only the latest progress is shown
+        total_rows, rows_done, finished = self.pdf_writer_run.read_messages()
+        if total_rows is not None:
+            self.total_rows = total_rows
+            if total_rows:
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate', maximum=total_rows, value=0)
+
+        if rows_done is not None:
+            self.show_progress(rows_done)
+
+        if finished is None:
+            self.after(100, self.poll_progress)
+            return
+
+        # The run is finished
+        self.progress_bar.stop()
+        self.create_pdf_button.config(state=NORMAL)
+        self.cancel_button.config(state=DISABLED)
+        if self.run_report is not None and self.run_report.status is not None:
+            self.run_report_button.config(state=NORMAL)
+        message, value = finished
+        if message == 'done':
+            if self.total_rows:
+                self.progress_bar.config(mode='determinate', value=self.total_rows)
+            self.show_created_message()
+        elif message == 'cancelled':
+            self.progress_label.config(text='Run cancelled, the PDF files already created are kept', fg='red')
+        else:
+            self.progress_label.config(text=f'Error: {value}', fg='red')
+
+    def show_progress(self, rows_done: int):
+        """
+        This function is used in poll_progress to show the rows done, rows/sec and ETA of the current run
+        :param rows_done: The number of rows done
+        """
+        elapsed_seconds = max(time.perf_counter() - self.start_time, 1e-6)
+        rows_per_second = rows_done / elapsed_seconds
+        progress_text = f'{rows_done} rows  |  {rows_per_second:.1f} rows/sec'
 
-        # Create several EFS PDF files
-        pdf_writer.run_fillable_pdf_writer(path, efs_data_excel_file, efs_template_pdf, output_path, output_file_name)
+        if self.total_rows:
+            self.progress_bar.config(value=min(rows_done, self.total_rows))
+            progress_text = f'{rows_done} / {self.total_rows} rows  |  {rows_per_second:.1f} rows/sec'
+            if rows_per_second > 0:
+                eta_seconds = int(max(self.total_rows - rows_done, 0) / rows_per_second)
+                progress_text += f'  |  ETA {eta_seconds // 60:02d}:{eta_seconds % 60:02d}'
 
+        self.progress_label.config(text=progress_text)
+
+    def cancel_pdf_writer(self):
+        """
+        This function is used in cancel_button to stop the current run cleanly after the current PDF file
+        """
+        self.pdf_writer_run.cancel()
+        self.cancel_button.config(state=DISABLED)
+        self.progress_label.config(text='Cancelling after the current file...', fg='red')
+
+    def show_run_report(self):
+        """
+        This function is used in run_report_button to show the run report of the last run in a new window
+        """
+        if self.run_report is None or self.run_report.status is None:
+            return
+
+        report_window = Toplevel(self)
+        report_window.title('Run Report')
+        report_text = Text(report_window, width=110, height=30, font='Courier 9')
+        report_scrollbar = ttk.Scrollbar(report_window, orient=VERTICAL, command=report_text.yview)
+        report_text.configure(yscrollcommand=report_scrollbar.set)
+        report_text.grid(row=0, column=0, sticky='nsew')
+        report_scrollbar.grid(row=0, column=1, sticky='ns')
+        report_window.grid_rowconfigure(0, weight=1)
+        report_window.grid_columnconfigure(0, weight=1)
+
+        # Show the report as read-only text
+        report_text.insert(END, self.run_report.format_summary())
+        report_text.config(state=DISABLED)
+
+    def show_created_message(self):
+        """
+        This function is used in poll_progress to prompt the feedback once the PDF files are created
+        """
         # Prompt the feedback if create_pdf_button managed to run successfully
         Label(text='PDF successfully created! Click the button to view the file  ============>', font=self.button_font,
               fg='green').grid(row=10, columnspan=3, pady=5)
@@ -194,6 +645,16 @@ class PDFWriterApplication(Tk):
         return self.input_path_box.get(), self.excel_filename_box.get(), self.template_filename_box.get(), \
                self.output_path_box.get(), self.output_filename_box.get()
 
+    def get_workers(self):
+        """
+        This function is used in fillable_pdf_writer function to get the number of worker processes
+        :return: the number of worker processes in workers Spinbox, 1 if the value is not a positive number
+        """
+        try:
+            return max(1, int(self.workers_box.get()))
+        except ValueError:
+            return 1
+
     def view_created_file(self):
         """
         :return: pop out a window for user to choose which created PDF to view
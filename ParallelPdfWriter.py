@@ -0,0 +1,203 @@
+# Import libraries
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from PdfTemplate import ByteStampedPdfTemplate, write_filled_pdf
+
+# The EFS template used by the current worker process, it is loaded only once by init_fill_pdfs_worker
+worker_efs_template_pdf = None
+# The multiprocessing.Event shared with the parent process, once set the workers stop after their current row
+worker_stop_event = None
+
+
+def init_fill_pdfs_worker(efs_template_pdf: str, use_compiled_template: bool = True, stop_event=None,
+                          flatten: bool = False):
+    """
+    A function that is run once in every worker process of the pool to load the EFS template
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :param use_compiled_template: Parse the EFS template once and reuse it for every row (default True)
+    :param stop_event: A multiprocessing.Event set by the parent process when the run is cancelled
+    :param flatten: Write uneditable pdf files (default False, see ByteStampedPdfTemplate)
+    """
+    global worker_efs_template_pdf, worker_stop_event
+    worker_stop_event = stop_event
+    if use_compiled_template:
+        worker_efs_template_pdf = ByteStampedPdfTemplate(efs_template_pdf, flatten)
+    else:
+        worker_efs_template_pdf = efs_template_pdf
+
+
+def fill_pdfs_chunk(output_path: str, output_file_name: str, chunk: list):
+    """
+    A function that creates the PDF files of one chunk of rows in a worker process
+    :param output_path: The directory where you want to create the new PDF files
+    :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf')
+    :param chunk: A list of (row number, final value dictionary), the row number is used as the filename suffix
+    :return: The number of rows done (the rows that could not be created are not counted), a list of (row number,
+    error message) for the rows that could not be created and a list of (row number, seconds, bytes written) for the
+    rows created
+    """
+    rows_done = 0
+    row_errors = []
+    row_timings = []
+    for row_number, final_value_dict in chunk:
+        # stop before the next row if the run is cancelled
+        if worker_stop_event is not None and worker_stop_event.is_set():
+            break
+        output_pdf_file = f'{output_path}/{output_file_name}_{row_number}.pdf'
+        start_time = time.perf_counter()
+        try:
+            write_filled_pdf(worker_efs_template_pdf, output_pdf_file, final_value_dict)
+        except Exception as error:
+            row_errors.append((row_number, f'{type(error).__name__}: {error}'))
+            continue
+        rows_done += 1
+        row_timings.append((row_number, time.perf_counter() - start_time, os.path.getsize(output_pdf_file)))
+
+    return rows_done, row_errors, row_timings
+
+
+def iterate_chunks(numbered_final_value_dicts, chunk_size: int):
+    """
+    A function that groups the rows into chunks of rows as they are read
+    :param numbered_final_value_dicts: An iterable of (row number, final value dictionary), one per pdf file
+    :param chunk_size: The number of rows in each chunk
+    :return: A generator of chunks, each chunk is a list of (row number, final value dictionary)
+    """
+    numbered_rows = iter(numbered_final_value_dicts)
+    chunk = list(islice(numbered_rows, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(numbered_rows, chunk_size))
+
+
+def collect_chunk_results(done_futures, row_errors: list, run_report=None):
+    """
+    A function that collects the row errors of the finished chunks
+    :param done_futures: The finished futures returned by concurrent.futures.wait
+    :param row_errors: The list of (row number, error message) to extend
+    :param run_report: A RunReport that records the seconds and bytes of each row created by the workers
+    :return: The number of rows done in the finished chunks, chunks cancelled before they started are not counted
+    """
+    rows_done = 0
+    for future in done_futures:
+        if future.cancelled():
+            continue
+        chunk_rows_done, chunk_row_errors, chunk_row_timings = future.result()
+        rows_done += chunk_rows_done
+        row_errors.extend(chunk_row_errors)
+        if run_report is not None:
+            for row_number, seconds, bytes_written in chunk_row_timings:
+                run_report.add_row(row_number, seconds, bytes_written)
+
+    return rows_done
+
+
+class PdfWriterPool:
+    """
+    This class is used to keep a process pool whose workers have loaded the EFS template between several runs, e.g. in
+    the watch mode of PDFWriterCLI, instead of starting a new pool and parsing the template again for every run
+    """
+
+    def __init__(self, efs_template_pdf: str, workers: int, use_compiled_template: bool = True, flatten: bool = False):
+        """
+        Start the worker processes, each one loads the EFS template once
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param workers: The number of worker processes
+        :param use_compiled_template: Parse the EFS template once per worker and reuse it for every row (default True)
+        :param flatten: Write uneditable pdf files (default False)
+        """
+        self.efs_template_pdf = efs_template_pdf
+        self.workers = workers
+        self.use_compiled_template = use_compiled_template
+        self.flatten = flatten
+        # Set to stop the workers after their current row, cleared at the start of every run
+        self.stop_event = multiprocessing.Event()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_fill_pdfs_worker,
+                                            initargs=(efs_template_pdf, use_compiled_template, self.stop_event,
+                                                      flatten))
+
+    def matches(self, efs_template_pdf: str, use_compiled_template: bool, flatten: bool):
+        """
+        :return: True if the workers loaded the same EFS template with the same options
+        """
+        return os.path.abspath(efs_template_pdf) == os.path.abspath(self.efs_template_pdf) and \
+            use_compiled_template == self.use_compiled_template and flatten == self.flatten
+
+    def close(self):
+        """
+        A function that waits for the running chunks and stops the worker processes
+        """
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def fill_pdfs_in_parallel(efs_template_pdf: str, output_path: str, output_file_name: str, numbered_final_value_dicts,
+                          workers: int, use_compiled_template: bool = True, chunk_size: int = 100,
+                          progress_callback=None, cancel_event=None, run_report=None, flatten: bool = False,
+                          pool: PdfWriterPool = None):
+    """
+    A function that creates individual PDF files in a pool of worker processes
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :param output_path: The directory where you want to create the new PDF files
+    :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf'), row n is always
+    written to 'xxxxx_n.pdf' whichever worker creates it
+    :param numbered_final_value_dicts: An iterable (list or generator) of (row number, final value dictionary), one
+    per pdf file
+    :param workers: The number of worker processes
+    :param use_compiled_template: Parse the EFS template once per worker and reuse it for every row (default True)
+    :param chunk_size: The number of rows sent to a worker at a time (default 100)
+    :param progress_callback: A function called with the number of rows done each time a chunk is finished
+    :param cancel_event: A threading.Event, once set no new chunk is started and every worker stops after its
+    current row
+    :param run_report: A RunReport that records the seconds and bytes of each row, the seconds of a row are measured in
+    its worker process
+    :param flatten: Write uneditable pdf files (default False), only with use_compiled_template
+    :param pool: A PdfWriterPool already started for the same EFS template and options, it is kept running after this
+    run (default None, a new pool is started and stopped)
+    :return: A list of (row number, error message) sorted by row number for the rows that could not be created
+    """
+    if pool is None:
+        with PdfWriterPool(efs_template_pdf, workers, use_compiled_template, flatten) as pool:
+            return fill_pdfs_in_parallel(efs_template_pdf, output_path, output_file_name, numbered_final_value_dicts,
+                                         workers, use_compiled_template, chunk_size, progress_callback, cancel_event,
+                                         run_report, flatten, pool)
+    if not pool.matches(efs_template_pdf, use_compiled_template, flatten):
+        raise ValueError('The worker pool was started for another EFS template or other options')
+
+    row_errors = []
+    rows_done = 0
+    stop_event = pool.stop_event
+    stop_event.clear()
+    executor = pool.executor
+    pending_futures = set()
+    for chunk in iterate_chunks(numbered_final_value_dicts, chunk_size):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        # Keep at most 2 chunks per worker waiting so that the rows are not all read into memory at once
+        if len(pending_futures) >= workers * 2:
+            done_futures, pending_futures = wait(pending_futures, return_when=FIRST_COMPLETED)
+            rows_done += collect_chunk_results(done_futures, row_errors, run_report)
+            if progress_callback is not None:
+                progress_callback(rows_done)
+        pending_futures.add(executor.submit(fill_pdfs_chunk, output_path, output_file_name, chunk))
+
+    while pending_futures:
+        # Pass the cancellation on to the workers, the chunks that have not started yet are cancelled
+        if cancel_event is not None and cancel_event.is_set():
+            stop_event.set()
+            for future in pending_futures:
+                future.cancel()
+        done_futures, pending_futures = wait(pending_futures, timeout=0.5, return_when=FIRST_COMPLETED)
+        rows_done += collect_chunk_results(done_futures, row_errors, run_report)
+        if done_futures and progress_callback is not None:
+            progress_callback(rows_done)
+
+    return sorted(row_errors)
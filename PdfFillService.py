@@ -0,0 +1,393 @@
+# Import libraries
+import io
+import os
+import sys
+import json
+import asyncio
+import zipfile
+import argparse
+import logging
+from urllib.parse import urlsplit
+from concurrent.futures.process import BrokenProcessPool
+import ParallelPdfWriter
+from ParallelPdfWriter import PdfWriterPool
+from PdfTemplate import write_filled_pdf
+
+logger = logging.getLogger('PdfFillService')
+
+# The HTTP reason phrases of the status codes returned by the service
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+# The errors raised by a trade with wrong data (e.g. a missing column or a date that is not a date), reported as a
+# 400 to the client, the other errors (e.g. a missing module or template) are errors of the service reported as a 500
+TRADE_DATA_ERRORS = (KeyError, ValueError, TypeError)
+
+
+class EfsTradeError(Exception):
+    """
+    This class is used to report a trade that could not be filled, e.g. a missing column
+    """
+
+
+def create_efs_trade_pdfs(efs_trades: list):
+    """
+    A function that creates the PDF files of a chunk of trades in a worker process of the service, the worker loaded
+    the EFS template once in init_fill_pdfs_worker
+    :param efs_trades: A list of EFS trade dictionaries with the columns of EFS data excel file, the dates
+    (DATE_COLUMNS) in ISO format, e.g. {'Start Date': '2021-02-01', 'Shipment': '2021-07-01', ...}
+    :return: A list of pdf bytes, one per trade
+    """
+    # pandas and the preprocessing are only needed in the worker processes
+    import pandas as pd
+    from PdfWriter import FillablePdfWriter
+    from EfsDataReader import DATE_COLUMNS
+    from TemplateConfig import load_template_config
+
+    pdf_writer = FillablePdfWriter()
+    efs_data_df = pd.DataFrame(efs_trades)
+    for column in DATE_COLUMNS:
+        if column in efs_data_df.columns:
+            efs_data_df[column] = pd.to_datetime(efs_data_df[column], format='ISO8601')
+
+    # The fields are mapped by the config file of the template, the default fields (e.g. the current date and time)
+    # are created for every chunk
+    template_config = load_template_config(ParallelPdfWriter.worker_efs_template_pdf.efs_template_pdf)
+    final_value_dicts = pdf_writer.iterate_final_value_dicts(
+        pdf_writer.create_default_dict(template_config),
+        enumerate(pdf_writer.iterate_efs_data_dicts_from_dfs([efs_data_df], template_config=template_config),
+                  start=1))
+    pdfs = []
+    for _, final_value_dict in final_value_dicts:
+        buffer = io.BytesIO()
+        write_filled_pdf(ParallelPdfWriter.worker_efs_template_pdf, buffer, final_value_dict)
+        pdfs.append(buffer.getvalue())
+
+    return pdfs
+
+
+def fill_efs_trades_chunk(efs_trades: list):
+    """
+    A function that creates the PDF files of a chunk of trades (of one or several requests) in a worker process, if
+    the chunk cannot be filled because of wrong data the trades are filled one by one so that only the requests of the
+    wrong trades fail, any other error is raised
+    :param efs_trades: A list of EFS trade dictionaries with the same keys
+    :return: A list of (pdf bytes, None) or (None, error message), one per trade
+    """
+    try:
+        return [(pdf, None) for pdf in create_efs_trade_pdfs(efs_trades)]
+    except TRADE_DATA_ERRORS as error:
+        if len(efs_trades) == 1:
+            return [(None, f'{type(error).__name__}: {error}')]
+
+    return [fill_efs_trades_chunk([efs_trade])[0] for efs_trade in efs_trades]
+
+
+def warm_up_worker():
+    """
+    A function run once in every worker process when the service starts, so that the first request does not pay for
+    importing pandas and FillablePdfWriter, the service does not start if it cannot be imported
+    :return: The process id of the worker
+    """
+    import PdfWriter
+
+    return os.getpid()
+
+
+def create_zip(pdfs: list):
+    """
+    :param pdfs: A list of pdf bytes
+    :return: The bytes of a zip archive of the PDF files named 'efs_1.pdf', 'efs_2.pdf', ...
+    """
+    buffer = io.BytesIO()
+    # Stored without compression like ZipPdfWriter, the pdf streams are already compressed
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        for row_number, pdf in enumerate(pdfs, start=1):
+            zip_file.writestr(f'efs_{row_number}.pdf', pdf)
+
+    return buffer.getvalue()
+
+
+class PdfFillService:
+    """
+    This class is used to create EFS PDF files on demand over HTTP: the EFS template is loaded once by each worker
+    process of a pool kept running, the trades of the requests received within batch_wait_seconds are filled together
+    in chunks by the pool (preprocessing a chunk costs about the same for 1 or 20 trades), at most workers * 2 chunks
+    are filled at a time and requests are refused (503) once too many trades are waiting
+    POST /fill with one trade (json object) returns its pdf, with a list of trades returns a zip of 'efs_n.pdf'
+    GET /health returns the counters of the service as json
+    """
+
+    def __init__(self, efs_template_pdf: str, workers: int = 2, chunk_size: int = 20, max_queued_trades: int = 5000,
+                 max_body_bytes: int = 10 * 1024 * 1024, flatten: bool = False, batch_wait_seconds: float = 0.005):
+        """
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param workers: The number of worker processes (default 2)
+        :param chunk_size: The number of trades sent to a worker at a time (default 20)
+        :param max_queued_trades: The number of trades waiting or being filled above which new requests are refused
+        with 503 and a Retry-After header (default 5000)
+        :param max_body_bytes: The largest request body accepted (default 10 MB)
+        :param flatten: Create uneditable PDF files (default False)
+        :param batch_wait_seconds: The seconds a trade waits for the trades of other requests to fill them together
+        (default 0.005), a chunk is sent as soon as it has chunk_size trades
+        """
+        self.efs_template_pdf = efs_template_pdf
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_queued_trades = max_queued_trades
+        self.max_body_bytes = max_body_bytes
+        self.flatten = flatten
+        self.batch_wait_seconds = batch_wait_seconds
+        self.pool = None
+        self.chunk_semaphore = None
+        # Trade keys -> list of (trade, future) waiting to be sent to the pool, only the trades with the same keys are
+        # filled together so that a column of one request is never added to the trades of another request
+        self.pending_trades = {}
+        # The tasks of the chunks being filled, kept so that they are not garbage collected
+        self.chunk_tasks = set()
+
+        # Counters of the service
+        self.queued_trades = 0
+        self.requests_done = 0
+        self.requests_refused = 0
+        self.trades_done = 0
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        """
+        A function that starts the worker processes and the HTTP server
+        :param host: The address to listen on (default 127.0.0.1, only local tools can connect)
+        :param port: The port to listen on (default 8765, 0 for any free port)
+        :return: The asyncio.Server, e.g. server.sockets[0].getsockname() is the address listened on
+        """
+        self.pool = PdfWriterPool(self.efs_template_pdf, self.workers, True, self.flatten)
+        self.chunk_semaphore = asyncio.Semaphore(self.workers * 2)
+        # Start every worker (which loads the template) before the first request arrives
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(self.pool.executor, warm_up_worker)
+                               for _ in range(self.workers)))
+
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        """
+        A function that stops the worker processes
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        A function that answers the HTTP/1.1 requests of one connection until the client closes it
+        :param reader: The stream of the request bytes
+        :param writer: The stream of the response bytes
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    header_line = (await reader.readline()).decode('latin-1').strip()
+                    if not header_line:
+                        break
+                    name, _, value = header_line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                content_length = int(headers.get('content-length', 0))
+                if content_length > self.max_body_bytes:
+                    await self.send_response(writer, 413, *self.json_body({'error': 'Request body too large'}),
+                                             keep_alive=False)
+                    break
+                body = await reader.readexactly(content_length) if content_length else b''
+
+                status, content_type, content, extra_headers = await self.handle_request(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                await self.send_response(writer, status, content_type, content, extra_headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # The client closed the connection or sent a malformed request
+            pass
+        finally:
+            writer.close()
+
+    async def send_response(self, writer: asyncio.StreamWriter, status: int, content_type: str, content: bytes,
+                            extra_headers: dict = None, keep_alive: bool = True):
+        """
+        A function that writes one HTTP response
+        :param writer: The stream of the response bytes
+        :param status: The HTTP status code, e.g. 200
+        :param content_type: The Content-Type of the response body
+        :param content: The response body
+        :param extra_headers: Other headers, e.g. {'Retry-After': '1'}
+        :param keep_alive: Keep the connection open for the next request
+        """
+        headers = {'Content-Type': content_type,
+                   'Content-Length': str(len(content)),
+                   'Connection': 'keep-alive' if keep_alive else 'close',
+                   **(extra_headers or {})}
+        head = f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}\r\n' + \
+            ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1') + content)
+        await writer.drain()
+
+    def json_body(self, value):
+        """
+        :param value: A json serializable value
+        :return: The content type and the bytes of the json response body
+        """
+        return 'application/json', json.dumps(value).encode('utf-8')
+
+    async def handle_request(self, method: str, target: str, body: bytes):
+        """
+        A function that routes one request
+        :param method: The HTTP method, e.g. 'POST'
+        :param target: The request target, e.g. '/fill'
+        :param body: The request body
+        :return: The status code, content type, response body and extra headers
+        """
+        path = urlsplit(target).path
+        if path == '/health':
+            if method != 'GET':
+                return 405, *self.json_body({'error': 'Use GET'}), None
+            return 200, *self.json_body({'status': 'ok', 'workers': self.workers, 'queued_trades': self.queued_trades,
+                                         'requests_done': self.requests_done, 'trades_done': self.trades_done,
+                                         'requests_refused': self.requests_refused}), None
+        if path != '/fill':
+            return 404, *self.json_body({'error': f'Unknown path {path!r}'}), None
+        if method != 'POST':
+            return 405, *self.json_body({'error': 'Use POST'}), None
+
+        try:
+            efs_trades = json.loads(body)
+        except ValueError as error:
+            return 400, *self.json_body({'error': f'Invalid json: {error}'}), None
+        single_trade = isinstance(efs_trades, dict)
+        efs_trades = [efs_trades] if single_trade else efs_trades
+        if not isinstance(efs_trades, list) or not efs_trades or \
+                not all(isinstance(efs_trade, dict) for efs_trade in efs_trades):
+            return 400, *self.json_body({'error': 'Send one trade (json object) or a list of trades'}), None
+
+        # Backpressure, the client should retry later instead of queueing more trades than the pool can fill
+        if self.queued_trades + len(efs_trades) > self.max_queued_trades:
+            self.requests_refused += 1
+            return 503, *self.json_body({'error': 'Too many trades waiting, retry later'}), {'Retry-After': '1'}
+
+        self.queued_trades += len(efs_trades)
+        try:
+            pdfs = await asyncio.gather(*(self.queue_trade(efs_trade) for efs_trade in efs_trades))
+        except EfsTradeError as error:
+            # The trades could not be filled, e.g. a missing column
+            return 400, *self.json_body({'error': str(error)}), None
+        except BrokenProcessPool as error:
+            logger.error('Worker pool stopped: %s', error)
+            return 500, *self.json_body({'error': 'The worker processes stopped'}), None
+        except Exception as error:
+            # Not an error of the trades, the service itself cannot fill them
+            logger.exception('Failed to fill the trades')
+            return 500, *self.json_body({'error': f'{type(error).__name__}: {error}'}), None
+        finally:
+            self.queued_trades -= len(efs_trades)
+        self.requests_done += 1
+        self.trades_done += len(pdfs)
+
+        if single_trade:
+            return 200, 'application/pdf', pdfs[0], None
+        # The zip archive is built on a thread so that the other requests are not held up
+        return 200, 'application/zip', await asyncio.get_running_loop().run_in_executor(None, create_zip, pdfs), None
+
+    def queue_trade(self, efs_trade: dict):
+        """
+        A function that adds a trade to the next chunk of the trades with the same keys, the chunk is sent to the pool
+        once it has chunk_size trades or after batch_wait_seconds
+        :param efs_trade: An EFS trade dictionary
+        :return: An asyncio.Future of the pdf bytes of the trade
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        trade_keys = tuple(sorted(efs_trade))
+        pending_trades = self.pending_trades.setdefault(trade_keys, [])
+        pending_trades.append((efs_trade, future))
+        if len(pending_trades) >= self.chunk_size:
+            self.send_chunk(trade_keys)
+        elif len(pending_trades) == 1:
+            loop.call_later(self.batch_wait_seconds, self.send_chunk, trade_keys)
+
+        return future
+
+    def send_chunk(self, trade_keys: tuple):
+        """
+        A function that sends the trades waiting with the same keys to the pool
+        :param trade_keys: The sorted keys of the trades
+        """
+        pending_trades = self.pending_trades.pop(trade_keys, None)
+        if not pending_trades:
+            return
+        chunk_task = asyncio.ensure_future(self.fill_chunk(pending_trades))
+        self.chunk_tasks.add(chunk_task)
+        chunk_task.add_done_callback(self.chunk_tasks.discard)
+
+    async def fill_chunk(self, pending_trades: list):
+        """
+        A function that fills one chunk of trades in the pool and sets the future of each trade
+        :param pending_trades: A list of (trade, future)
+        """
+        # At most workers * 2 chunks are sent to the pool at a time, the other chunks wait here
+        async with self.chunk_semaphore:
+            try:
+                chunk_results = await asyncio.get_running_loop().run_in_executor(
+                    self.pool.executor, fill_efs_trades_chunk, [efs_trade for efs_trade, _ in pending_trades])
+            except Exception as error:
+                for _, future in pending_trades:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+
+        for (_, future), (pdf, error) in zip(pending_trades, chunk_results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(pdf)
+            else:
+                future.set_exception(EfsTradeError(error))
+
+
+async def serve(pdf_fill_service: PdfFillService, host: str, port: int):
+    """
+    A function that runs the service until it is stopped (e.g. Ctrl+C)
+    :param pdf_fill_service: The PdfFillService
+    :param host: The address to listen on
+    :param port: The port to listen on
+    """
+    server = await pdf_fill_service.start(host, port)
+    logger.info('Serving EFS PDF files on http://%s:%d with %d workers', *server.sockets[0].getsockname()[:2],
+                pdf_fill_service.workers)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pdf_fill_service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve EFS PDF files over HTTP to local tools')
+    parser.add_argument('--template', required=True, help='the EFS template pdf file')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='the port to listen on (default 8765)')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker processes (default 2)')
+    parser.add_argument('--chunk-size', type=int, default=20, help='trades sent to a worker at a time (default 20)')
+    parser.add_argument('--max-queued-trades', type=int, default=5000,
+                        help='trades waiting above which requests are refused with 503 (default 5000)')
+    parser.add_argument('--batch-wait-ms', type=float, default=5,
+                        help='milliseconds a trade waits to be filled with the trades of other requests (default 5)')
+    parser.add_argument('--flatten', action='store_true', help='create uneditable PDF files')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(PdfFillService(args.template, args.workers, args.chunk_size, args.max_queued_trades,
+                                         flatten=args.flatten, batch_wait_seconds=args.batch_wait_ms / 1000),
+                          args.host, args.port))
+    except KeyboardInterrupt:
+        sys.exit()
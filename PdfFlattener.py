@@ -0,0 +1,133 @@
+# Widths of the Helvetica characters from space (32) to tilde (126) in 1/1000 of the font size, the other characters
+# are counted as wide as a digit
+HELVETICA_WIDTHS = dict(zip(
+    range(32, 127),
+    [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+     556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+     1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+     333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+     556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]))
+DEFAULT_CHARACTER_WIDTH = 556
+
+# Auto font size (DA font size 0) of a single line text field, and the padding between the text and the field border
+MAX_AUTO_FONT_SIZE = 12
+MIN_AUTO_FONT_SIZE = 4
+TEXT_PADDING = 2
+# Height of the capital letters of Helvetica as a fraction of the font size, used to centre the text vertically
+CAP_HEIGHT = 0.718
+
+
+def format_number(number: float):
+    """
+    :param number: A number
+    :return: The number in pdf syntax without exponent and trailing zeros, e.g. 12.5 => '12.5', 3.0 => '3'
+    """
+    return ('%.4f' % number).rstrip('0').rstrip('.')
+
+
+def get_text_width(text: str, font_size: float):
+    """
+    :param text: The text to measure
+    :param font_size: The font size
+    :return: The width of the text written in Helvetica
+    """
+    return sum(HELVETICA_WIDTHS.get(ord(character), DEFAULT_CHARACTER_WIDTH) for character in text) * font_size / 1000
+
+
+def parse_default_appearance(default_appearance: str):
+    """
+    A function that splits the default appearance string of a text field, e.g. '/Helv 0 Tf 0 g'
+    :param default_appearance: The /DA string of the field without the brackets
+    :return: The font resource name (e.g. 'Helv'), the font size (0 means auto size) and the other operators (e.g.
+    the colour '0 g')
+    """
+    tokens = default_appearance.split()
+    if 'Tf' not in tokens or tokens.index('Tf') < 2:
+        raise ValueError(f'No font in default appearance {default_appearance!r}')
+    font_index = tokens.index('Tf')
+    other_operators = tokens[:font_index - 2] + tokens[font_index + 1:]
+
+    return tokens[font_index - 2][1:], float(tokens[font_index - 1]), ' '.join(other_operators)
+
+
+def escape_pdf_text(text: str):
+    """
+    :param text: The text to write with a WinAnsiEncoding font
+    :return: The bytes of the text inside a pdf literal string, characters the font cannot encode are written as '?'
+    """
+    text = text.replace('\r', ' ').replace('\n', ' ')
+    return text.encode('cp1252', errors='replace').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def format_text_appearance(text: str, rect: list, font_resource_name: str, font_size: float, other_operators: str,
+                           quadding: int = 0):
+    """
+    A function that draws the value of a single line text field on the page, the same way a pdf viewer draws the
+    field appearance
+    :param text: The field value
+    :param rect: The field rectangle [x1, y1, x2, y2]
+    :param font_resource_name: The font name in the page resources, e.g. 'FlattenHelv'
+    :param font_size: The font size of the field default appearance, 0 for auto size
+    :param other_operators: The other operators of the field default appearance, e.g. the colour '0 g'
+    :param quadding: The text alignment, 0 left, 1 centred, 2 right
+    :return: The content stream bytes
+    """
+    x1, y1, x2, y2 = min(rect[0], rect[2]), min(rect[1], rect[3]), max(rect[0], rect[2]), max(rect[1], rect[3])
+    width = x2 - x1
+    height = y2 - y1
+
+    # Auto size fits the text in the field height, then shrinks it to fit the field width
+    if not font_size:
+        font_size = max(min(MAX_AUTO_FONT_SIZE, (height - 2 * TEXT_PADDING) / 1.15), MIN_AUTO_FONT_SIZE)
+        text_width = get_text_width(text, font_size)
+        if text_width > width - 2 * TEXT_PADDING:
+            font_size = max(font_size * (width - 2 * TEXT_PADDING) / text_width, MIN_AUTO_FONT_SIZE)
+    text_width = get_text_width(text, font_size)
+
+    if quadding == 1:
+        text_x = x1 + (width - text_width) / 2
+    elif quadding == 2:
+        text_x = x2 - TEXT_PADDING - text_width
+    else:
+        text_x = x1 + TEXT_PADDING
+    text_y = y1 + (height - font_size * CAP_HEIGHT) / 2
+
+    # The text is clipped to the field rectangle like the field appearance
+    return (f'q {format_number(x1)} {format_number(y1)} {format_number(width)} {format_number(height)} re W n '
+            f'BT {other_operators} /{font_resource_name} {format_number(font_size)} Tf '
+            f'{format_number(text_x)} {format_number(text_y)} Td (').encode('latin-1') + \
+        escape_pdf_text(text) + b') Tj ET Q\n'
+
+
+def get_form_matrix(bbox: list, matrix: list, rect: list):
+    """
+    A function that computes the matrix drawing an appearance stream (form XObject) in the field rectangle
+    :param bbox: The /BBox of the appearance stream
+    :param matrix: The /Matrix of the appearance stream, e.g. [1, 0, 0, 1, 0, 0]
+    :param rect: The field rectangle [x1, y1, x2, y2]
+    :return: The matrix [a, b, c, d, e, f] of the cm operator
+    """
+    # Transform the corners of the bounding box by the appearance matrix
+    a, b, c, d, e, f = matrix
+    corners = [(a * x + c * y + e, b * x + d * y + f) for x in (bbox[0], bbox[2]) for y in (bbox[1], bbox[3])]
+    bbox_x1 = min(x for x, _ in corners)
+    bbox_y1 = min(y for _, y in corners)
+    bbox_width = max(x for x, _ in corners) - bbox_x1
+    bbox_height = max(y for _, y in corners) - bbox_y1
+
+    # Scale and move the transformed bounding box onto the rectangle
+    x1, y1, x2, y2 = min(rect[0], rect[2]), min(rect[1], rect[3]), max(rect[0], rect[2]), max(rect[1], rect[3])
+    scale_x = (x2 - x1) / bbox_width if bbox_width else 1
+    scale_y = (y2 - y1) / bbox_height if bbox_height else 1
+
+    return [scale_x, 0, 0, scale_y, x1 - bbox_x1 * scale_x, y1 - bbox_y1 * scale_y]
+
+
+def format_form_appearance(xobject_name: str, form_matrix: list):
+    """
+    :param xobject_name: The appearance stream name in the page resources, e.g. 'FlattenSwapsOn'
+    :param form_matrix: The matrix returned by get_form_matrix
+    :return: The content stream bytes drawing the appearance stream
+    """
+    return f'q {" ".join(format_number(value) for value in form_matrix)} cm /{xobject_name} Do Q\n'.encode('latin-1')
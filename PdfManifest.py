@@ -0,0 +1,131 @@
+# Import libraries
+import os
+import json
+import hashlib
+from fillpdf import fillpdfs
+
+
+def hash_file(file_name: str):
+    """
+    A function that returns the sha256 hash of a file content
+    :param file_name: The file name to hash, e.g. the EFS template pdf
+    :return: The hexadecimal sha256 hash
+    """
+    file_hash = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def hash_dict(value_dict: dict):
+    """
+    A function that returns the sha256 hash of the values that would be filled in the pdf
+    :param value_dict: A dictionary of field name and field value
+    :return: The hexadecimal sha256 hash, the values are converted to string the same way as fillpdfs so that only
+    a change of the filled text changes the hash
+    """
+    value_json = json.dumps(fillpdfs.convert_dict_values_to_string(value_dict), sort_keys=True)
+
+    return hashlib.sha256(value_json.encode('utf-8')).hexdigest()
+
+
+class PdfManifest:
+    """
+    This class is used to only recreate the PDF files whose row data, template or default fields changed since the
+    previous run in the same output path
+    """
+
+    def __init__(self, output_path: str, output_file_name: str, efs_template_pdf: str, default_dict: dict,
+                 volatile_fields=(), output_options: dict = None):
+        """
+        Load the manifest of the previous run, the previous row hashes are only reused if the template, the
+        default fields and the output options did not change
+        :param output_path: The directory where the PDF files and the manifest are created
+        :param output_file_name: The pdf file name of EFS (*** without '.pdf'), the manifest is saved as
+        'xxxxx_manifest.json'
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param default_dict: The default field value dictionary filled in every pdf
+        :param volatile_fields: The default fields that change on every run (e.g. current date and time), they are not
+        hashed so an unchanged row keeps the date and time of the run that created its pdf
+        :param output_options: The options that change the content of every pdf, e.g. {'flatten': True}
+        """
+        self.output_path = output_path
+        self.output_file_name = output_file_name
+        self.manifest_file = os.path.join(output_path, f'{output_file_name}_manifest.json')
+        self.template_hash = hash_file(efs_template_pdf)
+        self.default_hash = hash_dict({key: value for key, value in default_dict.items()
+                                       if key not in volatile_fields})
+        self.options_hash = hash_dict(output_options or {})
+
+        # Row number (as string, json keys) -> row hash of the previous run and of this run
+        self.previous_row_hashes = {}
+        # Row numbers of the previous run whatever the template or default fields were, used to remove deleted rows
+        self.previous_row_numbers = set()
+        self.row_hashes = {}
+        # Row counts of this run
+        self.unchanged_rows = 0
+        self.removed_rows = 0
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as file:
+                previous_manifest = json.load(file)
+            self.previous_row_numbers = set(previous_manifest.get('rows', {}).keys())
+            if previous_manifest.get('template_hash') == self.template_hash and \
+                    previous_manifest.get('default_hash') == self.default_hash and \
+                    previous_manifest.get('options_hash', hash_dict({})) == self.options_hash:
+                self.previous_row_hashes = previous_manifest.get('rows', {})
+
+            # Remove the previous manifest before any pdf is rewritten, if this run stops half way the next run
+            # recreates every pdf instead of trusting hashes of files that may have been overwritten
+            os.remove(self.manifest_file)
+
+    def output_pdf_file(self, row_number: int):
+        """
+        :param row_number: The row number starting from 1
+        :return: The pdf file name of the row, e.g. 'xxxxx_1.pdf'
+        """
+        return f'{self.output_path}/{self.output_file_name}_{row_number}.pdf'
+
+    def iterate_changed_rows(self, numbered_efs_data_dicts):
+        """
+        A function that hashes every row and only yields the rows that need a new pdf file
+        :param numbered_efs_data_dicts: An iterable of (row number, EFS data dictionary)
+        :return: A generator of (row number, EFS data dictionary) for the new and changed rows, or the rows whose pdf
+        file was deleted
+        """
+        for row_number, efs_data_dict in numbered_efs_data_dicts:
+            row_hash = hash_dict(efs_data_dict)
+            self.row_hashes[str(row_number)] = row_hash
+            if self.previous_row_hashes.get(str(row_number)) == row_hash and \
+                    os.path.exists(self.output_pdf_file(row_number)):
+                self.unchanged_rows += 1
+                continue
+            yield row_number, efs_data_dict
+
+    def remove_deleted_rows(self):
+        """
+        A function that deletes the pdf files of the rows that are no longer in EFS data excel file
+        """
+        for row_number in self.previous_row_numbers - self.row_hashes.keys():
+            if os.path.exists(self.output_pdf_file(row_number)):
+                os.remove(self.output_pdf_file(row_number))
+                self.removed_rows += 1
+
+    def save(self, failed_row_numbers=()):
+        """
+        A function that saves the manifest of this run in the output path
+        :param failed_row_numbers: The row numbers whose pdf could not be created, they are recreated next run
+        """
+        for row_number in failed_row_numbers:
+            self.row_hashes[str(row_number)] = None
+
+        manifest = {'template_hash': self.template_hash,
+                    'default_hash': self.default_hash,
+                    'options_hash': self.options_hash,
+                    'rows': self.row_hashes}
+        # Write to a temporary file first so that a half written manifest is never read
+        with open(f'{self.manifest_file}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+        os.replace(f'{self.manifest_file}.tmp', self.manifest_file)
@@ -0,0 +1,177 @@
+# Import libraries
+import io
+import zipfile
+import pdfrw
+from PdfTemplate import CompiledPdfTemplate, write_filled_pdf
+
+# Output modes of FillablePdfWriter.fill_pdfs
+# 'files': one pdf file per row, 'merged': one multi-page pdf file, 'zip': one zip archive of the pdf files
+OUTPUT_MODES = ('files', 'merged', 'zip')
+
+
+class ZipPdfWriter:
+    """
+    This class is used to write the filled PDF files into one zip archive instead of one file per row
+    """
+
+    def __init__(self, zip_file_name: str, compression: int = zipfile.ZIP_STORED):
+        """
+        :param zip_file_name: The zip file name to create (end with .zip)
+        :param compression: The zipfile compression method, the PDF files are stored without compression by default
+        because their streams are already compressed (zipfile.ZIP_DEFLATED only saves ~20% for a lot more time)
+        """
+        self.zip_file_name = zip_file_name
+        self.zip_file = zipfile.ZipFile(zip_file_name, 'w', compression=compression)
+
+    def add(self, efs_template_pdf, pdf_file_name: str, final_value_dict: dict):
+        """
+        A function that fills one pdf in a memory buffer and adds it to the zip archive
+        :param efs_template_pdf: A CompiledPdfTemplate or the pdf file name of EFS template (end with .pdf)
+        :param pdf_file_name: The pdf file name inside the zip archive, e.g. 'xxxxx_1.pdf'
+        :param final_value_dict: A dictionary of field name and field value
+        """
+        buffer = io.BytesIO()
+        write_filled_pdf(efs_template_pdf, buffer, final_value_dict)
+        self.zip_file.writestr(pdf_file_name, buffer.getvalue())
+
+    def close(self):
+        """
+        A function that writes the zip archive directory and closes the zip file
+        """
+        self.zip_file.close()
+
+
+class MergedPdfWriter:
+    """
+    This class is used to write every filled EFS into one multi-page PDF file with one bookmark per row
+    """
+
+    def __init__(self, merged_pdf_file_name: str):
+        """
+        :param merged_pdf_file_name: The pdf file name to create (end with .pdf)
+        """
+        self.merged_pdf_file_name = merged_pdf_file_name
+        self.writer = pdfrw.PdfWriter()
+        # The form fields of every row, each row is a parent field named after its pdf file name so that the same
+        # template field names do not share one value across rows
+        self.fields = pdfrw.PdfArray()
+        self.acro_form = None
+        # The bookmarks, one per row
+        self.outlines = pdfrw.IndirectPdfDict(Type=pdfrw.PdfName.Outlines)
+        self.last_outline = None
+        self.outline_count = 0
+
+    def add(self, efs_template_pdf, pdf_file_name: str, final_value_dict: dict):
+        """
+        A function that appends the filled pages of one row to the merged pdf
+        :param efs_template_pdf: A CompiledPdfTemplate or the pdf file name of EFS template (end with .pdf)
+        :param pdf_file_name: The pdf file name of the row, e.g. 'xxxxx_1.pdf', used as bookmark title and field name
+        :param final_value_dict: A dictionary of field name and field value
+        """
+        # The pages of a compiled template share their fonts and images, so they are written only once, a flattened
+        # pdf has no fields to stamp so it is read back like a pdf filled by fillpdfs
+        if isinstance(efs_template_pdf, CompiledPdfTemplate) and efs_template_pdf.is_compiled and \
+                not getattr(efs_template_pdf, 'flatten', False):
+            filled_pdf = efs_template_pdf.stamp(final_value_dict)
+        else:
+            buffer = io.BytesIO()
+            write_filled_pdf(efs_template_pdf, buffer, final_value_dict)
+            filled_pdf = pdfrw.PdfReader(fdata=buffer.getvalue())
+
+        row_name = pdf_file_name[:-4] if pdf_file_name.endswith('.pdf') else pdf_file_name
+        row_field = pdfrw.IndirectPdfDict(T=pdfrw.PdfString.encode(row_name), Kids=pdfrw.PdfArray())
+        # id(template field) -> its copy for this row, so that the widgets of one field share the copy of the field
+        copied_fields = {}
+
+        first_page = None
+        for page in filled_pdf.pages:
+            # addpage makes a new page dictionary, the annotations are copied too because the compiled template
+            # overwrites the values of its own annotations for the next row
+            self.writer.addpage(page)
+            new_page = self.writer.pagearray[-1]
+            if page.Annots:
+                annotations = pdfrw.PdfArray()
+                for annotation in page.Annots:
+                    if annotation.Subtype == pdfrw.PdfName.Widget:
+                        new_annotation = MergedPdfWriter.copy_field(self, annotation, row_field, copied_fields)
+                    else:
+                        new_annotation = pdfrw.IndirectPdfDict(annotation)
+                    new_annotation.P = new_page
+                    annotations.append(new_annotation)
+                new_page.Annots = annotations
+            if first_page is None:
+                first_page = new_page
+
+        if row_field.Kids:
+            self.fields.append(row_field)
+        if self.acro_form is None and filled_pdf.Root.AcroForm is not None:
+            self.acro_form = pdfrw.IndirectPdfDict(filled_pdf.Root.AcroForm)
+
+        if first_page is not None:
+            self.add_outline(row_name, first_page)
+
+    def copy_field(self, field, row_field, copied_fields: dict):
+        """
+        A function that copies a widget annotation or a field for one row with its parent fields and appearances, the
+        template fields are shared by every row and the compiled template overwrites their values for the next row
+        :param field: The widget annotation or field of the filled pdf
+        :param row_field: The field of the row, the top level field becomes its kid e.g. 'xxxxx_1.parent.child'
+        :param copied_fields: A dictionary of id(field) and the copy of the field already made for the row
+        :return: The copy of the field, its kids are the copies of the kids made for the row
+        """
+        if id(field) in copied_fields:
+            return copied_fields[id(field)]
+
+        new_field = pdfrw.IndirectPdfDict(field)
+        copied_fields[id(field)] = new_field
+        if field.Kids is not None:
+            new_field.Kids = pdfrw.PdfArray()
+        # The appearance dictionaries are copied, the appearance streams are not changed by filling
+        if isinstance(field.AP, pdfrw.PdfDict) and field.AP.stream is None:
+            new_field.AP = pdfrw.PdfDict(field.AP)
+            for appearance_key, appearance in field.AP.iteritems():
+                if isinstance(appearance, pdfrw.PdfDict) and appearance.stream is None:
+                    new_field.AP[appearance_key] = pdfrw.PdfDict(appearance)
+
+        # Top level fields become kids of the row field e.g. 'xxxxx_1.undefined_12'
+        if field.Parent is None:
+            new_parent = row_field if field.T else None
+        else:
+            new_parent = MergedPdfWriter.copy_field(self, field.Parent, row_field, copied_fields)
+        if new_parent is not None:
+            new_field.Parent = new_parent
+            new_parent.Kids.append(new_field)
+
+        return new_field
+
+    def add_outline(self, title: str, page):
+        """
+        A function that adds a bookmark pointing to the first page of a row
+        :param title: The bookmark title
+        :param page: The page the bookmark goes to
+        """
+        outline = pdfrw.IndirectPdfDict(Title=pdfrw.PdfString.encode(title), Parent=self.outlines,
+                                        Dest=pdfrw.PdfArray([page, pdfrw.PdfName.Fit]))
+        if self.last_outline is None:
+            self.outlines.First = outline
+        else:
+            self.last_outline.Next = outline
+            outline.Prev = self.last_outline
+        self.outlines.Last = outline
+        self.last_outline = outline
+        self.outline_count += 1
+
+    def close(self):
+        """
+        A function that writes the merged pdf file
+        """
+        trailer = self.writer.trailer
+        if self.outline_count:
+            self.outlines.Count = self.outline_count
+            trailer.Root.Outlines = self.outlines
+            trailer.Root.PageMode = pdfrw.PdfName.UseOutlines
+        if self.acro_form is not None:
+            self.acro_form.Fields = self.fields
+            trailer.Root.AcroForm = self.acro_form
+
+        self.writer.write(self.merged_pdf_file_name, trailer)
@@ -0,0 +1,532 @@
+# Import libraries
+import io
+import os
+import pdfrw
+from fillpdf import fillpdfs
+from PdfFlattener import parse_default_appearance, format_text_appearance, get_form_matrix, format_form_appearance
+
+# PDF keys used to look up the fillable fields of the EFS template
+ANNOT_KEY = '/Annots'
+ANNOT_FIELD_KEY = '/T'
+ANNOT_FIELD_PARENT_KEY = '/Parent'
+ANNOT_FIELD_KIDS_KEY = '/Kids'
+ANNOT_FORM_TYPE_KEY = '/FT'
+ANNOT_FORM_BUTTON = '/Btn'
+ANNOT_FORM_TEXT = '/Tx'
+SUBTYPE_KEY = '/Subtype'
+WIDGET_SUBTYPE_KEY = '/Widget'
+
+# (template file, modification time, flatten) -> ByteStampedPdfTemplate, the templates already compiled by this
+# process, reused by the next runs of the same template (e.g. the GUI, the watch mode or the templates of a routed run),
+# from the least to the most recently used
+compiled_templates = {}
+# The number of compiled templates kept, the least recently used one is removed above it
+MAX_COMPILED_TEMPLATES = 16
+
+
+def get_field_name(annotation):
+    """
+    A function that builds the fully qualified field name of a widget annotation the same way as
+    fillpdfs.write_fillable_pdf, e.g. 'parent.child'
+    :param annotation: A widget annotation with a field name
+    :return: The field name
+    """
+    key = annotation[ANNOT_FIELD_KEY][1:-1]
+    parent = annotation[ANNOT_FIELD_PARENT_KEY]
+    while parent:
+        key = parent[ANNOT_FIELD_KEY][1:-1] + '.' + key
+        parent = parent[ANNOT_FIELD_PARENT_KEY]
+
+    return key
+
+
+def format_pdf_object(pdf_object, top_level: bool = False):
+    """
+    A function that serializes a pdf object read by pdfrw.PdfReader, the indirect objects it refers to are written as
+    references with their object numbers in the file that was read
+    :param pdf_object: A PdfDict, PdfArray, PdfName, PdfString or number
+    :param top_level: True for the indirect object being serialized itself, which is not written as a reference
+    :return: The pdf syntax of the object as a str
+    """
+    if isinstance(pdf_object, pdfrw.objects.PdfIndirect):
+        return f'{pdf_object[0]} {pdf_object[1]} R'
+    if not top_level and getattr(pdf_object, 'indirect', False) and isinstance(pdf_object.indirect, tuple):
+        return f'{pdf_object.indirect[0]} {pdf_object.indirect[1]} R'
+    if isinstance(pdf_object, pdfrw.PdfDict):
+        if pdf_object.stream is not None:
+            raise ValueError('Streams can only be written as references')
+        pairs = sorted((getattr(key, 'encoded', None) or key, value) for key, value in pdf_object.iteritems())
+        return '<<' + ' '.join(f'{key} {format_pdf_object(value)}' for key, value in pairs) + '>>'
+    if isinstance(pdf_object, pdfrw.PdfArray):
+        return '[' + ' '.join(format_pdf_object(value) for value in pdf_object) + ']'
+    if hasattr(pdf_object, 'indirect'):
+        return str(getattr(pdf_object, 'encoded', None) or pdf_object)
+
+    # Plain python values, the same way as pdfrw.PdfWriter
+    return pdfrw.pdfwriter.user_fmt(pdf_object)
+
+
+class CompiledPdfTemplate:
+    """
+    This class is used to parse the EFS template pdf only once and fill it many times
+    """
+
+    def __init__(self, efs_template_pdf: str):
+        """
+        Load the EFS template pdf and index its widget annotations by field name
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        """
+        self.efs_template_pdf = efs_template_pdf
+        self.template_pdf = pdfrw.PdfReader(efs_template_pdf)
+
+        # Field name -> form type ('/Tx' or '/Btn'), e.g. {'undefined_12': '/Tx', 'Swaps': '/Btn'}
+        self.field_types = {}
+        # Field name -> list of annotations to update (the field itself plus its first kid, same as fillpdfs)
+        self.field_annotations = {}
+        # Checkbox field name -> list of 'on' states in its appearance dictionary, e.g. {'Swaps': ['On']}
+        self.checkbox_states = {}
+        # id(annotation) -> (annotation, {key: original value}) used to reset the template before each row, a value of
+        # None means the key was not set in the template
+        self.original_values = {}
+        # Set to False when the template has fields this class does not index (e.g. radio groups, drop downs),
+        # in that case fill() falls back to fillpdfs.write_fillable_pdf
+        self.is_compiled = True
+
+        self.compile_fields()
+
+        # Ask the pdf viewer to regenerate the field appearances, same as fillpdfs.write_fillable_pdf
+        if self.template_pdf.Root.AcroForm is not None:
+            self.template_pdf.Root.AcroForm.update(pdfrw.PdfDict(NeedAppearances=pdfrw.PdfObject('true')))
+        else:
+            self.is_compiled = False
+
+    def compile_fields(self):
+        """
+        A function that walks the AcroForm annotations once and stores them in the field indexes
+        """
+        for page in self.template_pdf.pages:
+            if not page[ANNOT_KEY]:
+                continue
+            for annotation in page[ANNOT_KEY]:
+                if annotation[SUBTYPE_KEY] != WIDGET_SUBTYPE_KEY:
+                    continue
+                # Widgets without a name belong to a parent field (e.g. radio button groups)
+                if not annotation[ANNOT_FIELD_KEY]:
+                    self.is_compiled = False
+                    continue
+
+                # Build the fully qualified field name the same way as fillpdfs.write_fillable_pdf
+                key = get_field_name(annotation)
+
+                form_type = annotation[ANNOT_FORM_TYPE_KEY]
+                if form_type not in (ANNOT_FORM_TEXT, ANNOT_FORM_BUTTON):
+                    self.is_compiled = False
+                    continue
+
+                targets = [annotation]
+                if annotation[ANNOT_FIELD_KIDS_KEY]:
+                    targets.append(annotation[ANNOT_FIELD_KIDS_KEY][0])
+
+                self.field_types[key] = form_type
+                self.field_annotations[key] = targets
+                for target in targets:
+                    self.original_values[id(target)] = (target, {'V': target.V, 'AS': target.AS, 'AP': target.AP})
+
+                # Record the checkbox on states so that the caller can check which value ticks the box
+                if form_type == ANNOT_FORM_BUTTON:
+                    states = []
+                    if annotation['/AP'] and annotation['/AP']['/N']:
+                        states = [state[1:] for state in annotation['/AP']['/N'].keys() if state != '/Off']
+                    self.checkbox_states[key] = states
+
+    def reset(self):
+        """
+        A function that restores every indexed annotation to the value it had in the template pdf
+        """
+        for target, original_values in self.original_values.values():
+            for key, value in original_values.items():
+                # setting a PdfDict attribute to None removes the key
+                setattr(target, key, value)
+
+    def stamp(self, data_dict: dict):
+        """
+        A function that stamps the values of one data dictionary onto the template pdf
+        :param data_dict: A dictionary of field name and field value, keys not in the template are ignored
+        :return: the template pdf object with the values filled in
+        """
+        self.reset()
+
+        # Convert all the values to string the same way as fillpdfs.write_fillable_pdf
+        data_dict = fillpdfs.convert_dict_values_to_string(data_dict)
+
+        for key, value in data_dict.items():
+            form_type = self.field_types.get(key)
+            if form_type is None:
+                continue
+            if form_type == ANNOT_FORM_BUTTON:
+                # checkbox, the value is the state name e.g. 'On' / 'Off'
+                update = pdfrw.PdfDict(V=pdfrw.PdfName(value), AS=pdfrw.PdfName(value))
+            else:
+                # regular text field
+                update = pdfrw.PdfDict(V=value, AP=value)
+            for target in self.field_annotations[key]:
+                target.update(update)
+
+        return self.template_pdf
+
+    def fill(self, data_dict: dict, output_pdf_path):
+        """
+        A function that creates a new pdf file from the template pdf filled with the data dictionary
+        :param data_dict: A dictionary of field name and field value
+        :param output_pdf_path: The pdf file name to create, or a binary file-like object
+        """
+        if not self.is_compiled:
+            fillpdfs.write_fillable_pdf(self.efs_template_pdf, output_pdf_path, data_dict)
+            return
+
+        pdfrw.PdfWriter().write(output_pdf_path, self.stamp(data_dict))
+
+
+class ByteStampedPdfTemplate(CompiledPdfTemplate):
+    """
+    This class is used to fill the EFS template without serializing the whole pdf object model for every row: the
+    template is written once as a base pdf, and each filled pdf is the base pdf bytes followed by an incremental update
+    that only rewrites the field annotations, their xref entries and a trailer pointing back to the base xref
+    """
+
+    def __init__(self, efs_template_pdf: str, flatten: bool = False):
+        """
+        Load and compile the EFS template pdf, then precompute the base pdf bytes and the bytes of every field
+        annotation around its value, the templates that cannot be precompiled are filled by CompiledPdfTemplate.fill
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param flatten: Write uneditable pdf files (default False), the field values are drawn in the page content
+        and the pages and the catalog are rewritten without the form fields, in the same pass as filling
+        """
+        CompiledPdfTemplate.__init__(self, efs_template_pdf)
+        self.flatten = flatten
+
+        # The template written once with every field reset, shared by every filled pdf
+        self.base_pdf = None
+        # Field name -> list of (object number, object header and dictionary without the value keys), one per
+        # annotation to rewrite
+        self.field_layouts = {}
+        # The trailer of the incremental update without its startxref
+        self.update_trailer = None
+        # The layout of each page to draw the field values on when flatten is True (see precompile_flatten_layout),
+        # the catalog without the form and the trailer of the update
+        self.flatten_pages = None
+        self.flatten_catalog = None
+        self.flatten_trailer = None
+
+        if self.is_compiled:
+            try:
+                self.precompile_layout()
+            except (ValueError, TypeError, AttributeError, KeyError, pdfrw.PdfParseError):
+                # Fall back to the object model of CompiledPdfTemplate for anything this class cannot lay out
+                self.base_pdf = None
+
+        if flatten and self.base_pdf is None:
+            raise ValueError(f'The fields of {efs_template_pdf!r} cannot be flattened in the same pass as filling')
+
+    def precompile_layout(self):
+        """
+        A function that writes the base pdf and precomputes the bytes of the annotations of every field
+        """
+        buffer = io.BytesIO()
+        pdfrw.PdfWriter().write(buffer, self.stamp({}))
+        base_pdf = buffer.getvalue()
+
+        # Read the base pdf back to get the object numbers of the annotations in the base pdf
+        base_reader = pdfrw.PdfReader(fdata=base_pdf)
+        field_layouts = {}
+        for page in base_reader.pages:
+            for annotation in page[ANNOT_KEY] or ():
+                if annotation[SUBTYPE_KEY] != WIDGET_SUBTYPE_KEY or not annotation[ANNOT_FIELD_KEY]:
+                    continue
+                key = get_field_name(annotation)
+                if key not in self.field_types:
+                    continue
+                targets = [annotation]
+                if annotation[ANNOT_FIELD_KIDS_KEY]:
+                    targets.append(annotation[ANNOT_FIELD_KIDS_KEY][0])
+
+                field_layouts[key] = []
+                for target in targets:
+                    if not isinstance(target.indirect, tuple):
+                        raise ValueError(f'The annotation of field {key!r} is not an indirect object')
+                    object_number, generation = target.indirect
+                    # The value keys are written after the other keys of the annotation for each row, a checkbox
+                    # keeps its appearance dictionary while a text field gets its value as appearance
+                    value_keys = ('/V', '/AS') if self.field_types[key] == ANNOT_FORM_BUTTON else ('/V', '/AS', '/AP')
+                    fixed_keys = pdfrw.PdfDict((name, value) for name, value in target.iteritems()
+                                               if name not in value_keys)
+                    fixed_dict = format_pdf_object(fixed_keys, top_level=True)[:-2]
+                    field_layouts[key].append(
+                        (object_number, generation,
+                         f'{object_number} {generation} obj\n{fixed_dict}'.encode('latin-1')))
+
+        if field_layouts.keys() != self.field_types.keys():
+            raise ValueError('Some fields of the template could not be found in the base pdf')
+
+        # The trailer of the update keeps the base trailer and points back to the base xref
+        base_startxref = int(base_pdf[base_pdf.rindex(b'startxref') + len(b'startxref'):].split()[0])
+        trailer = pdfrw.PdfDict((name, value) for name, value in base_reader.iteritems() if name != '/Prev')
+        trailer.Prev = base_startxref
+        self.update_trailer = f'trailer\n{format_pdf_object(trailer, top_level=True)}\n'.encode('latin-1')
+
+        if self.flatten:
+            self.precompile_flatten_layout(base_reader, trailer)
+
+        self.field_layouts = field_layouts
+        self.base_pdf = base_pdf
+
+    def precompile_flatten_layout(self, base_reader, trailer):
+        """
+        A function that precomputes the pages and the catalog of the flattened pdf: each page keeps its content between
+        a new 'q' stream and a new stream drawing the field values, its resources get the fonts of the fields and the
+        checkbox appearance streams, and its widget annotations are removed
+        :param base_reader: The pdfrw.PdfReader of the base pdf
+        :param trailer: The trailer of the update, its /Size is increased by the new content streams
+        """
+        acro_form = base_reader.Root.AcroForm
+        form_fonts = acro_form.DR.Font if acro_form.DR is not None and acro_form.DR.Font is not None else {}
+        next_object_number = int(base_reader.Size)
+
+        flatten_pages = []
+        for page in base_reader.pages:
+            if not isinstance(page.indirect, tuple):
+                raise ValueError('The page is not an indirect object')
+            resources = page.inheritable.Resources or pdfrw.PdfDict()
+            fonts = pdfrw.PdfDict(resources.Font.iteritems()) if resources.Font is not None else pdfrw.PdfDict()
+            xobjects = pdfrw.PdfDict(resources.XObject.iteritems()) if resources.XObject is not None \
+                else pdfrw.PdfDict()
+
+            # Other annotations (e.g. links) are kept, the widgets are drawn in the page content instead
+            annotations = pdfrw.PdfArray()
+            # (field name, rect, font resource name, font size, other operators, quadding, template value)
+            text_fields = []
+            # (field name, {state: (appearance stream name, matrix)}, template state)
+            checkboxes = []
+            for annotation in page[ANNOT_KEY] or ():
+                if annotation[SUBTYPE_KEY] != WIDGET_SUBTYPE_KEY:
+                    annotations.append(annotation)
+                    continue
+                # Hidden widgets are not drawn
+                if int(annotation.F or 0) & 2:
+                    continue
+                key = get_field_name(annotation)
+                rect = [float(value) for value in annotation.Rect]
+                if self.field_types[key] == ANNOT_FORM_TEXT:
+                    default_appearance = (annotation.DA or acro_form.DA).decode()
+                    font_name, font_size, other_operators = parse_default_appearance(default_appearance)
+                    font_resource_name = f'Flatten{font_name}'
+                    fonts[pdfrw.PdfName(font_resource_name)] = form_fonts[pdfrw.PdfName(font_name)]
+                    template_value = annotation.V.decode() if annotation.V is not None else ''
+                    quadding = int(annotation.Q or acro_form.Q or 0)
+                    text_fields.append((key, rect, font_resource_name, font_size, other_operators, quadding,
+                                        template_value))
+                else:
+                    states = {}
+                    normal_appearances = annotation.AP.N if annotation.AP is not None else None
+                    if normal_appearances is not None and normal_appearances.stream is None:
+                        for state, appearance_stream in normal_appearances.iteritems():
+                            xobject_name = f'Flatten{len(xobjects)}'
+                            xobjects[pdfrw.PdfName(xobject_name)] = appearance_stream
+                            bbox = [float(value) for value in appearance_stream.BBox]
+                            matrix = [float(value) for value in appearance_stream.Matrix or (1, 0, 0, 1, 0, 0)]
+                            states[state[1:]] = (xobject_name, get_form_matrix(bbox, matrix, rect))
+                    template_state = annotation.AS[1:] if annotation.AS is not None else 'Off'
+                    checkboxes.append((key, states, template_state))
+
+            # The page content is saved before and restored after the original content so that the field values are
+            # drawn with the default graphics state
+            save_object_number = next_object_number
+            draw_object_number = next_object_number + 1
+            next_object_number += 2
+            contents = page.Contents if isinstance(page.Contents, pdfrw.PdfArray) else [page.Contents]
+            new_resources = pdfrw.PdfDict(resources.iteritems())
+            new_resources.Font = fonts
+            new_resources.XObject = xobjects
+            new_page = pdfrw.PdfDict((name, value) for name, value in page.iteritems()
+                                     if name not in ('/Annots', '/Contents', '/Resources'))
+            new_page.Resources = new_resources
+            new_page.Contents = pdfrw.PdfArray([pdfrw.PdfObject(f'{save_object_number} 0 R')] + list(contents) +
+                                               [pdfrw.PdfObject(f'{draw_object_number} 0 R')])
+            if annotations:
+                new_page.Annots = annotations
+            page_number, page_generation = page.indirect
+            page_bytes = f'{page_number} {page_generation} obj\n{format_pdf_object(new_page, top_level=True)}' \
+                         f'\nendobj\n'.encode('latin-1')
+            flatten_pages.append((page_number, page_generation, page_bytes, save_object_number, draw_object_number,
+                                  text_fields, checkboxes))
+
+        # The catalog without the form, the pdf viewers then show no fields to edit
+        root = base_reader.Root
+        if not isinstance(root.indirect, tuple):
+            raise ValueError('The catalog is not an indirect object')
+        new_root = pdfrw.PdfDict((name, value) for name, value in root.iteritems() if name != '/AcroForm')
+        self.flatten_catalog = (root.indirect[0], root.indirect[1],
+                                f'{root.indirect[0]} {root.indirect[1]} obj\n{format_pdf_object(new_root, True)}'
+                                f'\nendobj\n'.encode('latin-1'))
+
+        flatten_trailer = pdfrw.PdfDict(trailer.iteritems())
+        flatten_trailer.Size = next_object_number
+        self.flatten_trailer = f'trailer\n{format_pdf_object(flatten_trailer, top_level=True)}\n'.encode('latin-1')
+        self.flatten_pages = flatten_pages
+
+    def fill(self, data_dict: dict, output_pdf_path):
+        """
+        A function that creates a new pdf file from the base pdf and an incremental update of the filled fields
+        :param data_dict: A dictionary of field name and field value
+        :param output_pdf_path: The pdf file name to create, or a binary file-like object
+        """
+        if self.base_pdf is None:
+            CompiledPdfTemplate.fill(self, data_dict, output_pdf_path)
+            return
+        if self.flatten:
+            self.fill_flattened(data_dict, output_pdf_path)
+            return
+
+        # Convert all the values to string the same way as fillpdfs.write_fillable_pdf
+        data_dict = fillpdfs.convert_dict_values_to_string(data_dict)
+
+        parts = [self.base_pdf]
+        offset = len(self.base_pdf)
+        xref_entries = []
+        for key, value in data_dict.items():
+            field_layout = self.field_layouts.get(key)
+            if field_layout is None:
+                continue
+            if self.field_types[key] == ANNOT_FORM_BUTTON:
+                # checkbox, the value is the state name e.g. 'On' / 'Off'
+                state = str(pdfrw.PdfName(value))
+                value_bytes = f' /AS {state} /V {state}>>\nendobj\n'.encode('latin-1')
+            else:
+                # regular text field, the value is also written as appearance like fillpdfs
+                text = pdfrw.PdfString.encode(value)
+                value_bytes = f' /AP {text} /V {text}>>\nendobj\n'.encode('latin-1')
+            for object_number, generation, object_bytes in field_layout:
+                xref_entries.append((object_number, generation, offset))
+                parts.append(object_bytes + value_bytes)
+                offset += len(parts[-1])
+
+        self.write_update(parts, xref_entries, offset, self.update_trailer, output_pdf_path)
+
+    def fill_flattened(self, data_dict: dict, output_pdf_path):
+        """
+        A function that creates a new uneditable pdf file from the base pdf and an incremental update that draws the
+        field values in the page content and removes the form fields
+        :param data_dict: A dictionary of field name and field value
+        :param output_pdf_path: The pdf file name to create, or a binary file-like object
+        """
+        # Convert all the values to string the same way as fillpdfs.write_fillable_pdf
+        data_dict = fillpdfs.convert_dict_values_to_string(data_dict)
+
+        parts = [self.base_pdf]
+        offset = len(self.base_pdf)
+        xref_entries = []
+        for page_number, page_generation, page_bytes, save_object_number, draw_object_number, text_fields, \
+                checkboxes in self.flatten_pages:
+            # Restore the graphics state saved before the original content, then draw the fields
+            content = [b'Q\n']
+            for key, rect, font_resource_name, font_size, other_operators, quadding, template_value in text_fields:
+                text = data_dict.get(key, template_value)
+                if text:
+                    content.append(format_text_appearance(text, rect, font_resource_name, font_size, other_operators,
+                                                          quadding))
+            for key, states, template_state in checkboxes:
+                state = states.get(data_dict.get(key, template_state))
+                if state is not None:
+                    content.append(format_form_appearance(*state))
+            content = b''.join(content)
+
+            for object_number, generation, object_bytes in (
+                    (save_object_number, 0, f'{save_object_number} 0 obj\n<</Length 2>>\nstream\nq\n'
+                                            f'\nendstream\nendobj\n'.encode('latin-1')),
+                    (draw_object_number, 0, f'{draw_object_number} 0 obj\n<</Length {len(content)}>>\nstream\n'
+                                            .encode('latin-1') + content + b'\nendstream\nendobj\n'),
+                    (page_number, page_generation, page_bytes)):
+                xref_entries.append((object_number, generation, offset))
+                parts.append(object_bytes)
+                offset += len(object_bytes)
+
+        catalog_number, catalog_generation, catalog_bytes = self.flatten_catalog
+        xref_entries.append((catalog_number, catalog_generation, offset))
+        parts.append(catalog_bytes)
+        offset += len(catalog_bytes)
+
+        self.write_update(parts, xref_entries, offset, self.flatten_trailer, output_pdf_path)
+
+    def write_update(self, parts: list, xref_entries: list, xref_offset: int, trailer: bytes, output_pdf_path):
+        """
+        A function that writes the base pdf and the objects of the incremental update followed by their xref section
+        :param parts: The base pdf bytes and the bytes of each object of the update
+        :param xref_entries: A list of (object number, generation, offset) of the objects of the update
+        :param xref_offset: The offset of the xref section, i.e. the length of the parts
+        :param trailer: The trailer of the update without its startxref
+        :param output_pdf_path: The pdf file name to create, or a binary file-like object
+        """
+        # One xref subsection per object, each entry is exactly 20 bytes
+        xref = ['xref\n']
+        for object_number, generation, object_offset in sorted(xref_entries):
+            xref.append(f'{object_number} 1\n{object_offset:010d} {generation:05d} n\r\n')
+        parts.append(''.join(xref).encode('latin-1'))
+        parts.append(trailer)
+        parts.append(f'startxref\n{xref_offset}\n%%EOF\n'.encode('latin-1'))
+
+        if hasattr(output_pdf_path, 'write'):
+            output_pdf_path.write(b''.join(parts))
+        else:
+            with open(output_pdf_path, 'wb') as output_pdf_file:
+                output_pdf_file.write(b''.join(parts))
+
+
+def write_filled_pdf(efs_template_pdf, output_pdf_path, data_dict: dict):
+    """
+    A function that creates one filled pdf with either a compiled template or fillpdfs
+    :param efs_template_pdf: A CompiledPdfTemplate, or the pdf file name of EFS template (end with .pdf) which is then
+    parsed again by fillpdfs.write_fillable_pdf
+    :param output_pdf_path: The pdf file name to create, or a binary file-like object
+    :param data_dict: A dictionary of field name and field value
+    """
+    if isinstance(efs_template_pdf, CompiledPdfTemplate):
+        efs_template_pdf.fill(data_dict, output_pdf_path)
+    else:
+        fillpdfs.write_fillable_pdf(efs_template_pdf, output_pdf_path, data_dict)
+
+
+def get_template_fields(efs_template_pdf, flatten: bool = False):
+    """
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf) or a CompiledPdfTemplate
+    :param flatten: Compile the template for uneditable pdf files (default False), to share the compiled template
+    with the run
+    :return: The field names of the EFS template, or None if the template has fields that are not indexed
+    """
+    if not isinstance(efs_template_pdf, CompiledPdfTemplate):
+        efs_template_pdf = load_compiled_template(efs_template_pdf, flatten)
+
+    return list(efs_template_pdf.field_types) if efs_template_pdf.is_compiled else None
+
+
+def load_compiled_template(efs_template_pdf: str, flatten: bool = False):
+    """
+    A function that compiles each EFS template only once per process unless the template file changes, the templates
+    compiled before the template file changed and the least recently used ones above MAX_COMPILED_TEMPLATES are removed
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :param flatten: Write uneditable pdf files (default False)
+    :return: The ByteStampedPdfTemplate of the template
+    """
+    template_file = os.path.abspath(efs_template_pdf)
+    template_key = (template_file, os.stat(efs_template_pdf).st_mtime_ns, flatten)
+    compiled_template = compiled_templates.pop(template_key, None)
+    if compiled_template is None:
+        compiled_template = ByteStampedPdfTemplate(efs_template_pdf, flatten)
+        # Remove the older versions of the same template
+        for old_template_key in [key for key in compiled_templates if key[0] == template_file and key[2] == flatten]:
+            del compiled_templates[old_template_key]
+    # Insert it again as the most recently used template
+    compiled_templates[template_key] = compiled_template
+    while len(compiled_templates) > MAX_COMPILED_TEMPLATES:
+        del compiled_templates[next(iter(compiled_templates))]
+
+    return compiled_template
@@ -0,0 +1,359 @@
+# Import libraries
+import re
+import functools
+import csv
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import pdfrw
+from fillpdf import fillpdfs
+from ParallelPdfWriter import iterate_chunks
+
+# The columns of the verification report
+VERIFICATION_REPORT_COLUMNS = ['Row', 'Field', 'Expected', 'Actual']
+# The parts of a pdf dictionary read by read_field_entries: the dictionary and array delimiters, the strings (with one
+# level of nested parentheses, each character of a string is matched once) skipped so that their text is never read as
+# a key, and the keys of a form field with their value, the other keys and values are not matched at all
+PDF_STRING_PATTERN = rb'\([^\\()]*(?:(?:\\.|\([^\\()]*(?:\\.[^\\()]*)*\))[^\\()]*)*\)|<[0-9A-Fa-f\s]*>'
+FIELD_ENTRY_RE = re.compile(rb'(?=[<>\[\]/(])(?:(?P<open><<|\[)|(?P<close>>>|\])|'
+                            rb'/T\s*(?P<name>' + PDF_STRING_PATTERN + rb')|'
+                            rb'/V\s*(?P<value>' + PDF_STRING_PATTERN + rb'|/[^\s/<>\[\]()%]*)|'
+                            rb'/Parent\s+(?P<parent>\d+)\s+\d+\s+R|' + PDF_STRING_PATTERN + rb')', re.DOTALL)
+# A field dictionary has a field name, '/T' followed by a string (not '/Type' or '/TU')
+FIELD_NAME_KEY_RE = re.compile(rb'/T\s*[(<]')
+# The '#xx' escapes of a pdf name
+PDF_NAME_ESCAPE_RE = re.compile(r'#([0-9A-Fa-f]{2})')
+# The most revisions of pdf files kept in revision_fields
+MAX_CACHED_REVISIONS = 16
+
+# xref offset of a revision -> (bytes of the pdf up to the end of the revision, {object number: field}), the revisions
+# already read by this process that were followed by an incremental update, e.g. the base pdf of a
+# ByteStampedPdfTemplate is read once and only the update of every pdf filled from it is read
+revision_fields = {}
+
+
+class VerificationReport:
+    """
+    This class is used to record the fields of the created PDF files whose value is not the value of their row, each
+    mismatch is one row and field (the PDF files that could not be read have the field '(file)')
+    """
+
+    def __init__(self):
+        # List of (row number, field name, expected value, actual value)
+        self.mismatches = []
+        self.rows_verified = 0
+
+    def add_mismatches(self, mismatches: list, rows_verified: int = 0):
+        """
+        :param mismatches: A list of (row number, field name, expected value, actual value)
+        :param rows_verified: The number of PDF files read back
+        """
+        self.mismatches.extend(mismatches)
+        self.rows_verified += rows_verified
+
+    def has_mismatches(self):
+        """
+        :return: True if any field of any PDF file is wrong
+        """
+        return bool(self.mismatches)
+
+    def get_mismatched_row_numbers(self):
+        """
+        :return: A sorted list of the row numbers whose PDF file has at least one wrong field
+        """
+        return sorted({row_number for row_number, _, _, _ in self.mismatches})
+
+    def write_csv(self, report_file: str):
+        """
+        :param report_file: The csv file name of the verification report
+        """
+        with open(report_file, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(VERIFICATION_REPORT_COLUMNS)
+            writer.writerows(sorted(self.mismatches, key=lambda mismatch: mismatch[0]))
+
+    def format_summary(self, max_mismatches: int = 20):
+        """
+        :param max_mismatches: The number of mismatches listed (default 20)
+        :return: A text summary of the mismatches
+        """
+        mismatches = sorted(self.mismatches, key=lambda mismatch: mismatch[0])
+        lines = [f'{len(mismatches)} wrong field(s) in {len(self.get_mismatched_row_numbers())} of '
+                 f'{self.rows_verified} PDF file(s):']
+        for row_number, field_name, expected_value, actual_value in mismatches[:max_mismatches]:
+            lines.append(f'row {row_number}, {field_name!r}: expected {expected_value!r}, found {actual_value!r}')
+        if len(mismatches) > max_mismatches:
+            lines.append(f'... {len(mismatches) - max_mismatches} more wrong field(s)')
+
+        return '\n'.join(lines)
+
+
+class PdfVerificationError(Exception):
+    """
+    This class is raised when some created PDF files do not hold the values of their row, it keeps the
+    VerificationReport of every mismatch
+    """
+
+    def __init__(self, verification_report: VerificationReport):
+        """
+        :param verification_report: The VerificationReport of the mismatches
+        """
+        Exception.__init__(self, verification_report.format_summary())
+        self.verification_report = verification_report
+
+
+def read_xref_section(pdf_bytes: bytes, xref_offset: int):
+    """
+    A function that reads one cross-reference table and its trailer
+    :param pdf_bytes: The bytes of the pdf file
+    :param xref_offset: The offset of the 'xref' keyword
+    :return: A dictionary of object number -> offset of the objects in use, the offset of the previous
+    cross-reference table (None for the first revision) and the offset of the end of the revision
+    """
+    if pdf_bytes[xref_offset:xref_offset + 4] != b'xref':
+        raise ValueError('Only pdf files with cross-reference tables can be verified')
+    trailer_offset = pdf_bytes.index(b'trailer', xref_offset)
+
+    # Subsections of 'first object number, count' followed by 'offset generation n|f' per object
+    tokens = pdf_bytes[xref_offset + 4:trailer_offset].split()
+    object_offsets = {}
+    index = 0
+    while index < len(tokens):
+        first_object_number, count = int(tokens[index]), int(tokens[index + 1])
+        for object_index in range(count):
+            entry_index = index + 2 + object_index * 3
+            if tokens[entry_index + 2] == b'n':
+                object_offsets[first_object_number + object_index] = int(tokens[entry_index])
+        index += 2 + count * 3
+
+    startxref_offset = pdf_bytes.index(b'startxref', trailer_offset)
+    previous_offset = re.search(rb'/Prev\s+(\d+)', pdf_bytes[trailer_offset:startxref_offset])
+
+    return object_offsets, None if previous_offset is None else int(previous_offset.group(1)), \
+        pdf_bytes.index(b'%%EOF', startxref_offset) + 5
+
+
+def read_field_entries(object_bytes: bytes):
+    """
+    A function that reads the field name, value and parent of the dictionary of an indirect object, the nested
+    dictionaries and arrays are skipped and never parsed into objects
+    :param object_bytes: The bytes of the object from 'n g obj' up to its stream or 'endobj'
+    :return: A dictionary of 'name', 'value' and 'parent' -> the bytes of their value, for the keys in the dictionary
+    """
+    entries = {}
+    depth = 0
+    for match in FIELD_ENTRY_RE.finditer(object_bytes):
+        entry = match.lastgroup
+        if entry == 'open':
+            depth += 1
+        elif entry == 'close':
+            depth -= 1
+            if depth == 0:
+                break
+        elif entry is not None and depth == 1:
+            entries[entry] = match.group(entry)
+
+    return entries
+
+
+def decode_pdf_value(value: bytes):
+    """
+    :param value: The bytes of a string or a name
+    :return: The text of a string, or the name without '/' (e.g. 'On')
+    """
+    value = value.decode('latin-1')
+    if value.startswith('/'):
+        return PDF_NAME_ESCAPE_RE.sub(lambda match: chr(int(match.group(1), 16)), value[1:])
+
+    return pdfrw.PdfString(value).to_unicode()
+
+
+def read_field_object(pdf_bytes: bytes, object_offset: int):
+    """
+    A function that reads the name, parent and value of a form field without reading its stream if any
+    :param pdf_bytes: The bytes of the pdf file
+    :param object_offset: The offset of the object in the cross-reference table
+    :return: (field name, object number of the parent field or None, value or None), or None if the object is not a
+    form field
+    """
+    end_offset = pdf_bytes.index(b'endobj', object_offset)
+    stream_offset = pdf_bytes.find(b'stream', object_offset, end_offset)
+
+    return parse_field_object(pdf_bytes[object_offset:end_offset if stream_offset == -1 else stream_offset])
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_field_object(object_bytes: bytes):
+    """
+    A function that reads the name, parent and value of a form field, the objects of the default fields and of the
+    values repeated by many rows (e.g. the same dates) are the same bytes in every pdf and only parsed once
+    :param object_bytes: The bytes of the object from 'n g obj' up to its stream or 'endobj'
+    :return: (field name, object number of the parent field or None, value or None), or None if the object is not a
+    form field
+    """
+    if not FIELD_NAME_KEY_RE.search(object_bytes):
+        return None
+
+    entries = read_field_entries(object_bytes)
+    if 'name' not in entries:
+        return None
+    parent_object_number = int(entries['parent']) if 'parent' in entries else None
+    value = entries.get('value')
+
+    return decode_pdf_value(entries['name']), parent_object_number, None if value is None else decode_pdf_value(value)
+
+
+def read_pdf_field_values(pdf_bytes: bytes):
+    """
+    A function that reads the values of the form fields of a pdf file without reconstructing the document: only the
+    cross-reference tables and the dictionaries of the objects with a field name are read, and a revision already
+    read by this process (e.g. the base pdf of the template before its incremental update) is not read again
+    :param pdf_bytes: The bytes of a pdf file with cross-reference tables, e.g. written by ByteStampedPdfTemplate or
+    fillpdfs.write_fillable_pdf
+    :return: A dictionary of fully qualified field name (e.g. 'parent.child') -> value, None if the field has no value
+    """
+    # The cross-reference tables from the last revision back to the first one or to a revision already read
+    fields = {}
+    revisions = []
+    xref_offset = int(pdf_bytes[pdf_bytes.rindex(b'startxref') + len(b'startxref'):].split()[0])
+    while xref_offset is not None:
+        revision = revision_fields.get(xref_offset)
+        if revision is not None and pdf_bytes.startswith(revision[0]):
+            fields = dict(revision[1])
+            break
+        object_offsets, previous_offset, revision_end = read_xref_section(pdf_bytes, xref_offset)
+        revisions.append((xref_offset, object_offsets, revision_end))
+        xref_offset = previous_offset
+
+    # The objects of a later revision replace the objects of the same number of an earlier revision
+    for revision_number, (xref_offset, object_offsets, revision_end) in enumerate(reversed(revisions), start=1):
+        for object_number, object_offset in object_offsets.items():
+            field = read_field_object(pdf_bytes, object_offset)
+            if field is None:
+                fields.pop(object_number, None)
+            else:
+                fields[object_number] = field
+        # Keep the revisions followed by an update for the next pdf files filled from the same template
+        if revision_number < len(revisions):
+            if len(revision_fields) >= MAX_CACHED_REVISIONS:
+                revision_fields.clear()
+            revision_fields[xref_offset] = (pdf_bytes[:revision_end], dict(fields))
+
+    # The field name is qualified by the names of its parents, the same way as get_field_name
+    field_values = {}
+    for field_name, parent_object_number, value in fields.values():
+        # A chain of parents is never longer than the number of fields, even in a pdf whose parents make a loop
+        parents = 0
+        while parent_object_number in fields and parents < len(fields):
+            parent_name, parent_object_number, _ = fields[parent_object_number]
+            field_name = f'{parent_name}.{field_name}'
+            parents += 1
+        field_values[field_name] = value
+
+    return field_values
+
+
+def verify_pdf(pdf_bytes: bytes, final_value_dict: dict, field_names=None):
+    """
+    A function that compares the field values of one filled pdf with the values it was filled with
+    :param pdf_bytes: The bytes of the pdf file
+    :param final_value_dict: The dictionary of field name and field value the pdf was filled with
+    :param field_names: The field names of the EFS template (default None, the fields of the pdf), the keys of
+    final_value_dict that are not fields are never written and not compared
+    :return: A list of (field name, expected value, actual value) of the wrong fields, the actual value of a missing
+    field is None
+    """
+    field_values = read_pdf_field_values(pdf_bytes)
+    if field_names is None:
+        field_names = field_values
+
+    # The values are written as text the same way as fillpdfs.write_fillable_pdf
+    mismatches = []
+    for field_name, expected_value in fillpdfs.convert_dict_values_to_string(final_value_dict).items():
+        if field_name not in field_names:
+            continue
+        actual_value = field_values.get(field_name)
+        if field_name not in field_values or (actual_value or '') != expected_value:
+            mismatches.append((field_name, expected_value, actual_value))
+
+    return mismatches
+
+
+def iterate_and_keep_rows(numbered_final_value_dicts, filled_rows: list):
+    """
+    A function that keeps the rows as they are filled, to read their PDF files back once they are all created
+    :param numbered_final_value_dicts: An iterable of (row number, final value dictionary), one per pdf file
+    :param filled_rows: The list each (row number, final value dictionary) is appended to
+    :return: A generator of the same (row number, final value dictionary)
+    """
+    for numbered_final_value_dict in numbered_final_value_dicts:
+        filled_rows.append(numbered_final_value_dict)
+        yield numbered_final_value_dict
+
+
+def verify_pdfs_chunk(output_path: str, output_file_name: str, chunk: list, field_names=None,
+                      zip_file_name: str = None):
+    """
+    A function that reads back the PDF files of one chunk of rows, in a worker process or in the main process
+    :param output_path: The directory of the PDF files
+    :param output_file_name: The pdf file name without '.pdf', row n is read from 'xxxxx_n.pdf'
+    :param chunk: A list of (row number, final value dictionary)
+    :param field_names: The field names of the EFS template (default None, the fields of each pdf)
+    :param zip_file_name: The zip archive of the PDF files (default None, the PDF files are in output_path)
+    :return: A list of (row number, field name, expected value, actual value)
+    """
+    field_names = None if field_names is None else set(field_names)
+    zip_file = None if zip_file_name is None else zipfile.ZipFile(zip_file_name)
+    mismatches = []
+    try:
+        for row_number, final_value_dict in chunk:
+            pdf_file_name = f'{output_file_name}_{row_number}.pdf'
+            try:
+                if zip_file is not None:
+                    pdf_bytes = zip_file.read(pdf_file_name)
+                else:
+                    with open(f'{output_path}/{pdf_file_name}', 'rb') as pdf_file:
+                        pdf_bytes = pdf_file.read()
+                row_mismatches = verify_pdf(pdf_bytes, final_value_dict, field_names)
+            except Exception as error:
+                mismatches.append((row_number, '(file)', pdf_file_name, f'{type(error).__name__}: {error}'))
+                continue
+            mismatches.extend((row_number, *mismatch) for mismatch in row_mismatches)
+    finally:
+        if zip_file is not None:
+            zip_file.close()
+
+    return mismatches
+
+
+def verify_pdfs(output_path: str, output_file_name: str, numbered_final_value_dicts: list, field_names=None,
+                zip_file_name: str = None, workers: int = 1, executor=None, chunk_size: int = 200):
+    """
+    A function that reads back the PDF files of every row and compares their field values with the values of their
+    row, the rows are split into chunks read in parallel by a process pool
+    :param output_path: The directory of the PDF files
+    :param output_file_name: The pdf file name without '.pdf', row n is read from 'xxxxx_n.pdf'
+    :param numbered_final_value_dicts: A list of (row number, final value dictionary) of the PDF files created
+    :param field_names: The field names of the EFS template (default None, the fields of each pdf)
+    :param zip_file_name: The zip archive of the PDF files (default None, the PDF files are in output_path)
+    :param workers: The number of processes used to read the PDF files (default 1, no process pool)
+    :param executor: A ProcessPoolExecutor already started, e.g. of a PdfWriterPool, used instead of workers
+    (default None)
+    :param chunk_size: The most rows read by one task (default 200), smaller chunks are used to give every worker
+    some rows
+    :return: A list of (row number, field name, expected value, actual value)
+    """
+    if executor is None and workers <= 1:
+        return verify_pdfs_chunk(output_path, output_file_name, numbered_final_value_dicts, field_names,
+                                 zip_file_name)
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return verify_pdfs(output_path, output_file_name, numbered_final_value_dicts, field_names, zip_file_name,
+                               workers, executor, chunk_size)
+
+    # Several chunks per worker so that the workers finish at about the same time
+    chunk_size = max(1, min(chunk_size, -(-len(numbered_final_value_dicts) // (4 * workers))))
+    futures = [executor.submit(verify_pdfs_chunk, output_path, output_file_name, chunk, field_names, zip_file_name)
+               for chunk in iterate_chunks(numbered_final_value_dicts, chunk_size)]
+
+    return [mismatch for future in futures for mismatch in future.result()]
@@ -1,8 +1,46 @@
 # # Import libraries
+import io
 import os
+import time
+import itertools
+import openpyxl
 from fillpdf import fillpdfs
-import datetime
 import pandas as pd
+from PdfTemplate import CompiledPdfTemplate, write_filled_pdf, load_compiled_template, get_template_fields
+from ParallelPdfWriter import fill_pdfs_in_parallel
+from PdfManifest import PdfManifest, hash_dict
+from PdfOutputWriter import OUTPUT_MODES, MergedPdfWriter, ZipPdfWriter
+from RunReport import RunReport
+from EfsDataReader import EXCEL_EXTENSIONS, read_efs_data_in_chunks, get_efs_data_reader
+from EfsDataCache import EfsDataCache
+from EfsDataValidator import VALIDATION_MODES, EfsDataValidationError, ValidationReport, validate_efs_data_df
+from TemplateConfig import DEFAULT_TEMPLATE_CONFIG, load_template_config, is_template_routing_file, \
+    load_template_routing
+from PdfVerifier import VerificationReport, PdfVerificationError, iterate_and_keep_rows, verify_pdfs
+import numpy as np
+
+# Commodity code month letters, COMMODITY_MONTH_LETTERS[month number - 1], e.g. JAN => F, JUL => N
+COMMODITY_MONTH_LETTERS = np.array(['F', 'G', 'H', 'J', 'K', 'M', 'N', 'Q', 'U', 'V', 'X', 'Z'], dtype=object)
+
+# Default fields filled with the current date and time, they change on every run so they are not hashed in
+# incremental mode (an unchanged row keeps the date and time of the run that created its pdf), see
+# TemplateConfig.volatile_fields for the templates with a config file
+VOLATILE_DEFAULT_FIELDS = DEFAULT_TEMPLATE_CONFIG.volatile_fields
+
+
+def format_distinct_values(values: pd.Series, formatter):
+    """
+    A function that formats a column by formatting each distinct value only once, trade sheets repeat the same
+    dates and notionals many times so this is much faster than formatting every row with .apply
+    :param values: A pandas Series, e.g. Start Date
+    :param formatter: A function that takes a pd.Index of the distinct values and returns their formatted values
+    :return: A pandas Series of formatted values with the same index as values
+    """
+    # codes[i] is the position of values[i] in distinct_values, missing values are kept as a distinct value
+    codes, distinct_values = pd.factorize(values, use_na_sentinel=False)
+    formatted_values = np.asarray(formatter(pd.Index(distinct_values)), dtype=object)
+
+    return pd.Series(formatted_values[codes], index=values.index)
 
 
 class FillablePdfWriter:
@@ -11,65 +49,596 @@ class FillablePdfWriter:
     """
 
     def run_fillable_pdf_writer(self, path: str, efs_data_excel_file: str, efs_template_pdf: str, output_path: str,
-                                output_file_name: str):
+                                output_file_name: str, use_compiled_template: bool = True, workers: int = 1,
+                                chunk_size: int = 1000, incremental: bool = False, output_mode: str = 'files',
+                                progress_callback=None, cancel_event=None, efs_data_dfs=None, run_report=None,
+                                flatten: bool = False, cache_dir: str = None, pool=None, validation: str = 'strict',
+                                verify: bool = False):
         """
         Execute all the functions created in FillablePdfWriter in the class
         :param path: The path location where you store EFS data excel file & EFS template
         (make sure these two files store in the same path)
-        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx)
-        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file with
+        the same columns
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf), its fields are mapped by the config
+        file next to it if any (see load_template_config), or a template routing file (end with .json, see
+        load_template_routing) to fill the template picked by a column of each row
         :param output_path: The directory where you want to create the new PDF files
         :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf')
-        :return: create individual EFS PDF file based on the number of data rows in EFS data excel file
+        :param use_compiled_template: Parse the EFS template once and reuse it for every row (default True)
+        :param workers: The number of processes used to create the PDF files (default 1, no process pool)
+        :param chunk_size: The number of excel rows read and preprocessed at a time (default 1000)
+        :param incremental: Only recreate the PDF files whose row data changed since the previous run (default False)
+        :param output_mode: 'files' for one PDF file per row (default), 'merged' for one multi-page PDF file or 'zip'
+        for one zip archive of the PDF files
+        :param progress_callback: A function called with the number of rows done while the PDF files are created
+        :param cancel_event: A threading.Event, once set the run stops cleanly after the current PDF file
+        :param efs_data_dfs: A list of dataframes of EFS data before preprocessing already read from EFS data excel
+        file (e.g. by the GUI preview), used instead of reading the excel file again (default None)
+        :param run_report: A RunReport that records the stage and row timings of the run (default None, a new one),
+        create it with profile=True or trace_memory=True to also profile the run with cProfile or tracemalloc
+        :param flatten: Create uneditable PDF files, the values are drawn in the pages instead of the form fields
+        (default False)
+        :param cache_dir: Cache the preprocessed EFS data in this directory (default None, no cache), a later run of
+        the same unchanged EFS data file then reads the cache instead of parsing the file again (see EfsDataCache)
+        :param pool: A PdfWriterPool of worker processes kept running between runs, used instead of workers
+        (default None)
+        :param validation: 'strict' to check every row (see validate_efs_data_df) and create no pdf if any row is wrong
+        (default), 'skip' to only create the PDF files of the valid rows, or 'off' to fill the rows without checking
+        them first (EFS data file is then read once instead of twice), the rows are read and filled chunk by chunk in
+        every mode so the memory used does not grow with the number of rows, the errors are written to
+        'xxxxx_validation_errors.csv' in output_path
+        :param verify: Read back every PDF file once they are all created and compare its fields with its row (default
+        False, see verify_pdfs), the wrong fields are written to 'xxxxx_verification_errors.csv' in output_path and
+        raised as a PdfVerificationError, only for fillable PDF files in output_mode 'files' or 'zip'
+        :return: The RunReport of the run
         """
-        # Call method - import_efs_data_excel
-        efs_data_df = FillablePdfWriter.create_df_from_import_efs_excel(self, path, efs_data_excel_file)
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f'validation should be one of {VALIDATION_MODES}, not {validation!r}')
+        if run_report is None:
+            run_report = RunReport()
+        run_report.start()
+        status = 'failed'
+        verification_report = VerificationReport() if verify else None
+        try:
+            if is_template_routing_file(efs_template_pdf):
+                # Call method - fill_routed_pdfs
+                FillablePdfWriter.fill_routed_pdfs(self, path, efs_data_excel_file,
+                                                   load_template_routing(efs_template_pdf), output_path,
+                                                   output_file_name, use_compiled_template, workers, chunk_size,
+                                                   incremental, output_mode, progress_callback, cancel_event,
+                                                   efs_data_dfs, run_report, flatten, cache_dir, pool, validation,
+                                                   verification_report)
+            else:
+                # The fields of the template are mapped by its config file if any
+                template_config = load_template_config(
+                    efs_template_pdf.efs_template_pdf if isinstance(efs_template_pdf, CompiledPdfTemplate)
+                    else efs_template_pdf)
+                row_numbers = None
+                if validation != 'off':
+                    # Call method - iterate_valid_efs_data_dfs
+                    # Every row is checked chunk by chunk before the first pdf is written, then the valid rows are
+                    # read again and filled chunk by chunk, the skipped rows keep their row number
+                    bad_row_numbers, efs_data_dfs = FillablePdfWriter.iterate_valid_efs_data_dfs(
+                        self, path, efs_data_excel_file, template_config,
+                        get_template_fields(efs_template_pdf, flatten), validation, chunk_size, run_report, cache_dir,
+                        efs_data_dfs, os.path.join(output_path, f'{output_file_name}_validation_errors.csv'))
+                    row_numbers = itertools.filterfalse(set(bad_row_numbers).__contains__, itertools.count(1))
+                    efs_data_dicts = FillablePdfWriter.iterate_efs_data_dicts_from_preprocessed_dfs(
+                        self, efs_data_dfs, run_report)
+                elif efs_data_dfs is not None:
+                    # Call method - iterate_efs_data_dicts_from_dfs
+                    # The dataframes are copied because preprocess_efs_data_df changes them, the caller can reuse them
+                    efs_data_dicts = FillablePdfWriter.iterate_efs_data_dicts_from_dfs(
+                        self, (efs_data_df.copy() for efs_data_df in efs_data_dfs), run_report, template_config)
+                else:
+                    # Call method - iterate_efs_data_dicts_from_excel
+                    # The rows are read, preprocessed and filled chunk by chunk so that the memory used does not grow
+                    # with the number of trades in the excel file
+                    efs_data_dicts = FillablePdfWriter.iterate_efs_data_dicts_from_excel(
+                        self, path, efs_data_excel_file, chunk_size, run_report, cache_dir, template_config)
 
-        # Call method - create_efs_data_list_of_dict_from_df
-        efs_data_list = FillablePdfWriter.create_efs_data_list_of_dict_from_df(self, efs_data_df)
+                # Call method - fill_pdf
+                FillablePdfWriter.fill_pdfs(self, efs_template_pdf, output_path, output_file_name, efs_data_dicts,
+                                            use_compiled_template, workers, incremental, output_mode,
+                                            progress_callback, cancel_event, run_report, flatten, pool,
+                                            template_config, row_numbers, verification_report)
 
-        # Call method - fill_pdf
-        FillablePdfWriter.fill_pdfs(self, efs_template_pdf, output_path, output_file_name, efs_data_list)
+            # The run fails if any PDF file read back does not hold the values of its row
+            if verification_report is not None and verification_report.has_mismatches():
+                raise PdfVerificationError(verification_report)
+            status = 'cancelled' if cancel_event is not None and cancel_event.is_set() else 'done'
+        finally:
+            if verification_report is not None:
+                FillablePdfWriter.save_verification_report(
+                    self, verification_report, run_report,
+                    os.path.join(output_path, f'{output_file_name}_verification_errors.csv'))
+            run_report.stop(status)
 
-        print('Run successfully! New PDF files created!')
+        return run_report
 
-    def create_df_from_import_efs_excel(self, path: str, efs_data_excel_file: str):
+    def fill_routed_pdfs(self, path: str, efs_data_excel_file: str, template_routing, output_path: str,
+                         output_file_name: str, use_compiled_template: bool = True, workers: int = 1,
+                         chunk_size: int = 1000, incremental: bool = False, output_mode: str = 'files',
+                         progress_callback=None, cancel_event=None, efs_data_dfs=None, run_report=None,
+                         flatten: bool = False, cache_dir: str = None, pool=None, validation: str = 'strict',
+                         verification_report=None):
         """
-        A function that import EFS data excel file, and return a EFS data dataframe after preprocessing
+        A function that fills the EFS template picked by a TemplateRouting for each row of EFS data file, the rows are
+        grouped by template so that each template is compiled and filled in one batch with its own TemplateConfig, row
+        n is still written to 'xxxxx_n.pdf' whatever its template
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file
+        :param template_routing: The TemplateRouting that picks the template of each row
+        :param output_path: The directory where you want to create the new PDF files
+        :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf')
+        :param use_compiled_template: Parse each EFS template once and reuse it for every row (default True)
+        :param workers: The number of processes used to create the PDF files (default 1, no process pool)
+        :param chunk_size: The number of excel rows read at a time (default 1000), every row is read before the first
+        pdf is created to group the rows by template
+        :param incremental: Not supported, every template would save the same manifest
+        :param output_mode: Only 'files', every template would write the same merged pdf file or zip archive
+        :param progress_callback: A function called with the number of rows done while the PDF files are created
+        :param cancel_event: A threading.Event, once set the run stops cleanly after the current PDF file
+        :param efs_data_dfs: A list of dataframes of EFS data before preprocessing already read (default None)
+        :param run_report: A RunReport that records the stage and row timings of the run
+        :param flatten: Create uneditable PDF files (default False)
+        :param cache_dir: Read EFS data as read before from the EFS data cache in this directory, or store it there
+        (default None, no cache)
+        :param pool: A PdfWriterPool, only used for the rows of the template it was started for (default None)
+        :param validation: 'strict' (default), 'skip' or 'off', the rows of every template are checked with the config
+        of their template before the first pdf is written, the rows without a template are errors too
+        :param verification_report: A VerificationReport the wrong fields of the PDF files of every template are added
+        to (default None, the PDF files are not read back)
+        """
+        # Check the options before any pdf is written
+        if output_mode != 'files' or incremental:
+            raise ValueError("A template routing file can only be used with output_mode 'files' and without "
+                             "incremental")
+        if run_report is None:
+            run_report = RunReport()
+
+        # Every row is read first to group the rows by template
+        efs_data_df = FillablePdfWriter.read_efs_data_df(self, path, efs_data_excel_file, chunk_size, run_report,
+                                                         cache_dir, efs_data_dfs)
+
+        # Pick the template of every row, the rows without a template are reported before any pdf is written
+        validation_report = ValidationReport()
+        with run_report.stage('route_rows'):
+            template_files = template_routing.route(efs_data_df, None if validation == 'off' else validation_report)
+
+        # Check the rows of every template with the config of their template before the first pdf is written
+        template_dfs = []
+        for template_file, template_df in efs_data_df.groupby(template_files, sort=False):
+            template_config = load_template_config(template_file)
+            if validation != 'off':
+                with run_report.stage('validate'):
+                    template_df, _ = validate_efs_data_df(template_df.copy(), template_config,
+                                                          get_template_fields(template_file, flatten),
+                                                          validation_report)
+            template_dfs.append((template_file, template_config, template_df))
+        if validation != 'off':
+            template_dfs = FillablePdfWriter.remove_invalid_rows(
+                self, template_dfs, validation_report, validation, run_report,
+                os.path.join(output_path, f'{output_file_name}_validation_errors.csv'))
+
+        rows_done = 0
+        template_errors = []
+        for template_file, template_config, template_df in template_dfs:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+
+            # Preprocess and fill the rows of each template with the config of the template, the index of the rows
+            # is their row number - 1
+            row_numbers = (template_df.index + 1).tolist()
+            efs_data_dicts = FillablePdfWriter.iterate_efs_data_dicts_from_dfs(self, [template_df], run_report,
+                                                                               template_config)
+            template_progress_callback = None if progress_callback is None else \
+                lambda template_rows_done, rows_before=rows_done: progress_callback(rows_before + template_rows_done)
+            template_pool = pool if pool is not None and pool.matches(template_file, use_compiled_template, flatten) \
+                else None
+            try:
+                FillablePdfWriter.fill_pdfs(self, template_file, output_path, output_file_name, efs_data_dicts,
+                                            use_compiled_template, workers, False, 'files', template_progress_callback,
+                                            cancel_event, run_report, flatten, template_pool, template_config,
+                                            row_numbers, verification_report)
+            except Exception as error:
+                # Carry on with the other templates, every error is reported at the end
+                template_errors.append(f'{os.path.basename(template_file)}: {error}')
+            rows_done += len(row_numbers)
+
+        if template_errors:
+            raise Exception('Failed to create the PDF files of template(s):\n' + '\n'.join(template_errors))
+
+    def read_efs_data_df(self, path: str, efs_data_excel_file: str, chunk_size: int = 1000, run_report=None,
+                         cache_dir: str = None, efs_data_dfs=None):
+        """
+        A function that reads every row of EFS data file at once, e.g. to check or route every row before the first
+        pdf is written
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file
+        :param chunk_size: The number of excel rows read at a time (default 1000)
+        :param run_report: A RunReport that records the time spent reading the excel file as 'read_excel' (or the
+        cache as 'read_cache')
+        :param cache_dir: Read EFS data as read before from the EFS data cache in this directory, or store it there
+        (default None, no cache)
+        :param efs_data_dfs: A list of dataframes of EFS data before preprocessing already read (default None), they
+        are not changed
+        :return: A dataframe of EFS data before preprocessing, its index is the row number - 1
+        """
+        efs_data_dfs = list(FillablePdfWriter.iterate_efs_data_dfs(self, path, efs_data_excel_file, chunk_size,
+                                                                   run_report, cache_dir, efs_data_dfs))
+
+        return pd.concat(efs_data_dfs, ignore_index=True) if efs_data_dfs else pd.DataFrame()
+
+    def iterate_efs_data_dfs(self, path: str, efs_data_excel_file: str, chunk_size: int = 1000, run_report=None,
+                             cache_dir: str = None, efs_data_dfs=None):
+        """
+        A function that reads EFS data file chunk by chunk, from the EFS data cache if it was read before
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file
+        :param chunk_size: The number of excel rows read at a time (default 1000)
+        :param run_report: A RunReport that records the time spent reading the excel file as 'read_excel' (or the
+        cache as 'read_cache')
+        :param cache_dir: Read EFS data as read before from the EFS data cache in this directory, or store it there
+        once every row is read (default None, no cache)
+        :param efs_data_dfs: A list of dataframes of EFS data before preprocessing already read (default None), they
+        are copied so they can be read again
+        :return: An iterator of dataframes of EFS data before preprocessing
+        """
+        if run_report is None:
+            run_report = RunReport()
+        if efs_data_dfs is not None:
+            return (efs_data_df.copy() for efs_data_df in efs_data_dfs)
+
+        efs_data_file = os.path.join(os.path.abspath(path), efs_data_excel_file)
+        efs_data_cache = EfsDataCache(cache_dir) if cache_dir is not None else None
+        if efs_data_cache is not None:
+            with run_report.stage('read_cache'):
+                cached_efs_data_dfs = efs_data_cache.load_in_chunks(efs_data_file, 'raw', chunk_size)
+            if cached_efs_data_dfs is not None:
+                return run_report.time_iterator('read_cache', cached_efs_data_dfs)
+
+        efs_data_dfs = run_report.time_iterator('read_excel', FillablePdfWriter.read_efs_excel_in_chunks(
+            self, path, efs_data_excel_file, chunk_size))
+        if efs_data_cache is not None:
+            efs_data_dfs = efs_data_cache.cache_dfs(efs_data_file, 'raw', efs_data_dfs, run_report)
+
+        return efs_data_dfs
+
+    def iterate_valid_efs_data_dfs(self, path: str, efs_data_excel_file: str, template_config, template_fields=None,
+                                   validation: str = 'strict', chunk_size: int = 1000, run_report=None,
+                                   cache_dir: str = None, efs_data_dfs=None, error_report_file: str = None):
+        """
+        A function that checks every row of EFS data file with validate_efs_data_df chunk by chunk before the first pdf
+        is written, only the errors are kept, then returns a generator that reads EFS data file again and preprocesses
+        the valid rows chunk by chunk, so that the memory used does not grow with the number of rows
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file
+        :param template_config: The TemplateConfig of the EFS template
+        :param template_fields: The field names of the EFS template (default None, the fields are not checked)
+        :param validation: 'strict' to raise EfsDataValidationError if any row is wrong (default) or 'skip' to leave
+        the wrong rows out, the errors of the whole file (e.g. a missing column) are always raised
+        :param chunk_size: The number of excel rows read at a time (default 1000)
+        :param run_report: A RunReport that records the time spent in 'validate' and the number of invalid rows
+        :param cache_dir: Read the valid rows after preprocessing and their errors from the EFS data cache in this
+        directory if EFS data file did not change, or store them there (default None, no cache)
+        :param efs_data_dfs: A list of dataframes of EFS data before preprocessing already read (default None)
+        :param error_report_file: The csv file the errors are written to if any (default None, not written)
+        :return: A tuple of the sorted list of the row numbers of the wrong rows and a generator of dataframes of the
+        valid rows after preprocessing
+        """
+        if run_report is None:
+            run_report = RunReport()
+        efs_data_file = os.path.join(os.path.abspath(path), efs_data_excel_file)
+        efs_data_cache = EfsDataCache(cache_dir) if cache_dir is not None and efs_data_dfs is None else None
+        # The errors also depend on the fields of the template, which can change without its config
+        fields_hash = hash_dict({'template_fields': None if template_fields is None else sorted(template_fields)})
+        frame_name = f'{validation}_{template_config.config_hash[:16]}_{fields_hash[:16]}'
+        if efs_data_cache is not None:
+            source_mtime_ns = os.stat(efs_data_file).st_mtime_ns
+
+        # Skip checking EFS data file again if its errors are cached
+        error_df = None
+        if efs_data_cache is not None:
+            with run_report.stage('read_cache'):
+                error_df = efs_data_cache.load(efs_data_file, f'errors_{frame_name}')
+        if error_df is not None:
+            validation_report = ValidationReport(error_df)
+        else:
+            validation_report = ValidationReport()
+            for efs_data_df in FillablePdfWriter.iterate_numbered_efs_data_dfs(
+                    self, FillablePdfWriter.iterate_efs_data_dfs(self, path, efs_data_excel_file, chunk_size,
+                                                                 run_report, cache_dir, efs_data_dfs)):
+                with run_report.stage('validate'):
+                    validate_efs_data_df(efs_data_df, template_config, template_fields, validation_report)
+                # The errors of the whole file are the same in every chunk and no row can be filled until they are
+                # fixed, the other chunks are not checked
+                if validation_report.has_file_errors():
+                    break
+            if efs_data_cache is not None and not validation_report.has_file_errors():
+                with run_report.stage('write_cache'):
+                    efs_data_cache.save(efs_data_file, f'errors_{frame_name}', validation_report.to_df(),
+                                        source_mtime_ns)
+        FillablePdfWriter.remove_invalid_rows(self, [], validation_report, validation, run_report, error_report_file)
+        bad_row_numbers = validation_report.get_bad_row_numbers()
+
+        # Skip reading and preprocessing EFS data file again if its valid rows are cached
+        if efs_data_cache is not None:
+            with run_report.stage('read_cache'):
+                cached_efs_data_dfs = efs_data_cache.load_in_chunks(efs_data_file, f'preprocessed_{frame_name}',
+                                                                    chunk_size)
+            if cached_efs_data_dfs is not None:
+                return bad_row_numbers, run_report.time_iterator('read_cache', cached_efs_data_dfs)
+
+        efs_data_dfs = FillablePdfWriter.iterate_preprocessed_valid_efs_data_dfs(
+            self, FillablePdfWriter.iterate_efs_data_dfs(self, path, efs_data_excel_file, chunk_size, run_report,
+                                                         cache_dir, efs_data_dfs),
+            bad_row_numbers, run_report, template_config)
+        if efs_data_cache is not None:
+            efs_data_dfs = efs_data_cache.cache_dfs(efs_data_file, f'preprocessed_{frame_name}', efs_data_dfs,
+                                                    run_report)
+
+        return bad_row_numbers, efs_data_dfs
+
+    def iterate_numbered_efs_data_dfs(self, efs_data_dfs):
+        """
+        :param efs_data_dfs: An iterable of dataframes of EFS data, each numbered from 0
+        :return: A generator of the same dataframes, their index is the row number - 1 in EFS data file
+        """
+        rows_read = 0
+        for efs_data_df in efs_data_dfs:
+            efs_data_df.index = pd.RangeIndex(rows_read, rows_read + len(efs_data_df))
+            rows_read += len(efs_data_df)
+            yield efs_data_df
+
+    def iterate_preprocessed_valid_efs_data_dfs(self, efs_data_dfs, bad_row_numbers: list, run_report,
+                                                template_config=None):
+        """
+        :param efs_data_dfs: An iterable of dataframes of EFS data before preprocessing, already checked by
+        validate_efs_data_df
+        :param bad_row_numbers: The row numbers of the wrong rows, left out
+        :param run_report: A RunReport that records the time spent in 'validate' and 'preprocess'
+        :param template_config: The TemplateConfig of the EFS template (default None, DEFAULT_TEMPLATE_CONFIG)
+        :return: A generator of dataframes of the valid rows after preprocessing
+        """
+        if template_config is None:
+            template_config = DEFAULT_TEMPLATE_CONFIG
+        bad_row_indexes = [row_number - 1 for row_number in bad_row_numbers]
+        for efs_data_df in FillablePdfWriter.iterate_numbered_efs_data_dfs(self, efs_data_dfs):
+            with run_report.stage('validate'):
+                # The dates and numbers are converted again, their errors are already known
+                efs_data_df, _ = validate_efs_data_df(efs_data_df, template_config)
+                efs_data_df = efs_data_df.drop(index=bad_row_indexes, errors='ignore')
+            if efs_data_df.empty:
+                continue
+            with run_report.stage('preprocess'):
+                efs_data_df = FillablePdfWriter.preprocess_efs_data_df(self, efs_data_df, template_config)
+            yield efs_data_df
+
+    def remove_invalid_rows(self, efs_data_items: list, validation_report, validation: str, run_report,
+                            error_report_file: str = None):
+        """
+        A function that writes the errors found by validate_efs_data_df, raises them in 'strict' validation and
+        otherwise leaves the wrong rows out
+        :param efs_data_items: A list of tuples whose last item is a dataframe of EFS data with the row number - 1 as
+        index, e.g. (template file, template config, dataframe)
+        :param validation_report: The ValidationReport of the rows
+        :param validation: 'strict' or 'skip'
+        :param run_report: A RunReport that records the number of invalid rows
+        :param error_report_file: The csv file the errors are written to if any, or removed if there is no error
+        (default None)
+        :return: The same list of tuples with the wrong rows removed from the dataframes
+        """
+        if not validation_report.has_errors():
+            # Remove the error report of a previous run of the same output file name
+            if error_report_file is not None and os.path.exists(error_report_file):
+                os.remove(error_report_file)
+            return efs_data_items
+
+        if error_report_file is not None:
+            validation_report.write_csv(error_report_file)
+        # The errors of the whole file (e.g. a missing column) concern every row
+        if validation == 'strict' or validation_report.has_file_errors():
+            raise EfsDataValidationError(validation_report)
+
+        bad_row_indexes = [row_number - 1 for row_number in validation_report.get_bad_row_numbers()]
+        run_report.rows_invalid += len(bad_row_indexes)
+
+        return [(*efs_data_item[:-1], efs_data_item[-1].drop(index=bad_row_indexes, errors='ignore'))
+                for efs_data_item in efs_data_items]
+
+    def save_verification_report(self, verification_report, run_report, error_report_file: str = None):
+        """
+        A function that writes the wrong fields found by verify_pdfs and records the number of wrong PDF files
+        :param verification_report: The VerificationReport of the run
+        :param run_report: A RunReport that records the number of PDF files with a wrong field
+        :param error_report_file: The csv file the wrong fields are written to if any, or removed if there is none
+        (default None)
+        """
+        run_report.rows_mismatched = len(verification_report.get_mismatched_row_numbers())
+        if error_report_file is None:
+            return
+        if verification_report.has_mismatches():
+            verification_report.write_csv(error_report_file)
+        elif os.path.exists(error_report_file):
+            # Remove the error report of a previous run of the same output file name
+            os.remove(error_report_file)
+
+    def count_efs_excel_rows(self, path: str, efs_data_excel_file: str):
+        """
+        A function that reads the number of data rows from the sheet dimension without reading the rows
         :param path: The path location where you store EFS data excel file
         :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx)
+        :return: The number of data rows (without the header), or None if the excel file does not store its dimension
+        or EFS data file is not an excel file
+        """
+        if os.path.splitext(efs_data_excel_file)[1].lower() not in EXCEL_EXTENSIONS:
+            return None
+
+        workbook = openpyxl.load_workbook(os.path.join(os.path.abspath(path), efs_data_excel_file), read_only=True)
+        try:
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+
+        return None if max_row is None else max(0, max_row - 1)
+
+    def create_df_from_import_efs_excel(self, path: str, efs_data_excel_file: str, template_config=None):
+        """
+        A function that import EFS data excel file, and return a EFS data dataframe after preprocessing
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file with
+        the same columns
+        :param template_config: The TemplateConfig of the EFS template (default None, DEFAULT_TEMPLATE_CONFIG)
         :return: A dataframe of EFS data after preprocessing
         """
 
         # Create efs data dataframe
         # todo: in the future use ExcelHelper and full path
-        efs_data_df = pd.read_excel(os.path.join(os.path.abspath(path), efs_data_excel_file))
+        efs_data_file = os.path.join(os.path.abspath(path), efs_data_excel_file)
+        if os.path.splitext(efs_data_file)[1].lower() in EXCEL_EXTENSIONS:
+            efs_data_df = pd.read_excel(efs_data_file)
+        else:
+            efs_data_df = pd.concat(get_efs_data_reader(efs_data_file)(efs_data_file), ignore_index=True)
+
+        # Call method - preprocess_efs_data_df
+        return FillablePdfWriter.preprocess_efs_data_df(self, efs_data_df, template_config)
+
+    def read_efs_excel_in_chunks(self, path: str, efs_data_excel_file: str, chunk_size: int = 1000,
+                                 first_chunk_size: int = None):
+        """
+        A function that reads EFS data excel file in openpyxl read-only mode (or a .csv or .parquet file with the
+        reader of its extension, see EFS_DATA_READERS) and yields the rows chunk by chunk
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx)
+        :param chunk_size: The number of rows in each dataframe (default 1000)
+        :param first_chunk_size: The number of rows in the first dataframe (default chunk_size), e.g. a small first
+        chunk to show the first rows of a large excel file as soon as they are read
+        :return: A generator of dataframes of EFS data before preprocessing, with the same columns as pd.read_excel
+        """
+        return read_efs_data_in_chunks(os.path.join(os.path.abspath(path), efs_data_excel_file), chunk_size,
+                                       first_chunk_size)
+
+    def iterate_efs_data_dicts_from_excel(self, path: str, efs_data_excel_file: str, chunk_size: int = 1000,
+                                          run_report=None, cache_dir: str = None, template_config=None):
+        """
+        A function that reads, preprocesses and converts EFS data excel file into EFS data dictionaries chunk by chunk
+        :param path: The path location where you store EFS data excel file
+        :param efs_data_excel_file: The excel file name of EFS data (end with .xlsx), or a .csv or .parquet file
+        :param chunk_size: The number of rows read and preprocessed at a time (default 1000)
+        :param run_report: A RunReport that records the time spent reading the excel file as 'read_excel' (or the
+        cache as 'read_cache')
+        :param cache_dir: Read the preprocessed EFS data from the EFS data cache in this directory if EFS data file
+        did not change, or store it there once every row is read (default None, no cache)
+        :param template_config: The TemplateConfig of the EFS template (default None, DEFAULT_TEMPLATE_CONFIG), the
+        preprocessed EFS data is cached for each config
+        :return: A generator of EFS data dictionaries, one per data row in EFS data excel file
+        """
+        if run_report is None:
+            run_report = RunReport()
+        if template_config is None:
+            template_config = DEFAULT_TEMPLATE_CONFIG
+        preprocessed_frame_name = f'preprocessed_{template_config.config_hash[:16]}'
+        efs_data_file = os.path.join(os.path.abspath(path), efs_data_excel_file)
+        efs_data_cache = EfsDataCache(cache_dir) if cache_dir is not None else None
 
+        # Skip reading and preprocessing EFS data file if its preprocessed dataframe is cached
+        if efs_data_cache is not None:
+            with run_report.stage('read_cache'):
+                cached_efs_data_dfs = efs_data_cache.load_in_chunks(efs_data_file, preprocessed_frame_name, chunk_size)
+            if cached_efs_data_dfs is not None:
+                return FillablePdfWriter.iterate_efs_data_dicts_from_preprocessed_dfs(
+                    self, run_report.time_iterator('read_cache', cached_efs_data_dfs), run_report)
+
+        efs_data_dfs = FillablePdfWriter.read_efs_excel_in_chunks(self, path, efs_data_excel_file, chunk_size)
+        efs_data_dfs = run_report.time_iterator('read_excel', efs_data_dfs)
+        if efs_data_cache is None:
+            return FillablePdfWriter.iterate_efs_data_dicts_from_dfs(self, efs_data_dfs, run_report, template_config)
+
+        # Cache the dataframes as read (for the GUI preview) and after preprocessing
+        efs_data_dfs = efs_data_cache.cache_dfs(efs_data_file, 'raw', efs_data_dfs, run_report)
+        efs_data_dfs = FillablePdfWriter.iterate_preprocessed_efs_data_dfs(self, efs_data_dfs, run_report,
+                                                                           template_config)
+        efs_data_dfs = efs_data_cache.cache_dfs(efs_data_file, preprocessed_frame_name, efs_data_dfs, run_report)
+
+        return FillablePdfWriter.iterate_efs_data_dicts_from_preprocessed_dfs(self, efs_data_dfs, run_report)
+
+    def iterate_efs_data_dicts_from_dfs(self, efs_data_dfs, run_report=None, template_config=None):
+        """
+        A function that preprocesses and converts dataframes of EFS data into EFS data dictionaries one dataframe at a
+        time
+        :param efs_data_dfs: An iterable of dataframes of EFS data before preprocessing, e.g. read_efs_excel_in_chunks
+        :param run_report: A RunReport that records the time spent in 'preprocess' and 'build_dicts'
+        :param template_config: The TemplateConfig of the EFS template (default None, DEFAULT_TEMPLATE_CONFIG)
+        :return: A generator of EFS data dictionaries, one per row of the dataframes
+        """
+        if run_report is None:
+            run_report = RunReport()
+
+        return FillablePdfWriter.iterate_efs_data_dicts_from_preprocessed_dfs(
+            self, FillablePdfWriter.iterate_preprocessed_efs_data_dfs(self, efs_data_dfs, run_report, template_config),
+            run_report)
+
+    def iterate_preprocessed_efs_data_dfs(self, efs_data_dfs, run_report, template_config=None):
+        """
+        :param efs_data_dfs: An iterable of dataframes of EFS data before preprocessing
+        :param run_report: A RunReport that records the time spent in 'preprocess'
+        :param template_config: The TemplateConfig of the EFS template (default None, DEFAULT_TEMPLATE_CONFIG)
+        :return: A generator of dataframes of EFS data after preprocessing
+        """
+        for efs_data_df in efs_data_dfs:
+            with run_report.stage('preprocess'):
+                efs_data_df = FillablePdfWriter.preprocess_efs_data_df(self, efs_data_df, template_config)
+            yield efs_data_df
+
+    def iterate_efs_data_dicts_from_preprocessed_dfs(self, efs_data_dfs, run_report):
+        """
+        :param efs_data_dfs: An iterable of dataframes of EFS data after preprocessing
+        :param run_report: A RunReport that records the time spent in 'build_dicts'
+        :return: A generator of EFS data dictionaries, one per row of the dataframes
+        """
+        for efs_data_df in efs_data_dfs:
+            yield from run_report.time_iterator('build_dicts',
+                                                FillablePdfWriter.iterate_efs_data_dicts_from_df(self, efs_data_df))
+
+    def preprocess_efs_data_df(self, efs_data_df: pd.DataFrame, template_config=None):
+        """
+        A function that preprocess the EFS data dataframe with vectorized pandas/NumPy operations, and rename the
+        columns according to the field names of template pdf
+        :param efs_data_df: The dataframe of EFS data as read from EFS data excel file
+        :param template_config: The TemplateConfig that maps the columns to the field names of the template (default
+        None, DEFAULT_TEMPLATE_CONFIG)
+        :return: A dataframe of EFS data after preprocessing
+        """
         # Change start date and expiry date column format
-        efs_data_df['Start Date'] = efs_data_df['Start Date'].apply(lambda x: x.strftime('%d/%m/%Y'))
-        efs_data_df['Expiry Date'] = efs_data_df['Expiry Date'].apply(lambda x: x.strftime('%d/%m/%Y'))
+        efs_data_df['Start Date'] = format_distinct_values(efs_data_df['Start Date'],
+                                                           lambda x: x.strftime('%d/%m/%Y'))
+        efs_data_df['Expiry Date'] = format_distinct_values(efs_data_df['Expiry Date'],
+                                                            lambda x: x.strftime('%d/%m/%Y'))
 
         # Create shipment month and shipment year column based on the value from shipment column
-        efs_data_df['Shipment Month'] = efs_data_df['Shipment'].apply(lambda x: x.strftime('%b').upper())
-        efs_data_df['Shipment Year'] = efs_data_df['Shipment'].apply(lambda x: x.strftime('%y'))
+        efs_data_df['Shipment Month'] = format_distinct_values(efs_data_df['Shipment'],
+                                                               lambda x: x.strftime('%b').str.upper())
+        efs_data_df['Shipment Year'] = format_distinct_values(efs_data_df['Shipment'], lambda x: x.strftime('%y'))
 
         # If notional column does not exist in dataframe, create a notional column with the formula below:
         # Notional = Rounded strike * Quantity * 5 * 10
         if 'Notional' not in efs_data_df.columns:
             efs_data_df['Notional'] = efs_data_df['Rounded strike'] * efs_data_df['Total Quantity (lots)'] * 5 * 10
-            efs_data_df['Notional'] = efs_data_df['Notional'].apply(lambda x: "{:,.0f}".format(x))
-        else:
-            efs_data_df['Notional'] = efs_data_df['Notional'].apply(lambda x: "{:,.0f}".format(x))
+        efs_data_df['Notional'] = format_distinct_values(efs_data_df['Notional'],
+                                                         lambda x: ["{:,.0f}".format(value) for value in x])
 
         # If commodity code column does not exist in dataframe, create a commodity code column using the formula below:
         # Commodity Code = 'OR' + Shipment Month Letter + last 2 digit of Shipment Year
         if 'Commodity Code' not in efs_data_df.columns:
-            # create commodity codes mapper
-            commodity_codes_mapper = {'JAN': 'F', 'FEB': 'G', 'MAR': 'H', 'APR': 'J', 'MAY': 'K', 'JUN': 'M',
-                                      'JUL': 'N', 'AUG': 'Q', 'SEP': 'U', 'OCT': 'V', 'NOV': 'X', 'DEC': 'Z'}
-            # create shipment month letter column from commodity_codes_mapper based on the value in shipment month
-            # column
-            efs_data_df['Shipment Month Letter'] = efs_data_df['Shipment Month'].map(commodity_codes_mapper)
+            # create shipment month letter column by looking up the month number (1 - 12) of shipment column in
+            # COMMODITY_MONTH_LETTERS, e.g. JAN => F, JUL => N
+            shipment_month_number = efs_data_df['Shipment'].dt.month.to_numpy(dtype=float)
+            shipment_month_letter = COMMODITY_MONTH_LETTERS[np.nan_to_num(shipment_month_number, nan=1).astype(int) - 1]
+            # shipment without a date has no month letter
+            shipment_month_letter[np.isnan(shipment_month_number)] = np.nan
+            efs_data_df['Shipment Month Letter'] = shipment_month_letter
             # create commonity code column by combining 'OR' + month letter + shipment year
             efs_data_df['Commodity Code'] = 'OR' + efs_data_df['Shipment Month Letter'] + efs_data_df['Shipment Year']
 
@@ -77,39 +646,18 @@ class FillablePdfWriter:
         # used to tick the checbox in EFS pdf else there is no value for seller/buyer and the checkbox in pdf will
         # not be ticked
         if 'Transaction Type' in efs_data_df.columns:
-            # create transaction type mapper
-            transaction_type_mapper = {'Short': 'Seller', 'Long': 'Buyer'}
-            # create seller mapper
-            seller_mapper = {'Seller': 'On', 'Buyer': 'Off'}
-            # create buyer mapper
-            buyer_mapper = {'Seller': 'Off', 'Buyer': 'On'}
-            # create buyer/seller column from transaction_type_mapper based on the value in transaction type column
-            efs_data_df['Buyer/Seller'] = efs_data_df['Transaction Type'].map(transaction_type_mapper)
-            # create seller column from seller_mapper based on the value in buyer/seller column
-            efs_data_df['Seller'] = efs_data_df['Buyer/Seller'].map(seller_mapper)
-            # create buyer column from buyer_mapper based on the value in buyer/seller buyer
-            efs_data_df['Buyer'] = efs_data_df['Buyer/Seller'].map(buyer_mapper)
-
-        # Create a column names mapper to change dataframe column names according to the field names of template pdf
-        # Because most of the field names in template pdf return 'undefined' <= check with fillpdfs.get_form_fields(
-        # template_pdf_file)
-        mapper = {'Start Date': 'undefined_12',
-                  'Expiry Date': 'undefined_13',
-                  'Rounded strike': 'undefined_4',
-                  'Total Quantity (lots)': 'undefined_3',
-                  'Shipment Month': 'undefined_2',
-                  'Notional': 'undefined_16',
-                  'Commodity Code': 'Commodity Code  Contract Month'}
-
-        # Rename some columns in dataframe according to the mapper
-        efs_data_df = efs_data_df.rename(mapper=mapper, axis='columns')
-
-        # Create a new column - undefined_14 with the same value as rounded strike to be filled in the EFS pdf
-        # Because there are two fillable fields in pdf that need to be filled with price value ('undefined_4' &
-        # 'undefined_14')
-        efs_data_df['undefined_14'] = efs_data_df['undefined_4']
-
-        return efs_data_df
+            # create buyer/seller, seller and buyer columns directly from transaction type column, transaction types
+            # that are not in the mappers are left empty
+            efs_data_df['Buyer/Seller'] = efs_data_df['Transaction Type'].map({'Short': 'Seller', 'Long': 'Buyer'})
+            efs_data_df['Seller'] = efs_data_df['Transaction Type'].map({'Short': 'On', 'Long': 'Off'})
+            efs_data_df['Buyer'] = efs_data_df['Transaction Type'].map({'Short': 'Off', 'Long': 'On'})
+
+        # Change dataframe column names according to the field names of template pdf, the mapper of the template config
+        # also copies the columns filled in several fields (e.g. rounded strike in 'undefined_4' & 'undefined_14')
+        if template_config is None:
+            template_config = DEFAULT_TEMPLATE_CONFIG
+
+        return template_config.map_fields(efs_data_df)
 
     def create_efs_data_list_of_dict_from_df(self, efs_data_df: pd.DataFrame):
         """
@@ -117,55 +665,233 @@ class FillablePdfWriter:
         :param efs_data_df: The dataframe variable created from create_efs_data_list_of_dict_from_df function
         :return: A list of EFS data dictionaries
         """
-        efs_data_list_of_dict = []
-        # iterate over EFS data dataframe rows as (index, Series) pairs
-        for _, row in efs_data_df.iterrows():
-            # convert each dataframe row into dictionary and append the dictionary into a list
-            efs_data_list_of_dict.append(dict(row))
-            # print(dict(row))
+        return list(FillablePdfWriter.iterate_efs_data_dicts_from_df(self, efs_data_df))
 
-        return efs_data_list_of_dict
+    def iterate_efs_data_dicts_from_df(self, efs_data_df: pd.DataFrame):
+        """
+        A function that yields one EFS data dictionary per row of EFS dataframe
+        :param efs_data_df: The dataframe variable created from create_df_from_import_efs_excel function
+        :return: A generator of EFS data dictionaries
+        """
+        columns = list(efs_data_df.columns)
+        # iterate over EFS data dataframe rows as plain tuples, which is much cheaper than iterrows() (index, Series)
+        for row in efs_data_df.itertuples(index=False, name=None):
+            yield dict(zip(columns, row))
 
-    def fill_pdfs(self, efs_template_pdf: str, output_path: str, output_file_name: str, efs_data_list_of_dict: list):
+    def fill_pdfs(self, efs_template_pdf, output_path: str, output_file_name: str, efs_data_list_of_dict: list,
+                  use_compiled_template: bool = True, workers: int = 1, incremental: bool = False,
+                  output_mode: str = 'files', progress_callback=None, cancel_event=None, run_report=None,
+                  flatten: bool = False, pool=None, template_config=None, row_numbers=None,
+                  verification_report=None):
         """
         A function that create individual PDF file based on efs data list of dictionaries
-        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+        :param efs_template_pdf: The pdf file name of EFS template (end with .pdf) or a CompiledPdfTemplate
         :param output_path: The directory where you want to create the new PDF files
         :param output_file_name: The pdf file name of EFS that you want to create (*** without '.pdf'),
         the suffix of filename created will be increase by 1 with the first filename as 'xxxxx_1.pdf' and
         second filename as 'xxxxx_2.pdf'
         :param efs_data_list_of_dict: The name of list variable created from create_efs_data_list_of_dict_from_df
-        function
+        function, or any iterable of EFS data dictionaries (e.g. iterate_efs_data_dicts_from_excel)
+        :param use_compiled_template: Parse the EFS template once and reuse it for every row (default True), each pdf
+        is then written as the precompiled template bytes plus an update of the filled fields (ByteStampedPdfTemplate),
+        if False the template is parsed again by fillpdfs.write_fillable_pdf for every row
+        :param workers: The number of processes used to create the PDF files (default 1), if more than 1 the rows are
+        split into chunks and filled in a process pool where each worker loads the template once, the rows that fail
+        are reported together once all the other PDF files are created
+        :param incremental: Keep a manifest 'xxxxx_manifest.json' of row hashes in output_path and only recreate the
+        PDF files of new or changed rows (default False), the PDF files of deleted rows are removed, every PDF file is
+        recreated if the template or the default fields changed (except the current date and time, see
+        VOLATILE_DEFAULT_FIELDS)
+        :param output_mode: 'files' for one PDF file per row (default), 'merged' for one multi-page PDF file
+        'xxxxx.pdf' with one bookmark per row, or 'zip' for one zip archive 'xxxxx.zip' of 'xxxxx_n.pdf' files built in
+        memory, 'merged' and 'zip' are written by this process only (workers and incremental are not supported)
+        :param progress_callback: A function called with the number of rows done after each PDF file (each chunk of
+        rows if workers is more than 1)
+        :param cancel_event: A threading.Event, once set the run stops cleanly after the current PDF file, the PDF files
+        already created are kept and in incremental mode no manifest is saved so the next run checks every row again
+        :param run_report: A RunReport that records the time spent in each stage, the seconds and bytes of each row and
+        the rows skipped or failed (default None, not recorded)
+        :param flatten: Create uneditable PDF files (default False), the field values are drawn in the page content
+        and the form fields removed in the same pass as filling (see ByteStampedPdfTemplate), only with
+        use_compiled_template
+        :param pool: A PdfWriterPool already started for the same EFS template and options (default None), the rows are
+        then filled by its worker processes (workers is set to the number of workers of the pool) and the pool is kept
+        running for the next run
+        :param template_config: The TemplateConfig of the default fields of the EFS template (default None, read from
+        the config file next to the template, see load_template_config)
+        :param row_numbers: The row number of each EFS data dictionary, e.g. the rows of one template of a routed run
+        (default None, the rows are numbered from 1)
+        :param verification_report: A VerificationReport, once every PDF file is created they are read back in
+        parallel by the workers (or the worker processes of the pool) and the fields whose value is not the value of
+        their row are added to it (default None, not read back), the rows filled are kept in memory until then
         :return create individual EFS PDF file based on the number of data rows in EFS data excel file
         """
-        # Create current date and current time variables
-        current_date = datetime.datetime.now()
-        # print(f'CURRENT DATETIME: {current_date}')
-        current_date_str = current_date.strftime('%d/%m/%Y')
-        current_time_str = current_date.strftime("%I.%M %p")
-
-        # Create default field value dictionary to be filled in the EFS pdf
-        default_dict = {'Date': current_date_str,
-                        'Swaps': 'On',  # always tick
-                        'Member Code': 'S111',
-                        'Customer  Account Number': 'SRITRANG INTL / S72449G',
-                        'Date  Time of EFP  EFS transaction': f'{current_date_str} at {current_time_str}',
-                        'undefined': 'Sicom TSR',
-                        'SWAPS': 'On',  # always tick
-                        'Fixed Rate Payer  Floating Rate Receiver': 'SRITRANG',
-                        'Fixed Rate Receiver  Floating Rate Payer': 'BANK'}
+        # The rows are filled by the workers of the pool
+        if pool is not None:
+            workers = pool.workers
+
+        # Check the output mode before any pdf is written
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f'output_mode should be one of {OUTPUT_MODES}, not {output_mode!r}')
+        if output_mode != 'files' and (workers > 1 or incremental):
+            raise ValueError(f"workers and incremental can only be used with output_mode 'files', not {output_mode!r}")
+        if flatten and not use_compiled_template:
+            raise ValueError('flatten can only be used with use_compiled_template')
+        if verification_report is not None and (flatten or output_mode == 'merged'):
+            raise ValueError("Only fillable PDF files in output_mode 'files' or 'zip' can be verified")
+
+        # The timings are recorded in a report nobody reads if the caller did not pass one
+        if run_report is None:
+            run_report = RunReport()
+
+        # The template file name of a compiled template
+        template_file = efs_template_pdf.efs_template_pdf if isinstance(efs_template_pdf, CompiledPdfTemplate) \
+            else efs_template_pdf
+        if template_config is None:
+            template_config = load_template_config(template_file)
+
+        # Parse the EFS template only once (and only once per process for the next runs of the same template), unless
+        # the caller already passed a compiled template or the rows are filled in a process pool (each worker then
+        # parses its own copy)
+        if use_compiled_template and workers <= 1 and not isinstance(efs_template_pdf, CompiledPdfTemplate):
+            efs_template_pdf = load_compiled_template(efs_template_pdf, flatten)
+        elif flatten and isinstance(efs_template_pdf, CompiledPdfTemplate) and \
+                not getattr(efs_template_pdf, 'flatten', False):
+            raise ValueError('flatten needs a ByteStampedPdfTemplate created with flatten=True')
+
+        # Call method - create_default_dict
+        default_dict = FillablePdfWriter.create_default_dict(self, template_config)
+
+        # Number the rows from 1, row n is written to 'xxxxx_n.pdf'
+        if row_numbers is None:
+            numbered_efs_data_dicts = enumerate(efs_data_list_of_dict, start=1)
+        else:
+            numbered_efs_data_dicts = zip(row_numbers, efs_data_list_of_dict)
+
+        # In incremental mode skip the rows whose pdf is already up to date
+        manifest = None
+        if incremental:
+            manifest = PdfManifest(output_path, output_file_name, template_file, default_dict,
+                                   template_config.volatile_fields, {'flatten': flatten})
+            numbered_efs_data_dicts = run_report.time_iterator('incremental_check',
+                                                               manifest.iterate_changed_rows(numbered_efs_data_dicts))
 
         # Check default dictionary and excel data dictionary have different keys
-        # Merge default field value dictionary with efs data list of dictionaries & create new pdf file for each row
-        for row in range(len(efs_data_list_of_dict)):
-            if not set(default_dict.keys()).isdisjoint(efs_data_list_of_dict[row].keys()):
-                raise Exception(
+        # Merge default field value dictionary with each efs data dictionary as the rows are read
+        final_value_dicts = run_report.time_iterator(
+            'build_dicts', FillablePdfWriter.iterate_final_value_dicts(self, default_dict, numbered_efs_data_dicts))
+
+        # Keep the rows filled to read their PDF files back once they are all created
+        filled_rows = None
+        if verification_report is not None:
+            filled_rows = []
+            final_value_dicts = iterate_and_keep_rows(final_value_dicts, filled_rows)
+
+        # Fill the rows in a process pool, the n-th row is still written to 'xxxxx_n.pdf'
+        if workers > 1:
+            # the workers only need the template filename, they load the template themselves
+            if isinstance(efs_template_pdf, CompiledPdfTemplate):
+                efs_template_pdf = efs_template_pdf.efs_template_pdf
+            # the time the main process waits for the workers is counted as 'fill_pdfs'
+            with run_report.stage('fill_pdfs'):
+                row_errors = fill_pdfs_in_parallel(efs_template_pdf, output_path, output_file_name, final_value_dicts,
+                                                   workers, use_compiled_template, progress_callback=progress_callback,
+                                                   cancel_event=cancel_event, run_report=run_report, flatten=flatten,
+                                                   pool=pool)
+        elif output_mode == 'files':
+            # Create new pdf file for each row
+            row_errors = []
+            for rows_done, (row_number, final_value_dict) in enumerate(final_value_dicts, start=1):
+                # fill the pdf of each data dictionary in memory and write it to its file, timed apart
+                start_time = time.perf_counter()
+                with run_report.stage('fill_pdfs'):
+                    buffer = io.BytesIO()
+                    write_filled_pdf(efs_template_pdf, buffer, final_value_dict)
+                with run_report.stage('write_output'):
+                    with open(f'{output_path}/{output_file_name}_{row_number}.pdf', 'wb') as output_pdf_file:
+                        output_pdf_file.write(buffer.getbuffer())
+                run_report.add_row(row_number, time.perf_counter() - start_time, buffer.getbuffer().nbytes)
+                if progress_callback is not None:
+                    progress_callback(rows_done)
+                # stop after the current file if the run is cancelled
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+        else:
+            # Write every row into one merged pdf file or one zip archive
+            row_errors = []
+            output_file = f'{output_path}/{output_file_name}.{"pdf" if output_mode == "merged" else "zip"}'
+            if output_mode == 'merged':
+                output_writer = MergedPdfWriter(output_file)
+            else:
+                output_writer = ZipPdfWriter(output_file)
+            for rows_done, (row_number, final_value_dict) in enumerate(final_value_dicts, start=1):
+                start_time = time.perf_counter()
+                with run_report.stage('fill_pdfs'):
+                    output_writer.add(efs_template_pdf, f'{output_file_name}_{row_number}.pdf', final_value_dict)
+                run_report.add_row(row_number, time.perf_counter() - start_time)
+                if progress_callback is not None:
+                    progress_callback(rows_done)
+                # stop after the current row if the run is cancelled, the rows already added are still written
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+            with run_report.stage('write_output'):
+                output_writer.close()
+            run_report.bytes_written += os.path.getsize(output_file)
+
+        run_report.rows_failed += len(row_errors)
+
+        # Read back the PDF files created and compare their fields with their rows, unless the run was cancelled
+        if filled_rows is not None and not (cancel_event is not None and cancel_event.is_set()):
+            failed_row_numbers = {row_number for row_number, _ in row_errors}
+            filled_rows = [filled_row for filled_row in filled_rows if filled_row[0] not in failed_row_numbers]
+            with run_report.stage('verify_pdfs'):
+                verification_report.add_mismatches(
+                    verify_pdfs(output_path, output_file_name, filled_rows, get_template_fields(efs_template_pdf),
+                                f'{output_path}/{output_file_name}.zip' if output_mode == 'zip' else None, workers,
+                                None if pool is None else pool.executor),
+                    len(filled_rows))
+
+        if manifest is not None:
+            run_report.rows_skipped += manifest.unchanged_rows
+
+        # Remove the pdf files of deleted rows and save the row hashes for the next run, unless the run was cancelled,
+        # the rows that failed or whose pdf has a wrong field are recreated by the next run
+        if manifest is not None and not (cancel_event is not None and cancel_event.is_set()):
+            manifest.remove_deleted_rows()
+            run_report.rows_removed += manifest.removed_rows
+            failed_row_numbers = [row_number for row_number, _ in row_errors]
+            if verification_report is not None:
+                failed_row_numbers.extend(verification_report.get_mismatched_row_numbers())
+            manifest.save(failed_row_numbers)
+
+        # Report every row that could not be created
+        if row_errors:
+            raise Exception('Failed to create the PDF file of row(s):\n' +
+                            '\n'.join(f'row {row_number}: {error}' for row_number, error in row_errors))
+
+    def create_default_dict(self, template_config=None):
+        """
+        A function that creates the default field value dictionary filled in every EFS pdf
+        :param template_config: The TemplateConfig of the default fields (default None, DEFAULT_TEMPLATE_CONFIG)
+        :return: A dictionary of field name and field value, with the current date and time
+        """
+        if template_config is None:
+            template_config = DEFAULT_TEMPLATE_CONFIG
+
+        return template_config.create_default_dict()
+
+    def iterate_final_value_dicts(self, default_dict: dict, numbered_efs_data_dicts):
+        """
+        A function that merges default field value dictionary with each EFS data dictionary
+        :param default_dict: The default field value dictionary created in fill_pdfs function
+        :param numbered_efs_data_dicts: A list or generator of (row number, EFS data dictionary)
+        :return: A generator of (row number, final value dictionary), one per pdf file
+        """
+        # The default keys are built once, the columns are already checked once per run by validate_efs_data_df
+        default_keys = set(default_dict)
+        for row_number, efs_data_dict in numbered_efs_data_dicts:
+            if not default_keys.isdisjoint(efs_data_dict):
+                raise ValueError(
                     'Default dictionary and initial data column should have different keys to avoid any conflicts')
             # merge default field value dictionary with each dictionary in the efs data list
-            final_value_dict = {**default_dict, **efs_data_list_of_dict[row]}
-            # print(final_value_dict)
-            # create pdf file for each data dictionary and update each pdf file with efs data dictionary
-            fillpdfs.write_fillable_pdf(efs_template_pdf, f'{output_path}/{output_file_name}_{row + 1}.pdf',
-                                        final_value_dict)
-            # (optional) flatten the pdf file to make it uneditable
-            # fillpdfs.flatten_pdf('new.pdf', 'newflat.pdf', as_image=False)
+            yield row_number, {**default_dict, **efs_data_dict}
@@ -0,0 +1,213 @@
+# Import libraries
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+
+class RunReport:
+    """
+    This class is used to record where the time of a FillablePdfWriter run goes: the seconds spent in each stage, the
+    seconds of each row, the rows and bytes written, and optionally a cProfile profile and the tracemalloc peak
+    """
+
+    def __init__(self, profile: bool = False, trace_memory: bool = False, profile_output_file: str = None):
+        """
+        :param profile: Profile the run with cProfile and add the slowest functions to the report (default False)
+        :param trace_memory: Trace the python memory allocations with tracemalloc and add the peak to the report
+        (default False), tracing slows the run down noticeably
+        :param profile_output_file: Also save the cProfile stats to this file, e.g. to open it with snakeviz
+        """
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_output_file = profile_output_file
+
+        # Stage name -> seconds, a stage entered inside another stage is not counted in the outer stage
+        self.stage_seconds = {}
+        self.stage_stack = []
+        self.stage_start_time = None
+
+        # Row counts, bytes written and seconds of each row filled
+        self.rows_done = 0
+        self.rows_skipped = 0
+        self.rows_failed = 0
+        # Rows not filled because validate_efs_data_df found errors in them (validation 'skip')
+        self.rows_invalid = 0
+        # Rows whose PDF file read back by verify_pdfs does not hold the values of the row
+        self.rows_mismatched = 0
+        # PDF files of the previous incremental run removed because their row is no longer in the EFS data
+        self.rows_removed = 0
+        self.bytes_written = 0
+        self.row_seconds = []
+        self.slowest_row = None
+
+        self.status = None
+        self.start_time = None
+        self.total_seconds = None
+        self.profiler = None
+        self.profile_stats = None
+        self.tracing_started = False
+        self.memory_peak_mb = None
+
+    def start(self):
+        """
+        A function that starts the run clock and the optional profiler and memory tracing
+        """
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing_started = True
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start_time = time.perf_counter()
+
+    def stop(self, status: str):
+        """
+        A function that stops the run clock and the optional profiler and memory tracing
+        :param status: 'done', 'cancelled' or 'failed'
+        """
+        self.total_seconds = time.perf_counter() - self.start_time
+        self.status = status
+        if self.profiler is not None:
+            self.profiler.disable()
+            if self.profile_output_file:
+                self.profiler.dump_stats(self.profile_output_file)
+            stats_text = io.StringIO()
+            pstats.Stats(self.profiler, stream=stats_text).sort_stats('cumulative').print_stats(20)
+            self.profile_stats = stats_text.getvalue()
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.memory_peak_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            if self.tracing_started:
+                tracemalloc.stop()
+
+    def enter_stage(self, stage: str):
+        """
+        A function that starts counting the time of a stage, the current stage is paused until exit_stage
+        :param stage: The stage name, e.g. 'read_excel'
+        """
+        now = time.perf_counter()
+        if self.stage_stack:
+            self.add_stage_seconds(self.stage_stack[-1], now - self.stage_start_time)
+        self.stage_stack.append(stage)
+        self.stage_start_time = now
+
+    def exit_stage(self):
+        """
+        A function that stops counting the time of the current stage and resumes the stage it was entered from
+        """
+        now = time.perf_counter()
+        self.add_stage_seconds(self.stage_stack.pop(), now - self.stage_start_time)
+        self.stage_start_time = now
+
+    def add_stage_seconds(self, stage: str, seconds: float):
+        """
+        :param stage: The stage name
+        :param seconds: The seconds to add to the stage
+        """
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        A context manager that counts the time spent in its block in a stage
+        :param stage: The stage name, e.g. 'preprocess'
+        """
+        self.enter_stage(stage)
+        try:
+            yield
+        finally:
+            self.exit_stage()
+
+    def time_iterator(self, stage: str, iterable):
+        """
+        A function that counts the time spent producing each item of a generator in a stage, e.g. the time openpyxl
+        spends reading each chunk of rows
+        :param stage: The stage name
+        :param iterable: A list or generator
+        :return: A generator of the same items
+        """
+        iterator = iter(iterable)
+        while True:
+            self.enter_stage(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.exit_stage()
+            yield item
+
+    def add_row(self, row_number: int, seconds: float, bytes_written: int = 0):
+        """
+        A function that records one filled row
+        :param row_number: The row number starting from 1
+        :param seconds: The seconds spent filling and writing the pdf of the row
+        :param bytes_written: The size of the pdf of the row
+        """
+        self.rows_done += 1
+        self.bytes_written += bytes_written
+        self.row_seconds.append(seconds)
+        if self.slowest_row is None or seconds > self.slowest_row[1]:
+            self.slowest_row = (row_number, seconds)
+
+    def to_dict(self):
+        """
+        :return: A json serializable dictionary of the run report
+        """
+        stage_seconds = {stage: round(seconds, 4) for stage, seconds in self.stage_seconds.items()}
+        run_report = {'status': self.status,
+                      'total_seconds': None if self.total_seconds is None else round(self.total_seconds, 4),
+                      'rows_done': self.rows_done,
+                      'rows_skipped': self.rows_skipped,
+                      'rows_failed': self.rows_failed,
+                      'rows_invalid': self.rows_invalid,
+                      'rows_mismatched': self.rows_mismatched,
+                      'rows_removed': self.rows_removed,
+                      'bytes_written': self.bytes_written,
+                      'rows_per_second': round(self.rows_done / self.total_seconds, 1) if self.total_seconds else None,
+                      'stage_seconds': stage_seconds,
+                      # The time spent outside every stage, e.g. waiting on the progress callback
+                      'other_seconds': None if self.total_seconds is None else
+                      round(max(self.total_seconds - sum(self.stage_seconds.values()), 0.0), 4),
+                      'row_seconds': None,
+                      'memory_peak_mb': self.memory_peak_mb,
+                      'profile_stats': self.profile_stats}
+
+        if self.row_seconds:
+            row_seconds = np.asarray(self.row_seconds)
+            run_report['row_seconds'] = {'mean': round(float(row_seconds.mean()), 5),
+                                         'p50': round(float(np.percentile(row_seconds, 50)), 5),
+                                         'p95': round(float(np.percentile(row_seconds, 95)), 5),
+                                         'max': round(float(row_seconds.max()), 5),
+                                         'slowest_row': self.slowest_row[0]}
+
+        return run_report
+
+    def format_summary(self):
+        """
+        :return: A text summary of the run report, e.g. to print or to show in the GUI
+        """
+        run_report = self.to_dict()
+        lines = [f"Status: {run_report['status']}  |  {run_report['total_seconds']} s  |  "
+                 f"{run_report['rows_per_second']} rows/sec",
+                 f"Rows: {run_report['rows_done']} done, {run_report['rows_skipped']} skipped, "
+                 f"{run_report['rows_failed']} failed, {run_report['rows_invalid']} invalid, "
+                 f"{run_report['rows_mismatched']} mismatched, {run_report['rows_removed']} removed  |  "
+                 f"{run_report['bytes_written'] / (1024 * 1024):.1f} MB written",
+                 'Stages:']
+        for stage, seconds in run_report['stage_seconds'].items():
+            lines.append(f'  {stage:<20} {seconds:>10.4f} s')
+        lines.append(f"  {'other':<20} {run_report['other_seconds'] or 0.0:>10.4f} s")
+        if run_report['row_seconds'] is not None:
+            row_seconds = run_report['row_seconds']
+            lines.append(f"Row seconds: mean {row_seconds['mean']}, p50 {row_seconds['p50']}, "
+                         f"p95 {row_seconds['p95']}, max {row_seconds['max']} (row {row_seconds['slowest_row']})")
+        if run_report['memory_peak_mb'] is not None:
+            lines.append(f"Python memory peak: {run_report['memory_peak_mb']} MB")
+        if run_report['profile_stats']:
+            lines.extend(['', run_report['profile_stats']])
+
+        return '\n'.join(lines)
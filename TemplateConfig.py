@@ -0,0 +1,238 @@
+# Import libraries
+import os
+import json
+import datetime
+import pandas as pd
+from PdfManifest import hash_dict
+
+# The EFS data columns (after preprocessing) -> field names of Trade EFS Template.pdf, most of the field names in the
+# template are 'undefined_n' <= check with fillpdfs.get_form_fields(template_pdf_file), a column can be filled in
+# several fields, e.g. the rounded strike is filled in both price fields ('undefined_4' & 'undefined_14')
+DEFAULT_MAPPER = {'Start Date': 'undefined_12',
+                  'Expiry Date': 'undefined_13',
+                  'Rounded strike': ['undefined_4', 'undefined_14'],
+                  'Total Quantity (lots)': 'undefined_3',
+                  'Shipment Month': 'undefined_2',
+                  'Notional': 'undefined_16',
+                  'Commodity Code': 'Commodity Code  Contract Month'}
+# The default field values filled in every EFS pdf of Trade EFS Template.pdf
+DEFAULT_FIELDS = {'Swaps': 'On',  # always tick
+                  'Member Code': 'S111',
+                  'Customer  Account Number': 'SRITRANG INTL / S72449G',
+                  'undefined': 'Sicom TSR',
+                  'SWAPS': 'On',  # always tick
+                  'Fixed Rate Payer  Floating Rate Receiver': 'SRITRANG',
+                  'Fixed Rate Receiver  Floating Rate Payer': 'BANK'}
+# The default fields filled with the current date and time, '{date}' is replaced by the date (e.g. '01/02/2021') and
+# '{time}' by the time (e.g. '09.30 AM') of the run
+DEFAULT_CURRENT_DATE_FIELDS = {'Date': '{date}',
+                               'Date  Time of EFP  EFS transaction': '{date} at {time}'}
+# The keys of a template config file
+TEMPLATE_CONFIG_KEYS = ('mapper', 'default_fields', 'current_date_fields')
+
+# (config file, modification time) -> TemplateConfig, the config files already read by this process
+template_configs = {}
+
+
+class TemplateConfig:
+    """
+    This class is used to keep the field mapping of one EFS template: the EFS data column filled in each field of the
+    template and the default fields filled in every pdf, read from a json config file next to the template (e.g.
+    'Trade EFS Template.json' for 'Trade EFS Template.pdf') so that another template or counterparty needs no code
+    change
+    """
+
+    def __init__(self, mapper: dict = None, default_fields: dict = None, current_date_fields: dict = None):
+        """
+        :param mapper: The EFS data column -> field name, or list of field names, of the template (default
+        DEFAULT_MAPPER), the columns that are not in the mapper are filled in the field of the same name
+        :param default_fields: The field name -> value filled in every pdf (default DEFAULT_FIELDS)
+        :param current_date_fields: The field name -> value with '{date}' and '{time}' filled with the current date and
+        time in every pdf (default DEFAULT_CURRENT_DATE_FIELDS)
+        """
+        self.mapper = DEFAULT_MAPPER if mapper is None else mapper
+        self.default_fields = DEFAULT_FIELDS if default_fields is None else default_fields
+        self.current_date_fields = DEFAULT_CURRENT_DATE_FIELDS if current_date_fields is None else current_date_fields
+        # The fields that change on every run, they are not hashed in incremental mode (see PdfManifest)
+        self.volatile_fields = tuple(self.current_date_fields)
+
+        # Precompile the mapper into the renamed columns and the columns copied into more fields
+        self.rename_mapper = {}
+        self.copied_fields = []
+        for column, field_names in self.mapper.items():
+            field_names = [field_names] if isinstance(field_names, str) else list(field_names)
+            self.rename_mapper[column] = field_names[0]
+            self.copied_fields.extend((field_names[0], field_name) for field_name in field_names[1:])
+
+        # Hash of the mapping, the preprocessed EFS data cached for one mapping is not reused for another
+        self.config_hash = hash_dict({'mapper': self.mapper, 'default_fields': self.default_fields,
+                                      'current_date_fields': self.current_date_fields})
+
+    def map_fields(self, efs_data_df: pd.DataFrame):
+        """
+        A function that renames the columns of EFS data according to the field names of the template
+        :param efs_data_df: The dataframe of EFS data after the preprocessing of the columns
+        :return: A dataframe whose columns are the field names of the template
+        """
+        # Rename some columns in dataframe according to the mapper
+        efs_data_df = efs_data_df.rename(mapper=self.rename_mapper, axis='columns')
+
+        # Copy the columns filled in more than one field, e.g. the rounded strike in 'undefined_14'
+        for field_name, copied_field_name in self.copied_fields:
+            efs_data_df[copied_field_name] = efs_data_df[field_name]
+
+        return efs_data_df
+
+    def create_default_dict(self, current_date: datetime.datetime = None):
+        """
+        A function that creates the default field value dictionary filled in every EFS pdf
+        :param current_date: The date and time filled in current_date_fields (default None, now)
+        :return: A dictionary of field name and field value
+        """
+        current_date = datetime.datetime.now() if current_date is None else current_date
+        current_date_str = current_date.strftime('%d/%m/%Y')
+        current_time_str = current_date.strftime('%I.%M %p')
+
+        default_dict = {field_name: value.format(date=current_date_str, time=current_time_str)
+                        for field_name, value in self.current_date_fields.items()}
+        default_dict.update(self.default_fields)
+
+        return default_dict
+
+
+# The field mapping of Trade EFS Template.pdf, used for the templates without a config file
+DEFAULT_TEMPLATE_CONFIG = TemplateConfig()
+
+
+def get_template_config_file(efs_template_pdf: str):
+    """
+    :param efs_template_pdf: The pdf file name of EFS template, e.g. 'Trade EFS Template.pdf'
+    :return: The config file name of the template, e.g. 'Trade EFS Template.json'
+    """
+    return f'{os.path.splitext(efs_template_pdf)[0]}.json'
+
+
+def merge_config_values(default_values: dict, config_values: dict):
+    """
+    A function that merges the mapping or fields of a config file over the ones of DEFAULT_TEMPLATE_CONFIG
+    :param default_values: The default mapper, default fields or current date fields
+    :param config_values: The same key of the config file, a null value removes the default column or field
+    :return: The merged dictionary
+    """
+    merged_values = {**default_values, **config_values}
+
+    return {key: value for key, value in merged_values.items() if value is not None}
+
+
+def load_template_config(efs_template_pdf: str):
+    """
+    A function that reads the config file next to the EFS template, e.g.
+    {"mapper": {"Start Date": "undefined_12", "Rounded strike": ["undefined_4", "undefined_14"]},
+     "default_fields": {"Member Code": "S222", "undefined": null}, "current_date_fields": {"Date": "{date}"}}
+    the columns and fields of the config file are merged over the ones of DEFAULT_TEMPLATE_CONFIG, so a config file
+    only lists what differs from Trade EFS Template.pdf, and a null value removes a default column or field the
+    template does not have
+    :param efs_template_pdf: The pdf file name of EFS template (end with .pdf)
+    :return: The TemplateConfig of the template, DEFAULT_TEMPLATE_CONFIG if the template has no config file
+    """
+    config_file = get_template_config_file(efs_template_pdf)
+    try:
+        config_mtime_ns = os.stat(config_file).st_mtime_ns
+    except OSError:
+        return DEFAULT_TEMPLATE_CONFIG
+
+    # Read each config file only once unless it changes
+    template_config = template_configs.get((os.path.abspath(config_file), config_mtime_ns))
+    if template_config is not None:
+        return template_config
+
+    with open(config_file, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    if not isinstance(config, dict) or set(config) - set(TEMPLATE_CONFIG_KEYS) or \
+            not all(isinstance(values, dict) for values in config.values()):
+        raise ValueError(f'Template config file {config_file!r} should be a json object with the keys '
+                         f'{TEMPLATE_CONFIG_KEYS}, each one a json object')
+    template_config = TemplateConfig(**{key: merge_config_values(getattr(DEFAULT_TEMPLATE_CONFIG, key), values)
+                                        for key, values in config.items()})
+    template_configs[(os.path.abspath(config_file), config_mtime_ns)] = template_config
+
+    return template_config
+
+
+class TemplateRouting:
+    """
+    This class is used to fill several EFS templates in one run, the template of each row is picked by the value of
+    one column of EFS data (e.g. the exchange or the product)
+    """
+
+    def __init__(self, route_column: str, templates: dict, default_template: str = None):
+        """
+        :param route_column: The EFS data column whose value picks the template, e.g. 'Exchange'
+        :param templates: The column value (as text) -> pdf file name of EFS template, e.g.
+        {'SICOM': 'Trade EFS Template.pdf'}
+        :param default_template: The pdf file name of EFS template of the other values (default None, the rows with
+        another value are refused)
+        """
+        self.route_column = route_column
+        self.templates = templates
+        self.default_template = default_template
+
+    def route(self, efs_data_df: pd.DataFrame, validation_report=None):
+        """
+        A function that picks the template of every row at once, before any pdf is written
+        :param efs_data_df: The dataframe of EFS data before preprocessing, its index is the row number - 1
+        :param validation_report: A ValidationReport the rows without a template are added to (default None, a
+        ValueError is raised if a row has no template)
+        :return: A pandas Series of the pdf file name of EFS template of each row (NaN if the row has no template)
+        """
+        if self.route_column not in efs_data_df.columns:
+            raise ValueError(f'EFS data has no column {self.route_column!r} to pick the template of each row')
+
+        # The values are compared as text, the keys of the json routing file are always text
+        template_files = efs_data_df[self.route_column].astype(str).map(self.templates)
+        if self.default_template is not None:
+            return template_files.fillna(self.default_template)
+
+        unrouted_values = efs_data_df.loc[template_files.isna(), self.route_column]
+        if validation_report is not None:
+            validation_report.add_rows(unrouted_values.index + 1, self.route_column, unrouted_values,
+                                       'has no EFS template in the template routing file')
+        elif len(unrouted_values):
+            raise ValueError(f'No EFS template for {self.route_column!r} value(s) '
+                             f'{sorted(map(str, unrouted_values.unique()))} (rows '
+                             f'{", ".join(str(index + 1) for index in unrouted_values.index[:10])})')
+
+        return template_files
+
+
+def is_template_routing_file(efs_template_pdf):
+    """
+    :param efs_template_pdf: The pdf file name of EFS template, a template routing file or a CompiledPdfTemplate
+    :return: True if it is the file name of a template routing file (end with .json)
+    """
+    return isinstance(efs_template_pdf, str) and efs_template_pdf.lower().endswith('.json')
+
+
+def load_template_routing(routing_file: str):
+    """
+    A function that reads a template routing file, e.g.
+    {"route_column": "Exchange", "templates": {"SICOM": "Trade EFS Template.pdf", "SGX": "SGX EFS Template.pdf"},
+     "default_template": "Trade EFS Template.pdf"}
+    the template file names are relative to the directory of the routing file
+    :param routing_file: The json file name of the template routing
+    :return: The TemplateRouting
+    """
+    with open(routing_file, 'r', encoding='utf-8') as file:
+        routing = json.load(file)
+    if not isinstance(routing, dict) or not isinstance(routing.get('route_column'), str) or \
+            not isinstance(routing.get('templates'), dict):
+        raise ValueError(f'Template routing file {routing_file!r} should be a json object with a "route_column" and '
+                         f'"templates"')
+
+    routing_path = os.path.dirname(os.path.abspath(routing_file))
+    default_template = routing.get('default_template')
+
+    return TemplateRouting(routing['route_column'],
+                           {value: os.path.join(routing_path, template_file)
+                            for value, template_file in routing['templates'].items()},
+                           None if default_template is None else os.path.join(routing_path, default_template))
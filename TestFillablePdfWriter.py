@@ -1,10 +1,34 @@
+import io
+import json
+import queue
+import shutil
+import asyncio
 import unittest
+import zipfile
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import pdfrw
 import pandas as pd
-from PDFWriter import FillablePdfWriter
+from PdfWriter import FillablePdfWriter
 from fillpdf import fillpdfs
+from PdfTemplate import CompiledPdfTemplate, ByteStampedPdfTemplate, load_compiled_template, get_field_name, \
+    get_template_fields
+from PdfOutputWriter import MergedPdfWriter
+from RunReport import RunReport
+from BenchmarkPdfWriter import measure_import_time, benchmark_pdf_writer
+from PDFWriterCLI import WatchFolder, main
+from PDFWriterGUI import PdfWriterRun
+from PdfFillService import PdfFillService, fill_efs_trades_chunk
+from TemplateConfig import DEFAULT_TEMPLATE_CONFIG, load_template_config
+from EfsDataValidator import EfsDataValidationError
+from EfsDataCache import EfsDataCache, pyarrow
+from PdfVerifier import verify_pdfs, read_pdf_field_values, PdfVerificationError
+from LoadTestPdfFillService import send_request
 import os
 import fnmatch
 import datetime
+import tempfile
+import tracemalloc
 
 
 class TestPdfEfs(unittest.TestCase):
@@ -102,3 +126,723 @@ class TestPdfEfs(unittest.TestCase):
         for field_name in input_dictionary.keys():
             self.assertEqual(pdf_field_name[field_name], input_dictionary[field_name])
 
+    def test_compiled_template_matches_fillpdfs(self):
+        """
+        Check if the compiled template creates exactly the same pdf as fillpdfs.write_fillable_pdf for every row
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        efs_data_df = fillable_pdf_writer.create_df_from_import_efs_excel(path, unit_test_efs_data_excel_file)
+        efs_data_list = fillable_pdf_writer.create_efs_data_list_of_dict_from_df(efs_data_df)
+
+        # Fill the same compiled template with every row, values of the previous row must not leak into the next one
+        compiled_template = CompiledPdfTemplate(efs_template_pdf)
+        with tempfile.TemporaryDirectory() as output_path:
+            for row, efs_data_dict in enumerate(efs_data_list):
+                expected_pdf_file = os.path.join(output_path, f'compiled_test_expected_{row + 1}.pdf')
+                output_pdf_file = os.path.join(output_path, f'compiled_test_{row + 1}.pdf')
+                fillpdfs.write_fillable_pdf(efs_template_pdf, expected_pdf_file, efs_data_dict)
+                compiled_template.fill(efs_data_dict, output_pdf_file)
+
+                with open(expected_pdf_file, 'rb') as expected_file, open(output_pdf_file, 'rb') as output_file:
+                    self.assertEqual(expected_file.read(), output_file.read())
+
+    def test_incremental_run_skips_unchanged_rows(self):
+        """
+        Run the unit test excel file twice in incremental mode, the second run must not recreate any pdf file, then
+        change a row and delete a row, only the pdf file of the changed row is recreated and the pdf file of the
+        deleted row is removed
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        output_file_name = 'incremental_test'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        efs_data_df = pd.read_excel(unit_test_efs_data_excel_file)
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as output_path:
+            output_pdf_files = [os.path.join(output_path, f'{output_file_name}_{row + 1}.pdf') for row in range(2)]
+            fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file, efs_template_pdf,
+                                                        output_path, output_file_name, incremental=True)
+            first_run_mtime = os.path.getmtime(output_pdf_files[0])
+
+            # Run again with the same excel file, the pdf file must not be written again
+            run_report = fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                                     efs_template_pdf, output_path, output_file_name,
+                                                                     incremental=True)
+            self.assertEqual(first_run_mtime, os.path.getmtime(output_pdf_files[0]))
+            self.assertEqual((0, 2), (run_report.rows_done, run_report.rows_skipped))
+
+            # Change the quantity of the second row, only its pdf file is written again
+            efs_data_df.loc[1, 'Total Quantity (lots)'] = 60
+            efs_data_df.to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+            run_report = fillable_pdf_writer.run_fillable_pdf_writer(output_path, 'trades.csv', efs_template_pdf,
+                                                                     output_path, output_file_name, incremental=True)
+            self.assertEqual((1, 1), (run_report.rows_done, run_report.rows_skipped))
+            self.assertEqual(first_run_mtime, os.path.getmtime(output_pdf_files[0]))
+            self.assertEqual('60', fillpdfs.get_form_fields(output_pdf_files[1])['undefined_3'])
+
+            # Delete the second row, its pdf file is removed
+            efs_data_df.head(1).to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+            run_report = fillable_pdf_writer.run_fillable_pdf_writer(output_path, 'trades.csv', efs_template_pdf,
+                                                                     output_path, output_file_name, incremental=True)
+            self.assertEqual((0, 1, 1), (run_report.rows_done, run_report.rows_skipped, run_report.rows_removed))
+            self.assertTrue(os.path.exists(output_pdf_files[0]))
+            self.assertFalse(os.path.exists(output_pdf_files[1]))
+
+    def test_merged_and_zip_output_modes(self):
+        """
+        Check if the merged pdf has one page and one bookmark per row and the zip archive has one pdf file per row
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        output_file_name = 'output_mode_test'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        efs_data_df_count = len(pd.read_excel(unit_test_efs_data_excel_file))
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as output_path:
+            fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file, efs_template_pdf,
+                                                        output_path, output_file_name, output_mode='merged')
+            fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file, efs_template_pdf,
+                                                        output_path, output_file_name, output_mode='zip')
+
+            merged_pdf = pdfrw.PdfReader(os.path.join(output_path, f'{output_file_name}.pdf'))
+            self.assertEqual(efs_data_df_count, len(merged_pdf.pages))
+            self.assertEqual(efs_data_df_count, int(merged_pdf.Root.Outlines.Count))
+
+            with zipfile.ZipFile(os.path.join(output_path, f'{output_file_name}.zip')) as zip_file:
+                self.assertEqual([f'{output_file_name}_{row + 1}.pdf' for row in range(efs_data_df_count)],
+                                 zip_file.namelist())
+
+    def test_merged_pdf_with_kid_widget_fields(self):
+        """
+        Check if every row of the merged pdf keeps its own value of a field whose widget is the kid of a parent field
+        """
+        # A template with the text field 'parent.child', whose widget is the kid of the field 'parent', and the top
+        # level text field 'top'
+        parent_field = pdfrw.IndirectPdfDict(T=pdfrw.PdfString.encode('parent'), Kids=pdfrw.PdfArray())
+        kid_widget = pdfrw.IndirectPdfDict(Type=pdfrw.PdfName.Annot, Subtype=pdfrw.PdfName.Widget,
+                                           FT=pdfrw.PdfName.Tx, T=pdfrw.PdfString.encode('child'),
+                                           Parent=parent_field, Rect=[0, 0, 100, 20])
+        parent_field.Kids.append(kid_widget)
+        top_widget = pdfrw.IndirectPdfDict(Type=pdfrw.PdfName.Annot, Subtype=pdfrw.PdfName.Widget,
+                                           FT=pdfrw.PdfName.Tx, T=pdfrw.PdfString.encode('top'), Rect=[0, 30, 100, 50])
+        template_writer = pdfrw.PdfWriter()
+        template_writer.addpage(pdfrw.IndirectPdfDict(Type=pdfrw.PdfName.Page, MediaBox=[0, 0, 200, 200],
+                                                      Resources=pdfrw.PdfDict(), Annots=[kid_widget, top_widget]))
+        template_writer.trailer.Root.AcroForm = pdfrw.PdfDict(Fields=[parent_field, top_widget])
+
+        with tempfile.TemporaryDirectory() as output_path:
+            efs_template_pdf = os.path.join(output_path, 'kid_widget_template.pdf')
+            template_writer.write(efs_template_pdf)
+            merged_pdf_file = os.path.join(output_path, 'merged.pdf')
+            merged_pdf_writer = MergedPdfWriter(merged_pdf_file)
+            compiled_template = ByteStampedPdfTemplate(efs_template_pdf)
+            merged_pdf_writer.add(compiled_template, 'row_1.pdf', {'parent.child': 'A', 'top': 'X'})
+            merged_pdf_writer.add(compiled_template, 'row_2.pdf', {'parent.child': 'B', 'top': 'Y'})
+            merged_pdf_writer.close()
+
+            merged_pdf = pdfrw.PdfReader(merged_pdf_file)
+            self.assertEqual({'row_1.parent.child': 'A', 'row_1.top': 'X', 'row_2.parent.child': 'B',
+                              'row_2.top': 'Y'},
+                             {get_field_name(annotation): annotation.V.to_unicode()
+                              for page in merged_pdf.pages for annotation in page.Annots})
+
+    def test_run_with_efs_data_already_read(self):
+        """
+        Check if the rows already read in chunks (as by the GUI preview) create the same pdf as reading the excel file
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        efs_data_dfs = list(fillable_pdf_writer.read_efs_excel_in_chunks(path, unit_test_efs_data_excel_file,
+                                                                         first_chunk_size=1))
+        self.assertEqual(1, len(efs_data_dfs[0]))
+
+        with tempfile.TemporaryDirectory() as output_path:
+            fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file, efs_template_pdf,
+                                                        output_path, 'read_excel_test')
+            fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file, efs_template_pdf,
+                                                        output_path, 'already_read_test', efs_data_dfs=efs_data_dfs)
+
+            self.assertEqual(fillpdfs.get_form_fields(os.path.join(output_path, 'read_excel_test_1.pdf')),
+                             fillpdfs.get_form_fields(os.path.join(output_path, 'already_read_test_1.pdf')))
+
+    def test_read_efs_data_csv_file(self):
+        """
+        Check if EFS data saved as csv file creates the same EFS data dictionaries as the excel file
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        unit_test_efs_data_csv_file = 'data_source_for_unit_test_csv_file.csv'
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        excel_dicts = list(fillable_pdf_writer.iterate_efs_data_dicts_from_excel(path, unit_test_efs_data_excel_file))
+        with tempfile.TemporaryDirectory() as csv_path:
+            pd.read_excel(unit_test_efs_data_excel_file).to_csv(os.path.join(csv_path, unit_test_efs_data_csv_file),
+                                                                index=False)
+            csv_dicts = list(fillable_pdf_writer.iterate_efs_data_dicts_from_excel(csv_path,
+                                                                                   unit_test_efs_data_csv_file))
+
+        self.assertEqual(len(excel_dicts), len(csv_dicts))
+        for excel_dict, csv_dict in zip(excel_dicts, csv_dicts):
+            self.assertEqual(fillpdfs.convert_dict_values_to_string(excel_dict),
+                             fillpdfs.convert_dict_values_to_string(csv_dict))
+
+    @unittest.skipIf(pyarrow is None, 'the EFS data is only cached as parquet, which needs pyarrow')
+    def test_efs_data_cache(self):
+        """
+        Check if the second run of the same excel file reads the preprocessed EFS data from the cache
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as output_path:
+            first_run_report = fillable_pdf_writer.run_fillable_pdf_writer(
+                path, unit_test_efs_data_excel_file, efs_template_pdf, output_path, 'cache_first_run_test',
+                cache_dir=cache_dir)
+            second_run_report = fillable_pdf_writer.run_fillable_pdf_writer(
+                path, unit_test_efs_data_excel_file, efs_template_pdf, output_path, 'cache_second_run_test',
+                cache_dir=cache_dir)
+
+            self.assertEqual(fillpdfs.get_form_fields(os.path.join(output_path, 'cache_first_run_test_1.pdf')),
+                             fillpdfs.get_form_fields(os.path.join(output_path, 'cache_second_run_test_1.pdf')))
+
+        self.assertIn('read_excel', first_run_report.stage_seconds)
+        self.assertNotIn('read_excel', second_run_report.stage_seconds)
+        self.assertNotIn('preprocess', second_run_report.stage_seconds)
+        self.assertEqual(first_run_report.rows_done, second_run_report.rows_done)
+
+    @unittest.skipIf(pyarrow is None, 'the EFS data is only cached as parquet, which needs pyarrow')
+    def test_efs_data_cache_checks_template_fields(self):
+        """
+        Check if the cached errors of EFS data file are not used for a template with other fields
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        template_fields = get_template_fields('Trade EFS Template.pdf')
+
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            bad_row_numbers, efs_data_dfs = fillable_pdf_writer.iterate_valid_efs_data_dfs(
+                path, unit_test_efs_data_excel_file, DEFAULT_TEMPLATE_CONFIG, template_fields, cache_dir=cache_dir)
+            self.assertEqual([], bad_row_numbers)
+            list(efs_data_dfs)
+
+            with self.assertRaises(EfsDataValidationError):
+                fillable_pdf_writer.iterate_valid_efs_data_dfs(
+                    path, unit_test_efs_data_excel_file, DEFAULT_TEMPLATE_CONFIG,
+                    [field_name for field_name in template_fields if field_name != 'undefined_16'], cache_dir=cache_dir)
+
+    @unittest.skipIf(pyarrow is None, 'the EFS data is only cached as parquet, which needs pyarrow')
+    def test_efs_data_cache_writes_chunks(self):
+        """
+        Check if the dataframes passed on are cached chunk by chunk once they are all read, and not if the reader stops
+        early
+        """
+        # Initalize variables
+        efs_data_df = pd.read_excel('data_source_for_unit_test_excel_file.xlsx')
+        efs_data_dfs = [efs_data_df.iloc[[0]].reset_index(drop=True), efs_data_df.iloc[[1]].reset_index(drop=True)]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            efs_data_cache = EfsDataCache(cache_dir)
+            efs_data_file = os.path.abspath('data_source_for_unit_test_excel_file.xlsx')
+            next(efs_data_cache.cache_dfs(efs_data_file, 'raw', iter(efs_data_dfs)))
+            self.assertIsNone(efs_data_cache.load(efs_data_file, 'raw'))
+            self.assertEqual([], fnmatch.filter(os.listdir(cache_dir), '*.parquet*'))
+
+            self.assertEqual(2, len(list(efs_data_cache.cache_dfs(efs_data_file, 'raw', iter(efs_data_dfs)))))
+            pd.testing.assert_frame_equal(efs_data_df, efs_data_cache.load(efs_data_file, 'raw'))
+            cached_efs_data_dfs = list(efs_data_cache.load_in_chunks(efs_data_file, 'raw', chunk_size=1))
+            self.assertEqual(2, len(cached_efs_data_dfs))
+            pd.testing.assert_frame_equal(efs_data_dfs[1], cached_efs_data_dfs[1])
+
+    def test_efs_data_cache_directory(self):
+        """
+        Check if the EFS data cache is not used without pyarrow or in a directory other users can write, and if the
+        oldest and least recently used cache entries are deleted
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_dir = os.path.join(temp_dir, 'cache')
+            with mock.patch('EfsDataCache.pyarrow', None):
+                self.assertFalse(EfsDataCache(cache_dir).is_usable())
+            with mock.patch('EfsDataCache.pyarrow', object()):
+                self.assertTrue(EfsDataCache(cache_dir).is_usable())
+                self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+                os.chmod(cache_dir, 0o777)
+                self.assertFalse(EfsDataCache(cache_dir).is_usable())
+            os.chmod(cache_dir, 0o700)
+
+            # Three cache entries of 100 bytes used 1 hour, 2 hours and 2 days ago
+            now = datetime.datetime.now().timestamp()
+            for entry_name, hours_ago in (('recent', 1), ('older', 2), ('expired', 48)):
+                for file_name in (f'{entry_name}.json', f'{entry_name}_raw.parquet'):
+                    with open(os.path.join(cache_dir, file_name), 'wb') as file:
+                        file.write(b'0' * 50)
+                    os.utime(os.path.join(cache_dir, file_name), (now - hours_ago * 3600, now - hours_ago * 3600))
+            EfsDataCache(cache_dir, max_bytes=150, max_age_seconds=24 * 3600).evict()
+            self.assertEqual(sorted(os.listdir(cache_dir)), ['recent.json', 'recent_raw.parquet'])
+
+    def test_run_report(self):
+        """
+        Check if the run report counts every row and records the time of each stage
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        output_file_name = 'run_report_test'
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        efs_data_df_count = len(pd.read_excel(unit_test_efs_data_excel_file))
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as output_path:
+            run_report = fillable_pdf_writer.run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                                     efs_template_pdf, output_path, output_file_name)
+            output_pdf_size = sum(os.path.getsize(os.path.join(output_path, f'{output_file_name}_{row + 1}.pdf'))
+                                  for row in range(efs_data_df_count))
+        run_report_dict = run_report.to_dict()
+
+        self.assertEqual('done', run_report_dict['status'])
+        self.assertEqual(efs_data_df_count, run_report_dict['rows_done'])
+        self.assertEqual(output_pdf_size, run_report_dict['bytes_written'])
+        for stage in ('read_excel', 'preprocess', 'build_dicts', 'fill_pdfs', 'write_output'):
+            self.assertIn(stage, run_report_dict['stage_seconds'])
+
+    def test_parallel_workers(self):
+        """
+        Fill the rows in 2 worker processes, every row is still written to its own row numbered pdf file and a row
+        that cannot be created is reported without counting it as done
+        """
+        # Initalize variables
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        output_file_name = 'parallel_test'
+        efs_data_df = pd.read_excel('data_source_for_unit_test_excel_file.xlsx')
+        efs_data_df = pd.concat([efs_data_df, efs_data_df], ignore_index=True)
+        run_report = RunReport()
+        progress = []
+
+        # Call class - FillablePdfWriter
+        fillable_pdf_writer = FillablePdfWriter()
+        with tempfile.TemporaryDirectory() as output_path:
+            efs_data_df.to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+            # The pdf file of row 3 cannot be written because a directory has its name
+            os.mkdir(os.path.join(output_path, f'{output_file_name}_3.pdf'))
+            with self.assertRaisesRegex(Exception, 'row 3: IsADirectoryError'):
+                fillable_pdf_writer.run_fillable_pdf_writer(output_path, 'trades.csv', efs_template_pdf, output_path,
+                                                            output_file_name, workers=2,
+                                                            progress_callback=progress.append, run_report=run_report)
+
+            output_pdf_files = {row_number: os.path.join(output_path, f'{output_file_name}_{row_number}.pdf')
+                                for row_number in range(1, len(efs_data_df) + 1)}
+            self.assertEqual([1, 2, 4], [row_number for row_number, output_pdf_file in output_pdf_files.items()
+                                         if os.path.isfile(output_pdf_file)])
+            # Row n is filled with the notional of the n-th row whichever worker created it
+            for row_number in (1, 2, 4):
+                self.assertEqual(f"{efs_data_df['Notional'][row_number - 1]:,}",
+                                 fillpdfs.get_form_fields(output_pdf_files[row_number])['undefined_16'])
+
+        self.assertEqual('failed', run_report.status)
+        self.assertEqual((3, 1), (run_report.rows_done, run_report.rows_failed))
+        self.assertEqual(run_report.rows_done, progress[-1])
+
+    def test_gui_startup_imports(self):
+        """
+        Check if importing the GUI module does not import pandas, fillpdf or FillablePdfWriter before the window shows
+        """
+        # Measure the import of PDFWriterGUI in a new python process with -X importtime
+        import_time = measure_import_time('PDFWriterGUI')
+
+        self.assertEqual([], import_time['lazy_modules_imported'])
+
+    def test_gui_run_cancelled_mid_run(self):
+        """
+        Cancel the background run of the GUI once its first pdf file is created, the run stops after that file and
+        reports its progress and cancellation through the queue
+        """
+        # Initalize variables
+        efs_data_df = pd.read_excel('data_source_for_unit_test_excel_file.xlsx')
+        efs_data_df = pd.concat([efs_data_df] * 5, ignore_index=True)
+
+        # The user presses cancel as soon as the first row is done
+        class CancellingQueue(queue.Queue):
+            def put(self, item, *args, **kwargs):
+                super().put(item, *args, **kwargs)
+                if item[0] == 'progress':
+                    pdf_writer_run.cancel()
+
+        with tempfile.TemporaryDirectory() as output_path:
+            efs_data_df.to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+            # The rows already read by the preview are passed as efs_data_dfs, as by the GUI
+            pdf_writer_run = PdfWriterRun(output_path, 'trades.csv', 'Trade EFS Template.pdf', output_path,
+                                          'gui_test', {'efs_data_dfs': [efs_data_df]}, CancellingQueue())
+            pdf_writer_run.start()
+            pdf_writer_run.thread.join(timeout=60)
+            self.assertFalse(pdf_writer_run.is_alive())
+
+            self.assertEqual((len(efs_data_df), 1, ('cancelled', None)), pdf_writer_run.read_messages())
+            self.assertEqual(['gui_test_1.pdf'], fnmatch.filter(os.listdir(output_path), 'gui_test_*.pdf'))
+            # Every message was read
+            self.assertEqual((None, None, None), pdf_writer_run.read_messages())
+
+    def test_benchmark_scales_fill_rows(self):
+        """
+        Check if the benchmark only fills the first rows, scales their time to every row and reports the python memory
+        peak of each stage
+        """
+        benchmark_result = benchmark_pdf_writer(20, max_fill_rows=5, trace_memory=True)
+
+        self.assertEqual(5, benchmark_result['fill_rows'])
+        self.assertEqual(5, benchmark_result['stages']['fill_pdfs']['rows'])
+        self.assertEqual(20, benchmark_result['stages']['read_excel']['rows'])
+        self.assertTrue(all(stage_report['memory_peak_mb'] is not None
+                            for stage_report in benchmark_result['stages'].values()))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_watch_folder_debounce(self):
+        """
+        Check if a new or modified EFS data file is only ready once it did not change for the debounce seconds
+        """
+        with tempfile.TemporaryDirectory() as input_path:
+            watch_folder = WatchFolder(input_path, debounce_seconds=2.0)
+            efs_data_csv_file = os.path.join(input_path, 'trades.csv')
+            pd.read_excel('data_source_for_unit_test_excel_file.xlsx').to_csv(efs_data_csv_file, index=False)
+
+            self.assertEqual([], watch_folder.find_ready_files(now=0.0))
+            self.assertEqual([], watch_folder.find_ready_files(now=1.0))
+            self.assertEqual(['trades.csv'], watch_folder.find_ready_files(now=2.0))
+            self.assertEqual([], watch_folder.find_ready_files(now=10.0))
+
+            # A modified file is ready again once it stops changing
+            with open(efs_data_csv_file, 'a', encoding='utf-8') as file:
+                file.write('\n')
+            self.assertEqual([], watch_folder.find_ready_files(now=11.0))
+            self.assertEqual(['trades.csv'], watch_folder.find_ready_files(now=13.0))
+
+    def test_command_line_run(self):
+        """
+        Check if the command line creates one pdf per row of EFS data excel file and writes the run report
+        """
+        # Initalize variables
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        efs_data_df_count = len(pd.read_excel(unit_test_efs_data_excel_file))
+
+        with tempfile.TemporaryDirectory() as output_path:
+            exit_code = main(['run', unit_test_efs_data_excel_file, '--template', 'Trade EFS Template.pdf',
+                              '--output-path', output_path, '--output-name', 'cli_test',
+                              '--report', os.path.join(output_path, 'report.json')])
+
+            self.assertEqual(0, exit_code)
+            self.assertEqual(efs_data_df_count, len(fnmatch.filter(os.listdir(output_path), 'cli_test_*.pdf')))
+            self.assertTrue(os.path.exists(os.path.join(output_path, 'report.json')))
+
+    def test_byte_stamped_template_matches_compiled_template(self):
+        """
+        Check if the pdf written as template bytes plus an update has the same field values as the compiled template
+        """
+        # Initalize variables
+        efs_template_pdf = 'Trade EFS Template.pdf'
+        data_dict = {'undefined_12': '01/02/2021', 'undefined_3': 42, 'undefined_2': 'JAN (1) \\ é',
+                     'Seller': 'On', 'Buyer': 'Off', 'Swaps': 'On'}
+
+        byte_stamped_template = ByteStampedPdfTemplate(efs_template_pdf)
+        self.assertIsNotNone(byte_stamped_template.base_pdf)
+        with tempfile.TemporaryDirectory() as output_path:
+            byte_stamped_pdf_file = os.path.join(output_path, 'byte_stamped_test.pdf')
+            compiled_pdf_file = os.path.join(output_path, 'compiled_template_test.pdf')
+            byte_stamped_template.fill(data_dict, byte_stamped_pdf_file)
+            CompiledPdfTemplate(efs_template_pdf).fill(data_dict, compiled_pdf_file)
+
+            self.assertEqual(fillpdfs.get_form_fields(compiled_pdf_file),
+                             fillpdfs.get_form_fields(byte_stamped_pdf_file))
+
+    def test_compiled_templates_are_bounded(self):
+        """
+        Check if a template compiled again after its file changed replaces the template compiled before, and if only
+        the most recently used templates are kept
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            efs_template_pdf = os.path.join(temp_dir, 'template.pdf')
+            shutil.copyfile('Trade EFS Template.pdf', efs_template_pdf)
+            with mock.patch('PdfTemplate.compiled_templates', {}) as compiled_templates, \
+                    mock.patch('PdfTemplate.MAX_COMPILED_TEMPLATES', 2):
+                first_template = load_compiled_template(efs_template_pdf)
+                self.assertIs(load_compiled_template(efs_template_pdf), first_template)
+                os.utime(efs_template_pdf, ns=(0, os.stat(efs_template_pdf).st_mtime_ns + 1))
+                self.assertIsNot(load_compiled_template(efs_template_pdf), first_template)
+                self.assertEqual(len(compiled_templates), 1)
+
+                flattened_template = load_compiled_template(efs_template_pdf, flatten=True)
+                load_compiled_template(efs_template_pdf)
+                load_compiled_template('Trade EFS Template.pdf')
+                self.assertEqual(len(compiled_templates), 2)
+                self.assertNotIn(flattened_template, compiled_templates.values())
+
+    def test_flattened_pdf_has_no_form_fields(self):
+        """
+        Check if the flattened pdf has no form fields left and draws the field values in its page content
+        """
+        # Initalize variables
+        data_dict = {'undefined_12': '01/02/2021', 'undefined_2': 'JAN (1) \\ é', 'Seller': 'On', 'Buyer': 'Off'}
+
+        with tempfile.TemporaryDirectory() as output_path:
+            flattened_pdf_file = os.path.join(output_path, 'flattened_test.pdf')
+            ByteStampedPdfTemplate('Trade EFS Template.pdf', flatten=True).fill(data_dict, flattened_pdf_file)
+
+            self.assertEqual(fillpdfs.get_form_fields(flattened_pdf_file), {})
+            flattened_page = pdfrw.PdfReader(flattened_pdf_file).pages[0]
+        self.assertFalse(flattened_page.Annots)
+        page_content = flattened_page.Contents[-1].stream
+        self.assertIn('(01/02/2021) Tj', page_content)
+        self.assertIn('(JAN \\(1\\) \\\\ é) Tj', page_content)
+        # Only the checked checkbox appearance is drawn
+        self.assertEqual(page_content.count(' Do Q'), 1)
+
+    def test_fill_service(self):
+        """
+        Check if the service returns the pdf of a trade and refuses a wrong trade without failing the other trades of
+        the same chunk
+        """
+        # Initalize variables
+        efs_trades = json.loads(pd.read_excel('data_source_for_unit_test_excel_file.xlsx').head(2).to_json(
+            orient='records', date_format='iso'))
+        wrong_efs_trade = dict(efs_trades[1])
+        del wrong_efs_trade['Shipment']
+
+        async def send_trades():
+            pdf_fill_service = PdfFillService('Trade EFS Template.pdf', workers=1, batch_wait_seconds=0.05)
+            server = await pdf_fill_service.start(port=0)
+            try:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                second_reader, second_writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                responses = await asyncio.gather(
+                    send_request(reader, writer, 'POST', '/fill', json.dumps(efs_trades[0]).encode('utf-8')),
+                    send_request(second_reader, second_writer, 'POST', '/fill', json.dumps(efs_trades).encode('utf-8')))
+                wrong_response = await send_request(reader, writer, 'POST', '/fill',
+                                                    json.dumps([efs_trades[0], wrong_efs_trade]).encode('utf-8'))
+                writer.close()
+                second_writer.close()
+            finally:
+                server.close()
+                pdf_fill_service.close()
+            return responses, wrong_response
+
+        (pdf_response, zip_response), wrong_response = asyncio.run(send_trades())
+
+        self.assertEqual(200, pdf_response[0])
+        self.assertTrue(pdf_response[2].startswith(b'%PDF'))
+        self.assertEqual(200, zip_response[0])
+        with zipfile.ZipFile(io.BytesIO(zip_response[2])) as zip_file:
+            self.assertEqual(['efs_1.pdf', 'efs_2.pdf'], zip_file.namelist())
+        self.assertEqual(400, wrong_response[0])
+
+    def test_fill_service_errors(self):
+        """
+        Check if only the errors of the trade data are refused with 400, and an error of the service itself (e.g. a
+        missing module) is raised and answered with 500
+        """
+        with mock.patch('PdfFillService.create_efs_trade_pdfs', side_effect=KeyError('Shipment')):
+            self.assertEqual([(None, "KeyError: 'Shipment'")], fill_efs_trades_chunk([{'Start Date': '2021-02-01'}]))
+
+        async def send_trade():
+            # The chunks are filled by a thread of this process so that create_efs_trade_pdfs is patched
+            pdf_fill_service = PdfFillService('Trade EFS Template.pdf', batch_wait_seconds=0)
+            pdf_fill_service.pool = mock.Mock(executor=ThreadPoolExecutor(max_workers=1))
+            pdf_fill_service.chunk_semaphore = asyncio.Semaphore(1)
+            try:
+                return await pdf_fill_service.handle_request('POST', '/fill', b'{"Start Date": "2021-02-01"}')
+            finally:
+                pdf_fill_service.pool.executor.shutdown()
+
+        with mock.patch('PdfFillService.create_efs_trade_pdfs', side_effect=ImportError('No module named x')):
+            with self.assertRaises(ImportError):
+                fill_efs_trades_chunk([{'Start Date': '2021-02-01'}])
+            self.assertEqual(500, asyncio.run(send_trade())[0])
+
+    def test_template_config_and_routing(self):
+        """
+        Check if the config file of the template matches the default mapping and if a routing file fills each row with
+        the template and the config file picked by its transaction type
+        """
+        # Initalize variables
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+        transaction_types = pd.read_excel(unit_test_efs_data_excel_file)['Transaction Type'].tolist()
+
+        self.assertEqual(DEFAULT_TEMPLATE_CONFIG.config_hash,
+                         load_template_config('Trade EFS Template.pdf').config_hash)
+
+        with tempfile.TemporaryDirectory() as template_path, tempfile.TemporaryDirectory() as output_path:
+            # The short trades are filled with a copy of the template whose config file has another member code
+            shutil.copy('Trade EFS Template.pdf', os.path.join(template_path, 'Short EFS Template.pdf'))
+            with open(os.path.join(template_path, 'Short EFS Template.json'), 'w', encoding='utf-8') as file:
+                json.dump({'default_fields': {'Member Code': 'S222', 'undefined': None}}, file)
+            with open(os.path.join(template_path, 'EFS templates.json'), 'w', encoding='utf-8') as file:
+                json.dump({'route_column': 'Transaction Type',
+                           'templates': {'Short': 'Short EFS Template.pdf',
+                                         'Long': os.path.abspath('Trade EFS Template.pdf')}}, file)
+
+            FillablePdfWriter().run_fillable_pdf_writer('.', unit_test_efs_data_excel_file,
+                                                        os.path.join(template_path, 'EFS templates.json'), output_path,
+                                                        'routed_test')
+
+            for row_number, transaction_type in enumerate(transaction_types, start=1):
+                form_fields = fillpdfs.get_form_fields(os.path.join(output_path, f'routed_test_{row_number}.pdf'))
+                self.assertEqual('S222' if transaction_type == 'Short' else 'S111', form_fields['Member Code'])
+                # The default fields that are not in the config file are still filled, a null value removes one
+                self.assertEqual('SRITRANG INTL / S72449G', form_fields['Customer  Account Number'])
+                self.assertEqual('' if transaction_type == 'Short' else 'Sicom TSR', form_fields['undefined'])
+                # The fields that are not in the config file keep the default mapping
+                self.assertNotEqual('', form_fields['undefined_14'])
+
+    def test_validation_report_and_skip_bad_rows(self):
+        """
+        Check if wrong rows and blank cells are reported by row and column before any pdf is created, and only left
+        out with validation 'skip'
+        """
+        # Initalize variables
+        efs_data_df = pd.read_excel('data_source_for_unit_test_excel_file.xlsx')
+        efs_data_df = pd.concat([efs_data_df] * 3, ignore_index=True).astype(object)
+        efs_data_df.loc[1, 'Shipment'] = 'not a date'
+        efs_data_df.loc[2, 'Transaction Type'] = 'Hold'
+        efs_data_df.loc[2, 'Rounded strike'] = 'x'
+        efs_data_df.loc[4, ['Shipment', 'Notional', 'Transaction Type']] = None
+
+        with tempfile.TemporaryDirectory() as output_path:
+            efs_data_df.to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+
+            with self.assertRaises(EfsDataValidationError) as context:
+                FillablePdfWriter().run_fillable_pdf_writer(output_path, 'trades.csv', 'Trade EFS Template.pdf',
+                                                            output_path, 'validation_test')
+            error_df = context.exception.validation_report.to_df()
+            self.assertEqual([(2, 'Shipment'), (3, 'Rounded strike'), (3, 'Transaction Type'), (5, 'Shipment'),
+                              (5, 'Notional'), (5, 'Transaction Type')],
+                             list(zip(error_df['Row'], error_df['Column'])))
+            self.assertEqual(['value is missing'] * 3, error_df['Error'].tolist()[3:])
+            self.assertEqual([], fnmatch.filter(os.listdir(output_path), '*.pdf'))
+            self.assertTrue(os.path.exists(os.path.join(output_path, 'validation_test_validation_errors.csv')))
+
+            run_report = FillablePdfWriter().run_fillable_pdf_writer(output_path, 'trades.csv',
+                                                                     'Trade EFS Template.pdf', output_path,
+                                                                     'validation_test', validation='skip')
+            self.assertEqual(3, run_report.rows_invalid)
+            self.assertEqual(['validation_test_1.pdf', 'validation_test_4.pdf', 'validation_test_6.pdf'],
+                             sorted(fnmatch.filter(os.listdir(output_path), '*.pdf')))
+
+    def test_validation_reads_rows_chunk_by_chunk(self):
+        """
+        Check if the rows are checked and filled chunk by chunk without reading the whole EFS data file at once, and
+        if the rows of every chunk keep their row number
+        """
+        # Initalize variables
+        efs_data_df = pd.read_excel('data_source_for_unit_test_excel_file.xlsx')
+        efs_data_df = pd.concat([efs_data_df] * 4, ignore_index=True).astype(object)
+        efs_data_df.loc[2, 'Shipment'] = 'not a date'
+        efs_data_df.loc[5, 'Rounded strike'] = 'x'
+
+        with tempfile.TemporaryDirectory() as output_path:
+            efs_data_df.to_csv(os.path.join(output_path, 'trades.csv'), index=False)
+            with mock.patch.object(FillablePdfWriter, 'read_efs_data_df', side_effect=AssertionError('read at once')):
+                with self.assertRaises(EfsDataValidationError) as context:
+                    FillablePdfWriter().run_fillable_pdf_writer(output_path, 'trades.csv', 'Trade EFS Template.pdf',
+                                                                output_path, 'chunk_test', chunk_size=2)
+                self.assertEqual([3, 6], context.exception.validation_report.get_bad_row_numbers())
+                self.assertEqual([], fnmatch.filter(os.listdir(output_path), '*.pdf'))
+
+                run_report = FillablePdfWriter().run_fillable_pdf_writer(
+                    output_path, 'trades.csv', 'Trade EFS Template.pdf', output_path, 'chunk_test', chunk_size=2,
+                    validation='skip')
+            self.assertEqual(2, run_report.rows_invalid)
+            self.assertEqual([f'chunk_test_{row_number}.pdf' for row_number in (1, 2, 4, 5, 7, 8)],
+                             sorted(fnmatch.filter(os.listdir(output_path), '*.pdf')))
+            self.assertEqual(fillpdfs.get_form_fields(os.path.join(output_path, 'chunk_test_2.pdf')),
+                             fillpdfs.get_form_fields(os.path.join(output_path, 'chunk_test_8.pdf')))
+
+    def test_verify_pdfs(self):
+        """
+        Check if the PDF files read back hold the values of their row, and if a wrong field or a missing PDF file is
+        reported by row
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+
+        with tempfile.TemporaryDirectory() as output_path:
+            run_report = FillablePdfWriter().run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                                     'Trade EFS Template.pdf', output_path,
+                                                                     'verify_test', output_mode='zip', verify=True)
+            self.assertEqual(0, run_report.rows_mismatched)
+            self.assertIn('verify_pdfs', run_report.stage_seconds)
+            self.assertFalse(os.path.exists(os.path.join(output_path, 'verify_test_verification_errors.csv')))
+
+            # The values read back are the values read by fillpdfs
+            with zipfile.ZipFile(os.path.join(output_path, 'verify_test.zip')) as zip_file:
+                pdf_bytes = zip_file.read('verify_test_1.pdf')
+            with open(os.path.join(output_path, 'verify_test_1.pdf'), 'wb') as pdf_file:
+                pdf_file.write(pdf_bytes)
+            field_values = read_pdf_field_values(pdf_bytes)
+            self.assertEqual(fillpdfs.get_form_fields(os.path.join(output_path, 'verify_test_1.pdf')),
+                             {field_name: value or '' for field_name, value in field_values.items()})
+
+            ByteStampedPdfTemplate('Trade EFS Template.pdf').fill({'undefined_3': '10', 'Swaps': 'On'},
+                                                                   os.path.join(output_path, 'verify_test_1.pdf'))
+            mismatches = verify_pdfs(output_path, 'verify_test',
+                                     [(1, {'undefined_3': 10, 'Swaps': 'Off', 'Shipment': 'not a field'}),
+                                      (2, {'undefined_3': 10})])
+            self.assertEqual((1, 'Swaps', 'Off', 'On'), mismatches[0])
+            self.assertEqual((2, '(file)', 'verify_test_2.pdf'), mismatches[1][:3])
+
+            with self.assertRaises(ValueError):
+                FillablePdfWriter().run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                            'Trade EFS Template.pdf', output_path, 'verify_test',
+                                                            output_mode='merged', verify=True)
+
+    def test_incremental_run_recreates_mismatched_pdfs(self):
+        """
+        Check if the PDF file of a row with a wrong field is created again by the next incremental run
+        """
+        # Initalize variables
+        path = str(os.getcwd())
+        unit_test_efs_data_excel_file = 'data_source_for_unit_test_excel_file.xlsx'
+
+        def verify_corrupted_pdfs(output_path, output_file_name, *args):
+            # Overwrite the PDF file of row 1 before it is read back
+            ByteStampedPdfTemplate('Trade EFS Template.pdf').fill(
+                {'Swaps': 'Off'}, os.path.join(output_path, f'{output_file_name}_1.pdf'))
+            return verify_pdfs(output_path, output_file_name, *args)
+
+        with tempfile.TemporaryDirectory() as output_path:
+            with mock.patch('PdfWriter.verify_pdfs', side_effect=verify_corrupted_pdfs):
+                with self.assertRaises(PdfVerificationError):
+                    FillablePdfWriter().run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                                'Trade EFS Template.pdf', output_path,
+                                                                'incremental_verify_test', incremental=True,
+                                                                verify=True)
+
+            run_report = FillablePdfWriter().run_fillable_pdf_writer(path, unit_test_efs_data_excel_file,
+                                                                     'Trade EFS Template.pdf', output_path,
+                                                                     'incremental_verify_test', incremental=True,
+                                                                     verify=True)
+            self.assertEqual(1, run_report.rows_skipped)
+            self.assertEqual(0, run_report.rows_mismatched)
+